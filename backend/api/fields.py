@@ -0,0 +1,74 @@
+import lzma
+import zlib
+from django.db import models
+
+# First byte of a stored value -> how the rest is encoded
+RAW, ZLIB, LZMA = b'r', b'z', b'x'
+
+CODECS = {
+    'zlib': (ZLIB, zlib.compress, zlib.decompress),
+    'lzma': (LZMA, lzma.compress, lzma.decompress),
+}
+DECOMPRESSORS = {marker: decompress for marker, _, decompress in CODECS.values()}
+
+
+def compress_text(text, algorithm='zlib', min_length=0):
+    """
+    Bytes stored for ``text``: a marker byte then the UTF-8 text,
+    compressed unless it is short or does not shrink.
+    """
+    raw = text.encode()
+    if len(raw) >= min_length:
+        marker, compress, _ = CODECS[algorithm]
+        compressed = compress(raw)
+        if len(compressed) < len(raw):
+            return marker + compressed
+    return RAW + raw
+
+def decompress_text(data):
+    data = bytes(data)
+    marker, payload = data[:1], data[1:]
+    if marker == RAW:
+        return payload.decode()
+    if marker not in DECOMPRESSORS:
+        raise ValueError(f'Unknown compressed text marker {marker!r}')
+    return DECOMPRESSORS[marker](payload).decode()
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text field stored compressed in a binary column. Reads accept any of
+    the encodings above, so changing ``algorithm`` only affects new
+    writes. Values are decompressed when the column is loaded, so
+    querysets that defer it (``only()``/``defer()``, ?fields=) never pay
+    for it. The column cannot be filtered or searched in the database.
+    """
+
+    def __init__(self, *args, algorithm='zlib', min_length=256, **kwargs):
+        if algorithm not in CODECS:
+            raise ValueError(f'Unknown compression algorithm {algorithm!r}')
+        self.algorithm = algorithm
+        self.min_length = min_length
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.algorithm != 'zlib':
+            kwargs['algorithm'] = self.algorithm
+        if self.min_length != 256:
+            kwargs['min_length'] = self.min_length
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return compress_text(value, self.algorithm, self.min_length)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decompress_text(value)
@@ -0,0 +1,143 @@
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+from .models import ALL_RELATIONSHIP_TYPES, Character, CharacterRelationship
+from .versioning import get_versions
+
+
+class RelationshipGraph:
+    """
+    Undirected relationship graph of one author's characters, loaded with
+    two queries. Characters are numbered 0..n-1 and each one keeps a dict
+    of neighbour number -> bitmask of the relationship types between them,
+    so traversals never touch the database. Every query takes a type mask
+    and only follows edges sharing at least one of its types.
+    """
+
+    def __init__(self, characters, relationships):
+        self.ids = []
+        self.names = []
+        self.index = {}
+        for character_id, name in characters:
+            self.index[character_id] = len(self.ids)
+            self.ids.append(character_id)
+            self.names.append(name)
+
+        self.adjacency = [{} for _ in self.ids]
+        for from_id, to_id, mask in relationships:
+            source, target = self.index.get(from_id), self.index.get(to_id)
+            if source is None or target is None or source == target:
+                continue
+            self.adjacency[source][target] = self.adjacency[source].get(target, 0) | mask
+            self.adjacency[target][source] = self.adjacency[target].get(source, 0) | mask
+
+    @classmethod
+    def for_author(cls, author_id):
+        characters = Character.objects.filter(author_id=author_id).order_by('id').values_list('id', 'name')
+        relationships = CharacterRelationship.objects.filter(
+            from_character__author_id=author_id
+        ).values_list('from_character_id', 'to_character_id', 'type_mask')
+        return cls(list(characters), list(relationships))
+
+    @classmethod
+    def cached(cls, author_id):
+        """
+        The author's graph from the cache, rebuilt whenever a character or
+        relationship change bumps their change versions.
+        """
+        versions = get_versions(author_id, [Character, CharacterRelationship])
+        key = 'relationship-graph:{}:{}'.format(
+            author_id, ':'.join(str(version) for _, version in sorted(versions.items()))
+        )
+        graph = cache.get(key)
+        if graph is None:
+            graph = cls.for_author(author_id)
+            cache.set(key, graph, getattr(settings, 'API_CACHE_TIMEOUT', 300))
+        return graph
+
+    def __contains__(self, character_id):
+        return character_id in self.index
+
+    def node(self, number):
+        return {'id': self.ids[number], 'name': self.names[number]}
+
+    def neighbours(self, number, mask=ALL_RELATIONSHIP_TYPES):
+        return [other for other, types in self.adjacency[number].items() if types & mask]
+
+    def edges(self, mask=ALL_RELATIONSHIP_TYPES):
+        for source, neighbours in enumerate(self.adjacency):
+            for target, types in neighbours.items():
+                if source < target and types & mask:
+                    yield source, target, types
+
+    def shortest_path(self, source_id, target_id, mask=ALL_RELATIONSHIP_TYPES):
+        """
+        Characters on a shortest path between two characters, both ends
+        included, or None when they are not connected.
+        """
+        source, target = self.index[source_id], self.index[target_id]
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            if current == target:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path[::-1]
+            for other in self.neighbours(current, mask):
+                if other not in previous:
+                    previous[other] = current
+                    queue.append(other)
+        return None
+
+    def neighbourhood(self, character_id, hops, mask=ALL_RELATIONSHIP_TYPES):
+        """
+        Character number -> distance for everything within the given
+        number of hops, the character itself excluded.
+        """
+        start = self.index[character_id]
+        distances = {start: 0}
+        frontier = [start]
+        for distance in range(1, hops + 1):
+            next_frontier = []
+            for current in frontier:
+                for other in self.neighbours(current, mask):
+                    if other not in distances:
+                        distances[other] = distance
+                        next_frontier.append(other)
+            frontier = next_frontier
+        del distances[start]
+        return distances
+
+    def components(self, mask=ALL_RELATIONSHIP_TYPES):
+        """
+        Connected components as lists of character numbers, largest first.
+        """
+        seen = set()
+        components = []
+        for start in range(len(self.ids)):
+            if start in seen:
+                continue
+            seen.add(start)
+            component, stack = [], [start]
+            while stack:
+                current = stack.pop()
+                component.append(current)
+                for other in self.neighbours(current, mask):
+                    if other not in seen:
+                        seen.add(other)
+                        stack.append(other)
+            components.append(component)
+        components.sort(key=len, reverse=True)
+        return components
+
+    def degrees(self, mask=ALL_RELATIONSHIP_TYPES):
+        """
+        (character number, number of related characters), most connected
+        first.
+        """
+        degrees = [(number, len(self.neighbours(number, mask))) for number in range(len(self.ids))]
+        degrees.sort(key=lambda item: (-item[1], self.names[item[0]]))
+        return degrees
@@ -0,0 +1,24 @@
+from collections import defaultdict
+from .models import Place
+
+
+class PlaceForest:
+    """
+    In-memory parent -> children index over all places of one author,
+    loaded with a single query and shared by every nested PlaceSerializer.
+    """
+
+    def __init__(self, places):
+        self.children = defaultdict(list)
+        for place in places:
+            self.children[place.parent_id].append(place)
+
+    @classmethod
+    def for_author(cls, author_id):
+        return cls(Place.objects.filter(author_id=author_id))
+
+    def children_of(self, place_id):
+        return self.children.get(place_id, [])
+
+    def roots(self):
+        return self.children_of(None)
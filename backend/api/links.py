@@ -0,0 +1,62 @@
+"""
+Resolution of Idea.linked_elements, which stores bare ids with no type.
+"""
+import uuid
+from collections import defaultdict
+from django.db.models.functions import Left
+from .models import Character, Place, Item, Scene, Event, Story, Chapter
+
+# Models an idea can link to, in lookup order, with the field used as label
+LINKABLE_MODELS = {
+    Character: 'name',
+    Place: 'name',
+    Item: 'name',
+    Scene: 'short_description',
+    Event: 'description',
+    Story: 'title',
+    Chapter: 'title',
+}
+
+LABEL_LENGTH = 80
+
+
+def link_stub(element_id, model=None, label=None):
+    return {
+        'id': element_id,
+        'type': model._meta.model_name if model else None,
+        'label': label,
+    }
+
+def resolve_links(author_id, element_ids):
+    """
+    Typed stubs ({id, type, label}) for the given linked element ids, keyed
+    by id as stored, so every spelling of one UUID gets its stub. Every
+    model is asked at most once for the whole batch, and models are
+    skipped once every id has been found. Ids that match nothing of the
+    author's get a stub with no type.
+    """
+    pending = defaultdict(list)
+    stubs = {}
+    for element_id in element_ids:
+        element_id = str(element_id)
+        try:
+            pending[uuid.UUID(element_id)].append(element_id)
+        except ValueError:
+            stubs[element_id] = link_stub(element_id)
+
+    for model, label_field in LINKABLE_MODELS.items():
+        if not pending:
+            break
+        rows = model.objects.filter(pk__in=list(pending))
+        if model is Chapter:
+            rows = rows.filter(story__author_id=author_id)
+        else:
+            rows = rows.filter(author_id=author_id)
+        for pk, label in rows.values_list('pk', Left(label_field, LABEL_LENGTH)):
+            for element_id in pending.pop(pk):
+                stubs[element_id] = link_stub(element_id, model, label)
+
+    for element_ids in pending.values():
+        for element_id in element_ids:
+            stubs[element_id] = link_stub(element_id)
+    return stubs
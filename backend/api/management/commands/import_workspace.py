@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.workspace import WorkspaceFormatError, WorkspaceImporter
+
+
+class Command(BaseCommand):
+    help = 'Import a workspace NDJSON dump (as written by /api/export/) into a user account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Dump file to read')
+        parser.add_argument('--username', required=True, help='Account that receives the imported rows')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows buffered per table before writing')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        importer = WorkspaceImporter(author)
+        if options['batch_size']:
+            importer.batch_size = options['batch_size']
+        try:
+            with open(options['path'], 'rb') as dump:
+                counts = importer.load(dump)
+        except (OSError, WorkspaceFormatError) as error:
+            raise CommandError(str(error))
+
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Imported {sum(counts.values())} rows'))
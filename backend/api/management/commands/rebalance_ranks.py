@@ -0,0 +1,25 @@
+from itertools import pairwise
+from django.core.management.base import BaseCommand
+from api.ranking import RANK_FIELDS, SCOPE_FIELDS, RANK_GAP, rebalance
+
+
+class Command(BaseCommand):
+    help = 'Respace scene, event, chapter and chapter scene ranks wherever neighbours are running out of room'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-gap', type=int, default=RANK_GAP // 64,
+            help='Rebalance a list when two neighbours are closer than this',
+        )
+
+    def handle(self, *args, **options):
+        for model, field in RANK_FIELDS.items():
+            scope_field = f'{SCOPE_FIELDS[model]}_id'
+            rebalanced = 0
+            for scope in model.objects.values_list(scope_field, flat=True).distinct().order_by():
+                scope_rows = model.objects.filter(**{scope_field: scope})
+                ranks = scope_rows.order_by(field).values_list(field, flat=True)
+                if any(high - low < options['min_gap'] for low, high in pairwise(ranks)):
+                    rebalance(scope_rows)
+                    rebalanced += 1
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {rebalanced} list(s) rebalanced')
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_place_closure(apps, schema_editor):
+    Place = apps.get_model('api', 'Place')
+    PlaceClosure = apps.get_model('api', 'PlaceClosure')
+
+    parents = dict(Place.objects.values_list('id', 'parent_id'))
+    links = []
+    for place_id in parents:
+        ancestor_id, depth = place_id, 0
+        while ancestor_id is not None:
+            links.append(PlaceClosure(ancestor_id=ancestor_id, descendant_id=place_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    PlaceClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_add_event_model_update_scene_chapter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='api.place')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='api.place')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='place_closure_descendant_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_place_closure')],
+            },
+        ),
+        migrations.RunPython(build_place_closure, migrations.RunPython.noop),
+    ]
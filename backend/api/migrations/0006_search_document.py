@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE api_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX search_document_vector_idx ON api_searchdocument USING GIN (search_vector)',
+]
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE api_searchdocument_fts USING fts5(
+        title, body, content='api_searchdocument', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_insert AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_delete AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_update AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_insert',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_delete',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_update',
+    'DROP TABLE IF EXISTS api_searchdocument_fts',
+]
+
+# model name: (title field, body fields)
+SEARCH_FIELDS = {
+    'idea': (None, ('content',)),
+    'scene': ('short_description', ('external_conflict', 'interpersonal_conflict', 'internal_conflict')),
+    'chapter': ('title', ('content',)),
+    'event': (None, ('description',)),
+    'story': ('title', ('promise', 'plot', 'emotional_matter', 'universal_truth', 'logline')),
+}
+
+
+def create_text_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRES_INDEX, 'sqlite': SQLITE_INDEX}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+def drop_text_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+def build_search_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+    for kind, (title_field, body_fields) in SEARCH_FIELDS.items():
+        model = apps.get_model('api', kind)
+        rows = model.objects.select_related('story') if kind == 'chapter' else model.objects.all()
+        documents = []
+        for row in rows.iterator(chunk_size=2000):
+            documents.append(SearchDocument(
+                author_id=row.story.author_id if kind == 'chapter' else row.author_id,
+                kind=kind,
+                object_id=row.pk,
+                title=getattr(row, title_field) if title_field else '',
+                body='\n'.join(getattr(row, name) for name in body_fields if getattr(row, name)),
+            ))
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_change_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('title', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_idea_tags(apps, schema_editor):
+    Idea = apps.get_model('api', 'Idea')
+    IdeaTag = apps.get_model('api', 'IdeaTag')
+
+    rows = [
+        IdeaTag(idea_id=idea_id, author_id=author_id, tag=tag[:100])
+        for idea_id, author_id, tags in Idea.objects.values_list('id', 'author_id', 'tags').iterator(chunk_size=2000)
+        for tag in dict.fromkeys(tag[:100] for tag in tags or [] if isinstance(tag, str))
+    ]
+    IdeaTag.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdeaTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idea_tags', to=settings.AUTH_USER_MODEL)),
+                ('idea', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_rows', to='api.idea')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', 'tag'], name='idea_tag_author_idx')],
+                'constraints': [models.UniqueConstraint(fields=('idea', 'tag'), name='unique_idea_tag')],
+            },
+        ),
+        migrations.RunPython(build_idea_tags, migrations.RunPython.noop),
+    ]
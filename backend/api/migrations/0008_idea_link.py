@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:11
+
+import uuid
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_idea_links(apps, schema_editor):
+    Idea = apps.get_model('api', 'Idea')
+    IdeaLink = apps.get_model('api', 'IdeaLink')
+
+    rows = []
+    for idea_id, author_id, elements in Idea.objects.values_list('id', 'author_id', 'linked_elements').iterator(chunk_size=2000):
+        element_ids = set()
+        for element in elements or []:
+            try:
+                element_ids.add(uuid.UUID(str(element)))
+            except ValueError:
+                continue
+        rows += [IdeaLink(idea_id=idea_id, author_id=author_id, element_id=element_id) for element_id in element_ids]
+    IdeaLink.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_idea_tag'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdeaLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('element_id', models.UUIDField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idea_links', to=settings.AUTH_USER_MODEL)),
+                ('idea', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='link_rows', to='api.idea')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', 'element_id'], name='idea_link_element_idx')],
+                'constraints': [models.UniqueConstraint(fields=('idea', 'element_id'), name='unique_idea_link')],
+            },
+        ),
+        migrations.RunPython(build_idea_links, migrations.RunPython.noop),
+    ]
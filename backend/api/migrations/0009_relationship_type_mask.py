@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:16
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+# Bits as in RELATIONSHIP_TYPE_BITS when this migration was written
+TYPE_BITS = {'FRIEND': 1, 'ENEMY': 2, 'MENTOR': 4, 'LOVER': 8, 'FAMILY': 16}
+
+
+def types_to_mask(apps, schema_editor):
+    CharacterRelationship = apps.get_model('api', 'CharacterRelationship')
+    relationships = list(CharacterRelationship.objects.only('id', 'types'))
+    for relationship in relationships:
+        relationship.type_mask = 0
+        for value in relationship.types or []:
+            relationship.type_mask |= TYPE_BITS.get(value, 0)
+    CharacterRelationship.objects.bulk_update(relationships, ['type_mask'], batch_size=1000)
+
+def mask_to_types(apps, schema_editor):
+    CharacterRelationship = apps.get_model('api', 'CharacterRelationship')
+    relationships = list(CharacterRelationship.objects.only('id', 'type_mask'))
+    for relationship in relationships:
+        relationship.types = [value for value, bit in TYPE_BITS.items() if relationship.type_mask & bit]
+    CharacterRelationship.objects.bulk_update(relationships, ['types'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idea_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='characterrelationship',
+            name='type_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(types_to_mask, mask_to_types),
+        migrations.RemoveField(
+            model_name='characterrelationship',
+            name='types',
+        ),
+        migrations.AddField(
+            model_name='characterrelationship',
+            name='pair_high',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Greatest('from_character', 'to_character'), output_field=models.UUIDField()),
+        ),
+        migrations.AddField(
+            model_name='characterrelationship',
+            name='pair_low',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Least('from_character', 'to_character'), output_field=models.UUIDField()),
+        ),
+        migrations.AddIndex(
+            model_name='characterrelationship',
+            index=models.Index(fields=['pair_low', 'pair_high'], name='relationship_pair_idx'),
+        ),
+    ]
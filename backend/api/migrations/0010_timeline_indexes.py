@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_relationship_type_mask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['author', 'time_order', 'id'], name='event_author_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scene',
+            index=models.Index(fields=['author', 'time_order', 'id'], name='scene_author_time_idx'),
+        ),
+    ]
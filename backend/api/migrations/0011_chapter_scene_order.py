@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+GAP = 1024
+
+
+def number_chapter_scenes(apps, schema_editor):
+    # Keep the order clients saw so far: by scene time_order
+    ChapterScene = apps.get_model('api', 'ChapterScene')
+    links = ChapterScene.objects.order_by('chapter_id', 'scene__time_order', 'scene_id')
+    updated, chapter_id, position = [], None, 0
+    for link in links.iterator(chunk_size=2000):
+        if link.chapter_id != chapter_id:
+            chapter_id, position = link.chapter_id, 0
+        position += GAP
+        link.position = position
+        updated.append(link)
+    ChapterScene.objects.bulk_update(updated, ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_timeline_indexes'),
+    ]
+
+    operations = [
+        # The auto-created table already has id, chapter_id and scene_id
+        # with a unique (chapter_id, scene_id) pair; adopt it as is.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ChapterScene',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scene_links', to='api.chapter')),
+                        ('scene', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chapter_links', to='api.scene')),
+                    ],
+                    options={
+                        'db_table': 'api_chapter_included_scenes',
+                        'unique_together': {('chapter', 'scene')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chapter',
+                    name='included_scenes',
+                    field=models.ManyToManyField(blank=True, related_name='chapters', through='api.ChapterScene', to='api.scene'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chapterscene',
+            name='position',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(number_chapter_scenes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chapterscene',
+            index=models.Index(fields=['chapter', 'position'], name='chapter_scene_position_idx'),
+        ),
+    ]
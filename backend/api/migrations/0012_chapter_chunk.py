@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:32
+
+import hashlib
+import django.db.models.deletion
+from django.db import migrations, models
+
+GAP = 1024
+
+
+def split_chapters(apps, schema_editor):
+    # Paragraphs and digests as in split_paragraphs/text_digest
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterChunk = apps.get_model('api', 'ChapterChunk')
+    chunks = []
+    for chapter_id, content in Chapter.objects.values_list('id', 'content').iterator(chunk_size=500):
+        for number, text in enumerate(content.split('\n\n') if content else [], start=1):
+            digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+            chunks.append(ChapterChunk(chapter_id=chapter_id, position=number * GAP, digest=digest, text=text))
+        if len(chunks) >= 1000:
+            ChapterChunk.objects.bulk_create(chunks)
+            chunks = []
+    ChapterChunk.objects.bulk_create(chunks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_chapter_scene_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('digest', models.CharField(max_length=32)),
+                ('text', models.TextField(blank=True)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.chapter')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chapter', 'position'], name='chapter_chunk_position_idx')],
+            },
+        ),
+        migrations.RunPython(split_chapters, migrations.RunPython.noop),
+    ]
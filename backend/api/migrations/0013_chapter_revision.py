@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:36
+
+import django.db.models.deletion
+import hashlib
+import zlib
+from django.db import migrations, models
+
+
+def snapshot_chapters(apps, schema_editor):
+    # Every chapter starts its history with a snapshot of its content
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterRevision = apps.get_model('api', 'ChapterRevision')
+    revisions = []
+    for chapter_id, content in Chapter.objects.values_list('id', 'content').iterator(chunk_size=500):
+        revisions.append(ChapterRevision(
+            chapter_id=chapter_id, number=1, length=len(content), is_snapshot=True,
+            content_hash=hashlib.blake2b(content.encode(), digest_size=16).hexdigest(),
+            data=zlib.compress(content.encode()),
+        ))
+        if len(revisions) >= 500:
+            ChapterRevision.objects.bulk_create(revisions)
+            revisions = []
+    ChapterRevision.objects.bulk_create(revisions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_chapter_chunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(max_length=32)),
+                ('length', models.PositiveIntegerField()),
+                ('is_snapshot', models.BooleanField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='api.chapter')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('chapter', 'number'), name='unique_chapter_revision')],
+            },
+        ),
+        migrations.RunPython(snapshot_chapters, migrations.RunPython.noop),
+    ]
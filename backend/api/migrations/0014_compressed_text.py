@@ -0,0 +1,117 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:39
+
+import api.fields
+from django.db import migrations
+
+# Model -> text columns moved to compressed binary columns
+COMPRESSED_FIELDS = {
+    'chapter': ['content'],
+    'story': ['plot'],
+    'scene': ['external_conflict', 'interpersonal_conflict', 'internal_conflict'],
+}
+
+
+def compress_rows(apps, schema_editor):
+    # The old text now sits in <name>_text; assigning it to the new field
+    # compresses it on save
+    for model_name, names in COMPRESSED_FIELDS.items():
+        model = apps.get_model('api', model_name)
+        rows = []
+        for row in model.objects.only('pk', *[f'{name}_text' for name in names]).iterator(chunk_size=500):
+            for name in names:
+                setattr(row, name, getattr(row, f'{name}_text'))
+            rows.append(row)
+            if len(rows) >= 500:
+                model.objects.bulk_update(rows, names)
+                rows = []
+        model.objects.bulk_update(rows, names)
+
+def decompress_rows(apps, schema_editor):
+    for model_name, names in COMPRESSED_FIELDS.items():
+        model = apps.get_model('api', model_name)
+        rows = list(model.objects.only('pk', *names))
+        for row in rows:
+            for name in names:
+                setattr(row, f'{name}_text', getattr(row, name))
+        model.objects.bulk_update(rows, [f'{name}_text' for name in names], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_chapter_revision'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='chapter',
+            old_name='content',
+            new_name='content_text',
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='content',
+            field=api.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RenameField(
+            model_name='story',
+            old_name='plot',
+            new_name='plot_text',
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='plot',
+            field=api.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RenameField(
+            model_name='scene',
+            old_name='external_conflict',
+            new_name='external_conflict_text',
+        ),
+        migrations.AddField(
+            model_name='scene',
+            name='external_conflict',
+            field=api.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RenameField(
+            model_name='scene',
+            old_name='interpersonal_conflict',
+            new_name='interpersonal_conflict_text',
+        ),
+        migrations.AddField(
+            model_name='scene',
+            name='interpersonal_conflict',
+            field=api.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RenameField(
+            model_name='scene',
+            old_name='internal_conflict',
+            new_name='internal_conflict_text',
+        ),
+        migrations.AddField(
+            model_name='scene',
+            name='internal_conflict',
+            field=api.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+        migrations.RemoveField(
+            model_name='chapter',
+            name='content_text',
+        ),
+        migrations.RemoveField(
+            model_name='story',
+            name='plot_text',
+        ),
+        migrations.RemoveField(
+            model_name='scene',
+            name='external_conflict_text',
+        ),
+        migrations.RemoveField(
+            model_name='scene',
+            name='interpersonal_conflict_text',
+        ),
+        migrations.RemoveField(
+            model_name='scene',
+            name='internal_conflict_text',
+        ),
+    ]
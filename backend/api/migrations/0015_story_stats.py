@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryStats',
+            fields=[
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.story')),
+                ('chapters', models.PositiveIntegerField(default=0)),
+                ('words', models.PositiveIntegerField(default=0)),
+                ('characters', models.PositiveIntegerField(default=0)),
+                ('scenes', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('appearing_characters', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChapterStats',
+            fields=[
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.chapter')),
+                ('words', models.PositiveIntegerField(default=0)),
+                ('characters', models.PositiveIntegerField(default=0)),
+                ('scenes', models.PositiveIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('appearing_characters', models.PositiveIntegerField(default=0)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chapter_stats', to='api.story')),
+            ],
+        ),
+    ]
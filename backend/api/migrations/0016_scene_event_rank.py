@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+GAP = 1024
+
+
+def rank_rows(apps, schema_editor):
+    # Start every author's list in time_order, the order moves used so far
+    for model_name in ('event', 'scene'):
+        model = apps.get_model('api', model_name)
+        rows = model.objects.only('pk', 'author_id').order_by('author_id', 'time_order', 'id')
+        updated, author_id, rank = [], None, 0
+        for row in rows.iterator(chunk_size=2000):
+            if row.author_id != author_id:
+                author_id, rank = row.author_id, 0
+            rank += GAP
+            row.rank = rank
+            updated.append(row)
+        model.objects.bulk_update(updated, ['rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_story_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='rank',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scene',
+            name='rank',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['author', 'rank', 'id'], name='event_author_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scene',
+            index=models.Index(fields=['author', 'rank', 'id'], name='scene_author_rank_idx'),
+        ),
+        migrations.RunPython(rank_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import hashlib
+import api.fields
+from django.db import migrations, models
+
+GAP = 1024
+
+
+def digest(text):
+    # As text_digest
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def move_text_to_chunks(apps, schema_editor):
+    # Chunks are rebuilt from the content rather than trusted, so chapters
+    # written around the chunk signals come out whole
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterChunk = apps.get_model('api', 'ChapterChunk')
+    ChapterChunk.objects.all().delete()
+    chapter_ids = list(Chapter.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(chapter_ids), 500):
+        chapters, chunks = list(Chapter.objects.filter(pk__in=chapter_ids[start:start + 500]).only('id', 'content')), []
+        for chapter in chapters:
+            chapter.content_hash = digest(chapter.content)
+            for number, text in enumerate(chapter.content.split('\n\n') if chapter.content else [], start=1):
+                chunks.append(ChapterChunk(chapter_id=chapter.pk, position=number * GAP, digest=digest(text), text=text))
+        ChapterChunk.objects.bulk_create(chunks, batch_size=1000)
+        Chapter.objects.bulk_update(chapters, ['content_hash'])
+
+
+def move_text_to_chapters(apps, schema_editor):
+    Chapter = apps.get_model('api', 'Chapter')
+    ChapterChunk = apps.get_model('api', 'ChapterChunk')
+    chunks = list(ChapterChunk.objects.order_by('chapter_id', 'position', 'pk').only('chapter_id', 'text'))
+    paragraphs = {}
+    for chunk in chunks:
+        chunk.text_plain = chunk.text
+        paragraphs.setdefault(chunk.chapter_id, []).append(chunk.text)
+    ChapterChunk.objects.bulk_update(chunks, ['text_plain'], batch_size=500)
+    chapters = list(Chapter.objects.only('id'))
+    for chapter in chapters:
+        chapter.content = '\n\n'.join(paragraphs.get(chapter.pk, []))
+    Chapter.objects.bulk_update(chapters, ['content'], batch_size=500)
+    # Columns are altered next in this same transaction
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_scene_event_rank'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='chapterchunk',
+            old_name='text',
+            new_name='text_plain',
+        ),
+        migrations.AddField(
+            model_name='chapterchunk',
+            name='text',
+            field=api.fields.CompressedTextField(blank=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        # The old columns are dropped in 0018: Postgres refuses to ALTER a
+        # table with FK checks still deferred from the rows written here
+        migrations.RunPython(move_text_to_chunks, move_text_to_chapters),
+    ]
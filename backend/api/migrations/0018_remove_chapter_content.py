@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_chapter_text_in_chunks'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chapterchunk',
+            name='text_plain',
+        ),
+        migrations.RemoveField(
+            model_name='chapter',
+            name='content',
+        ),
+    ]
@@ -0,0 +1,504 @@
+import hashlib
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from .models import Idea, IdeaLink
+from .pagination import StableCursorPagination
+from .ranking import RANK_FIELDS, SCOPE_FIELDS, move, next_ranks, reorder, scope_id, scope_of
+from .serializers import AuthorScopedPrimaryKeyRelatedField, IdeaSerializer, only_columns, parse_include
+from .signals import bulk_changed
+from .versioning import get_versions
+
+
+class FieldSelectionMixin:
+    """
+    Viewset mixin shaping responses from the query string:
+
+    - ?fields=id,title keeps only the listed fields on reads;
+    - ?include=chapters.included_scenes expands the listed relations,
+      which are otherwise rendered as primary keys.
+
+    The queryset is built from the same selection, so it only loads the
+    columns, relations and nested prefetches the response needs.
+    """
+    fields_query_param = 'fields'
+    include_query_param = 'include'
+
+    def get_requested_fields(self):
+        if self.request is None or self.request.method != 'GET':
+            return None
+        value = self.request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        available = set(self.get_serializer_class().Meta.fields)
+        unknown = requested - available
+        if unknown:
+            raise ValidationError({self.fields_query_param: [
+                f"Unknown field(s): {', '.join(sorted(unknown))}"
+            ]})
+        return requested | {'id'}
+
+    def get_requested_include(self):
+        if self.request is None:
+            return {}
+        include = parse_include(self.request.query_params.get(self.include_query_param))
+        if not include:
+            return {}
+
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_invalid_includes'):
+            invalid = serializer_class.get_invalid_includes(include)
+        else:
+            invalid = list(include)
+        if invalid:
+            raise ValidationError({self.include_query_param: [
+                f"Unknown relation(s): {', '.join(sorted(invalid))}"
+            ]})
+        return include
+
+    def setup_eager_loading(self, queryset):
+        serializer_class = self.get_serializer_class()
+        fields = self.get_requested_fields()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            return serializer_class.setup_eager_loading(queryset, fields, self.get_requested_include())
+        if fields is not None:
+            return queryset.only(*only_columns(queryset.model, fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        include = self.get_requested_include()
+        if include:
+            kwargs['include'] = include
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in set(target.fields) - fields:
+                target.fields.pop(name)
+        return serializer
+
+
+class VersionedReadMixin:
+    """
+    Fingerprint of a read request: the user, path, query string and the
+    per-author change versions of every model the serializer can render.
+    Any save, delete or link change to one of those models changes it.
+    """
+
+    def get_read_key(self, request):
+        if getattr(self, '_read_key', None) is None:
+            include = request.query_params.get('include')
+            models = self.get_serializer_class().get_dependencies(include)
+            key = json.dumps([
+                request.user.pk,
+                request.path,
+                sorted(request.query_params.lists()),
+                get_versions(request.user.pk, models),
+            ], sort_keys=True, default=str)
+            self._read_key = hashlib.sha256(key.encode()).hexdigest()[:40]
+        return self._read_key
+
+
+class ConditionalGetMixin(VersionedReadMixin):
+    """
+    Viewset mixin answering list and detail reads with a strong ETag and
+    If-None-Match revalidation.
+
+    The ETag is the versioned read key, so a 304 costs one small indexed
+    query and neither the main query nor the serializer runs.
+    """
+
+    def resource_exists(self, **kwargs):
+        # If-None-Match: * only matches a detail the user can actually read
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        if lookup not in kwargs:
+            return True
+        try:
+            return self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup]}).exists()
+        except (TypeError, ValueError, DjangoValidationError):
+            return False
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        etag = '"%s"' % self.get_read_key(request)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (
+            etag in parse_etags(if_none_match)
+            or if_none_match.strip() == '*' and self.resource_exists(**kwargs)
+        ):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+
+class ResponseCacheMixin(VersionedReadMixin):
+    """
+    Viewset mixin caching serialized list and detail payloads.
+
+    Entries are keyed by the versioned read key. Change versions are kept
+    per author and per model, so any write to a model drops every cached
+    payload of that author that can embed it, e.g. editing one Character
+    drops all of the author's character, scene, event, item and story
+    payloads; other models' payloads and other authors' stay cached.
+    Superseded entries are never read again and expire after
+    API_CACHE_TIMEOUT seconds.
+    """
+    cache_prefix = 'api-response'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = f'{self.cache_prefix}:{self.get_read_key(request)}'
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, getattr(settings, 'API_CACHE_TIMEOUT', 300))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class BulkModelMixin:
+    """
+    Viewset mixin adding list-level writes for author-owned models:
+
+    - POST a list of objects to create them all;
+    - PATCH a list of objects with their ``id`` to update them all;
+    - DELETE a list of ids (or {"ids": [...]}) to delete them all.
+
+    Each request runs in one transaction and either applies every row or
+    none. Referenced primary keys are checked for ownership with one query
+    per related model, and rows and many-to-many links are written with
+    bulk_create/bulk_update.
+    """
+    bulk_max_rows = 1000
+
+    def get_bulk_model(self):
+        return self.get_serializer_class().Meta.model
+
+    def get_bulk_queryset(self):
+        return self.get_bulk_model().objects.filter(author=self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        resolved = getattr(self, 'resolved_relations', None)
+        if resolved is not None:
+            context['resolved_relations'] = resolved
+        return context
+
+    def get_bulk_rows(self, data, require_ids=False):
+        if not isinstance(data, list) or not data:
+            raise ValidationError({'non_field_errors': ['Expected a non-empty list.']})
+        if len(data) > self.bulk_max_rows:
+            raise ValidationError({'non_field_errors': [f'At most {self.bulk_max_rows} rows per request.']})
+        if not all(isinstance(row, dict) for row in data):
+            raise ValidationError({'non_field_errors': ['Expected a list of objects.']})
+        if require_ids and not all('id' in row for row in data):
+            raise ValidationError({'id': ['Every row needs an id.']})
+        return data
+
+    def parse_pks(self, values):
+        pk_field = self.get_bulk_model()._meta.pk
+        try:
+            return [pk_field.to_python(value) for value in values]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise ValidationError({'id': ['Invalid id.']})
+
+    def resolve_relations(self, rows):
+        """
+        Look up every primary key referenced by the rows, one query per
+        related model, limited to what the author may reference.
+        """
+        fields = self.get_serializer().fields
+        wanted = defaultdict(set)
+        relations = {}
+        for name, field in fields.items():
+            relation = getattr(field, 'child_relation', field)
+            if field.read_only or not isinstance(relation, AuthorScopedPrimaryKeyRelatedField):
+                continue
+            model = relation.queryset.model
+            relations[model] = relation
+            for row in rows:
+                value = row.get(name)
+                for pk in (value if isinstance(value, list) else [value]):
+                    try:
+                        pk = model._meta.pk.to_python(pk)
+                    except (DjangoValidationError, TypeError, ValueError):
+                        continue
+                    if pk is not None:
+                        wanted[model].add(pk)
+
+        self.resolved_relations = {
+            model: {obj.pk: obj for obj in relation.get_queryset().filter(pk__in=wanted[model])} if wanted[model] else {}
+            for model, relation in relations.items()
+        }
+
+    def write_links(self, links, replace=False):
+        """
+        Store {m2m field name: [(instance, related objects)]} through rows
+        with one bulk insert per relation.
+        """
+        model = self.get_bulk_model()
+        related_models = set()
+        for name, pairs in links.items():
+            field = model._meta.get_field(name)
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            if replace:
+                through.objects.filter(**{f'{source}__in': [instance.pk for instance, _ in pairs]}).delete()
+            # A key listed twice is one link, as with a single save's set()
+            through.objects.bulk_create([
+                through(**{f'{source}_id': instance.pk, f'{target}_id': related_pk})
+                for instance, related_objects in pairs
+                for related_pk in dict.fromkeys(related.pk for related in related_objects)
+            ])
+            related_models.add(field.related_model)
+        return related_models
+
+    def split_links(self, data):
+        model = self.get_bulk_model()
+        links = {}
+        for name in list(data):
+            if model._meta.get_field(name).many_to_many:
+                links[name] = data.pop(name)
+        return links
+
+    def bulk_response(self, pks, response_status):
+        queryset = self.setup_eager_loading(self.get_bulk_queryset().filter(pk__in=pks))
+        instances = {instance.pk: instance for instance in queryset}
+        serializer = self.get_serializer([instances[pk] for pk in pks], many=True)
+        return Response(serializer.data, status=response_status)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        rows = self.get_bulk_rows(request.data)
+        self.resolve_relations(rows)
+        serializer = self.get_serializer(data=rows, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        model = self.get_bulk_model()
+        instances, links = [], defaultdict(list)
+        for data in serializer.validated_data:
+            data = dict(data)
+            instance_links = self.split_links(data)
+            instance = model(author=request.user, **data)
+            instances.append(instance)
+            for name, related_objects in instance_links.items():
+                links[name].append((instance, related_objects))
+
+        with transaction.atomic():
+            if model in RANK_FIELDS:
+                # New rows go to the end of the author's list, in request order
+                ranks = next_ranks(model.objects.filter(author=request.user), len(instances))
+                for instance, rank in zip(instances, ranks):
+                    setattr(instance, RANK_FIELDS[model], rank)
+            model.objects.bulk_create(instances)
+            related_models = self.write_links(links)
+            bulk_changed.send(
+                sender=model, author_id=request.user.pk, action='create',
+                pks=[instance.pk for instance in instances], related_models=related_models,
+            )
+        return self.bulk_response([instance.pk for instance in instances], status.HTTP_201_CREATED)
+
+    def bulk_update(self, request, *args, **kwargs):
+        rows = self.get_bulk_rows(request.data, require_ids=True)
+        pks = self.parse_pks([row['id'] for row in rows])
+        if len(set(pks)) != len(pks):
+            raise ValidationError({'id': ['Each id may only appear once.']})
+        instances = self.get_bulk_queryset().in_bulk(pks)
+        missing = [str(pk) for pk in pks if pk not in instances]
+        if missing:
+            raise ValidationError({'id': [f"Unknown id(s): {', '.join(missing)}"]})
+
+        self.resolve_relations(rows)
+        serializers, errors = [], []
+        for pk, row in zip(pks, rows):
+            serializer = self.get_serializer(instances[pk], data=row, partial=True)
+            serializers.append(serializer)
+            errors.append({} if serializer.is_valid() else serializer.errors)
+        if any(errors):
+            raise ValidationError(errors)
+
+        model = self.get_bulk_model()
+        changed_fields, links = set(), defaultdict(list)
+        for serializer in serializers:
+            data = dict(serializer.validated_data)
+            for name, related_objects in self.split_links(data).items():
+                links[name].append((serializer.instance, related_objects))
+            for name, value in data.items():
+                setattr(serializer.instance, name, value)
+                changed_fields.add(name)
+
+        with transaction.atomic():
+            if changed_fields:
+                model.objects.bulk_update(list(instances.values()), sorted(changed_fields))
+            related_models = self.write_links(links, replace=True)
+            bulk_changed.send(
+                sender=model, author_id=request.user.pk, action='update',
+                pks=pks, related_models=related_models, fields=sorted(changed_fields),
+            )
+        return self.bulk_response(pks, status.HTTP_200_OK)
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        data = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(data, list) or not data:
+            raise ValidationError({'ids': ['Expected a non-empty list of ids.']})
+        if len(data) > self.bulk_max_rows:
+            raise ValidationError({'ids': [f'At most {self.bulk_max_rows} ids per request.']})
+        pks = set(self.parse_pks(data))
+
+        with transaction.atomic():
+            queryset = self.get_bulk_queryset().filter(pk__in=pks)
+            found = set(queryset.values_list('pk', flat=True))
+            missing = [str(pk) for pk in pks - found]
+            if missing:
+                raise ValidationError({'ids': [f"Unknown id(s): {', '.join(sorted(missing))}"]})
+            queryset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LinkedIdeasMixin:
+    """
+    Viewset mixin adding /<elements>/{id}/ideas/, the author's ideas whose
+    linked_elements contain the element, read through the IdeaLink index.
+    """
+    # Lookup from an element to its author, e.g. story__author for chapters
+    author_lookup = 'author'
+
+    def get_linked_element_pk(self, pk):
+        # Only the pk is needed, so none of the list queryset's prefetches run
+        model = self.get_serializer_class().Meta.model
+        try:
+            element_pk = model.objects.filter(**{self.author_lookup: self.request.user}, pk=pk).values_list('pk', flat=True).first()
+        except (DjangoValidationError, TypeError, ValueError):
+            element_pk = None
+        if element_pk is None:
+            raise NotFound()
+        return element_pk
+
+    @action(detail=True)
+    def ideas(self, request, pk=None):
+        links = IdeaLink.objects.filter(author=request.user, element_id=self.get_linked_element_pk(pk))
+        ideas = Idea.objects.filter(author=request.user, pk__in=links.values('idea_id'))
+        # Ideas are paged by id whatever the viewset's own ordering
+        paginator = StableCursorPagination()
+        page = paginator.paginate_queryset(ideas, request)
+        serializer = IdeaSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+
+class RankedMixin:
+    """
+    Viewset mixin for gap-ranked models (see ranking.py):
+
+    - POST {id}/move/ with {"before": id} or {"after": id} moves one row
+      next to another, normally by updating that row alone;
+    - POST reorder/ with {"ids": [...]} puts the listed rows in that order
+      in one transaction.
+
+    New rows are saved at the end of their list by save_ranked().
+    """
+    reorder_max_rows = 1000
+
+    def get_ranked_model(self):
+        return self.get_serializer_class().Meta.model
+
+    def get_ranked_queryset(self):
+        return self.get_ranked_model().objects.filter(author=self.request.user)
+
+    def save_ranked(self, serializer, **kwargs):
+        """
+        Save a new row after the last one of its list, unless the client
+        gave its rank.
+        """
+        model = self.get_ranked_model()
+        field, scope_field = RANK_FIELDS[model], SCOPE_FIELDS[model]
+        if field not in serializer.validated_data:
+            scope = kwargs.get(scope_field, serializer.validated_data.get(scope_field))
+            kwargs[field] = next_ranks(model.objects.filter(**{scope_field: scope}))[0]
+        return serializer.save(**kwargs)
+
+    def parse_rank_pk(self, value, name):
+        try:
+            return self.get_ranked_model()._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise ValidationError({name: ['Invalid id.']})
+
+    def get_rank_columns(self):
+        model = self.get_ranked_model()
+        return ('pk', RANK_FIELDS[model], f'{SCOPE_FIELDS[model]}_id')
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Answers {"id", <rank field>}: only those columns are loaded.
+        """
+        try:
+            pk = self.get_ranked_model()._meta.pk.to_python(pk)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound()
+        instance = self.get_ranked_queryset().filter(pk=pk).only(*self.get_rank_columns()).first()
+        if instance is None:
+            raise NotFound()
+        data = request.data if isinstance(request.data, dict) else {}
+        if ('before' in data) == ('after' in data):
+            raise ValidationError({'non_field_errors': ['Give exactly one of "before" or "after".']})
+        name = 'after' if 'after' in data else 'before'
+        target = scope_of(instance).filter(pk=self.parse_rank_pk(data[name], name)).only(*self.get_rank_columns()).first()
+        if target is None or target.pk == instance.pk:
+            raise ValidationError({name: ['Expected another row of the same list.']})
+
+        move(instance, target, after=name == 'after')
+        field = RANK_FIELDS[type(instance)]
+        return Response({'id': instance.pk, field: getattr(instance, field)})
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        data = request.data.get('ids') if isinstance(request.data, dict) else request.data
+        if not isinstance(data, list) or not data:
+            raise ValidationError({'ids': ['Expected a non-empty list of ids.']})
+        if len(data) > self.reorder_max_rows:
+            raise ValidationError({'ids': [f'At most {self.reorder_max_rows} ids per request.']})
+        pks = [self.parse_rank_pk(value, 'ids') for value in data]
+        if len(set(pks)) != len(pks):
+            raise ValidationError({'ids': ['Ids must not repeat.']})
+
+        model = self.get_ranked_model()
+        field = RANK_FIELDS[model]
+        rows = self.get_ranked_queryset().filter(pk__in=pks).only(*self.get_rank_columns())
+        rows = {row.pk: row for row in rows}
+        missing = [str(pk) for pk in pks if pk not in rows]
+        if missing:
+            raise ValidationError({'ids': [f"Unknown id(s): {', '.join(missing)}"]})
+        ordered = [rows[pk] for pk in pks]
+        if len({scope_id(row) for row in ordered}) > 1:
+            raise ValidationError({'ids': ['All rows must belong to the same list.']})
+
+        reorder(ordered, request.user.pk)
+        return Response([{'id': row.pk, field: getattr(row, field)} for row in ordered])
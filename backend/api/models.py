@@ -1,6 +1,11 @@
+import hashlib
 import uuid
-from django.db import models
+from collections import defaultdict
+from difflib import SequenceMatcher
+from django.db import models, transaction
+from django.db.models.functions import Greatest, Least
 from django.contrib.auth.models import User
+from .fields import CompressedTextField
 
 class Gender(models.TextChoices):
     MALE = 'MALE', 'Male'
@@ -41,16 +46,71 @@ class RelationshipType(models.TextChoices):
     LOVER = 'LOVER', 'Lover'
     FAMILY = 'FAMILY', 'Family'
 
+# One bit per relationship type, in declaration order
+RELATIONSHIP_TYPE_BITS = {value: 1 << index for index, value in enumerate(RelationshipType.values)}
+ALL_RELATIONSHIP_TYPES = sum(RELATIONSHIP_TYPE_BITS.values())
+
+def relationship_types_to_mask(types):
+    mask = 0
+    for value in types or []:
+        mask |= RELATIONSHIP_TYPE_BITS[value]
+    return mask
+
+def relationship_mask_to_types(mask):
+    return [value for value, bit in RELATIONSHIP_TYPE_BITS.items() if mask & bit]
+
+def masks_with_types(types):
+    """
+    Every type mask sharing a type with the given ones, for an indexed
+    type_mask__in lookup.
+    """
+    wanted = relationship_types_to_mask(types)
+    return [mask for mask in range(ALL_RELATIONSHIP_TYPES + 1) if mask & wanted]
+
+class CharacterRelationshipQuerySet(models.QuerySet):
+    def with_types(self, types):
+        return self.filter(type_mask__in=masks_with_types(types))
+
+    def between(self, character_a, character_b):
+        """
+        Relationships between two characters in either direction, through
+        the unordered pair index.
+        """
+        low, high = sorted([getattr(character_a, 'pk', character_a), getattr(character_b, 'pk', character_b)])
+        return self.filter(pair_low=low, pair_high=high)
+
 class CharacterRelationship(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     from_character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='relationships_from')
     to_character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name='relationships_to')
-    types = models.JSONField(default=list)  # Store multiple relationship types as a list
+    type_mask = models.PositiveSmallIntegerField(default=0, db_index=True)  # RELATIONSHIP_TYPE_BITS combined
     description = models.TextField(blank=True)
+    # The two characters in a fixed order, whatever the direction
+    pair_low = models.GeneratedField(
+        expression=Least('from_character', 'to_character'), output_field=models.UUIDField(), db_persist=True
+    )
+    pair_high = models.GeneratedField(
+        expression=Greatest('from_character', 'to_character'), output_field=models.UUIDField(), db_persist=True
+    )
+
+    objects = CharacterRelationshipQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pair_low', 'pair_high'], name='relationship_pair_idx'),
+        ]
 
     def __str__(self):
         return f"Relationship from {self.from_character.name} to {self.to_character.name}"
 
+    @property
+    def types(self):
+        return relationship_mask_to_types(self.type_mask)
+
+    @types.setter
+    def types(self, types):
+        self.type_mask = relationship_types_to_mask(types)
+
 class CharacterArcType(models.TextChoices):
     POSITIVE = 'POSITIVE', 'Positive'
     NEGATIVE = 'NEGATIVE', 'Negative'
@@ -79,6 +139,105 @@ class Place(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored parent so save() can tell a move from an edit
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def is_inside(self, place_id):
+        """
+        Whether the given place is this one or lies below it.
+        """
+        return PlaceClosure.objects.filter(ancestor_id=self.pk, descendant_id=place_id).exists()
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        moved = not adding and getattr(self, '_loaded_parent_id', self.parent_id) != self.parent_id
+        if moved and self.parent_id and self.is_inside(self.parent_id):
+            raise ValueError('A place cannot be moved inside its own subtree')
+        # The parent and the closure rows change together or not at all
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                PlaceClosure.objects.insert_node(self)
+            elif moved:
+                PlaceClosure.objects.move_subtree(self)
+        self._loaded_parent_id = self.parent_id
+
+class PlaceClosureManager(models.Manager):
+    def insert_node(self, place):
+        links = [self.model(ancestor_id=place.pk, descendant_id=place.pk, depth=0)]
+        if place.parent_id:
+            links += [
+                self.model(ancestor_id=ancestor_id, descendant_id=place.pk, depth=depth + 1)
+                for ancestor_id, depth in self.filter(descendant_id=place.parent_id).values_list('ancestor_id', 'depth')
+            ]
+        self.bulk_create(links)
+
+    def insert_many(self, place_ids):
+        """
+        Add the links of many new places at once, e.g. after a bulk import.
+        Parents may be among the new places or already linked.
+        """
+        parents = dict(Place.objects.filter(pk__in=place_ids).values_list('id', 'parent_id'))
+        known = defaultdict(list)
+        outside = {parent_id for parent_id in parents.values() if parent_id and parent_id not in parents}
+        for ancestor_id, descendant_id, depth in self.filter(descendant_id__in=outside).values_list(
+            'ancestor_id', 'descendant_id', 'depth'
+        ):
+            known[descendant_id].append((ancestor_id, depth))
+
+        def ancestors_of(place_id):
+            if place_id not in known:
+                parent_id = parents[place_id]
+                above = ancestors_of(parent_id) if parent_id else []
+                known[place_id] = [(place_id, 0)] + [(ancestor_id, depth + 1) for ancestor_id, depth in above]
+            return known[place_id]
+
+        self.bulk_create([
+            self.model(ancestor_id=ancestor_id, descendant_id=place_id, depth=depth)
+            for place_id in parents
+            for ancestor_id, depth in ancestors_of(place_id)
+        ], batch_size=1000)
+
+    def move_subtree(self, place):
+        subtree = list(self.filter(ancestor_id=place.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        if place.parent_id in subtree_ids:
+            raise ValueError('A place cannot be moved inside its own subtree')
+
+        # Detach the subtree from its old ancestors, then graft it under the new parent
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if place.parent_id:
+            ancestors = self.filter(descendant_id=place.parent_id).values_list('ancestor_id', 'depth')
+            self.bulk_create([
+                self.model(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            ])
+
+class PlaceClosure(models.Model):
+    """
+    Ancestor/descendant pairs of the place hierarchy, including each place
+    paired with itself at depth 0. Maintained by Place.save(); rows are
+    removed by the cascade when a place is deleted.
+    """
+    ancestor = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Place, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    objects = PlaceClosureManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_place_closure'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='place_closure_descendant_idx'),
+        ]
+
 class Item(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='items')
@@ -100,6 +259,15 @@ class Event(models.Model):
     place = models.ForeignKey(Place, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
     items = models.ManyToManyField(Item, related_name='events', blank=True)
     time_order = models.IntegerField(default=0)
+    # Position in the author's list, spaced out by ranking.py; time_order
+    # stays the user's own value
+    rank = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'time_order', 'id'], name='event_author_time_idx'),
+            models.Index(fields=['author', 'rank', 'id'], name='event_author_rank_idx'),
+        ]
 
     def __str__(self):
         return self.description[:50]
@@ -109,7 +277,7 @@ class Story(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories')
     title = models.CharField(max_length=255)
     promise = models.TextField(blank=True)
-    plot = models.TextField(blank=True)
+    plot = CompressedTextField(blank=True)
     emotional_matter = models.TextField(blank=True)
     universal_truth = models.TextField(blank=True)
     logline = models.TextField(blank=True)
@@ -130,10 +298,19 @@ class Scene(models.Model):
     items = models.ManyToManyField(Item, related_name='scenes', blank=True)
     shown_events = models.ManyToManyField(Event, related_name='shown_in_scenes', blank=True)
     told_events = models.ManyToManyField(Event, related_name='told_in_scenes', blank=True)
-    external_conflict = models.TextField(blank=True)
-    interpersonal_conflict = models.TextField(blank=True)
-    internal_conflict = models.TextField(blank=True)
+    external_conflict = CompressedTextField(blank=True)
+    interpersonal_conflict = CompressedTextField(blank=True)
+    internal_conflict = CompressedTextField(blank=True)
     time_order = models.IntegerField(default=0)
+    # Position in the author's list, spaced out by ranking.py; time_order
+    # stays the user's own value
+    rank = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'time_order', 'id'], name='scene_author_time_idx'),
+            models.Index(fields=['author', 'rank', 'id'], name='scene_author_rank_idx'),
+        ]
 
     def __str__(self):
         return self.short_description
@@ -160,16 +337,431 @@ class Idea(models.Model):
     def __str__(self):
         return f"{self.get_type_display()} idea: {self.content[:50]}"
 
+class IdeaTagManager(models.Manager):
+    def sync(self, idea_ids):
+        """
+        Rewrite the tag rows of the given ideas from their tags lists.
+        """
+        ideas = Idea.objects.filter(pk__in=idea_ids).values_list('id', 'author_id', 'tags')
+        rows = [
+            self.model(idea_id=idea_id, author_id=author_id, tag=tag)
+            for idea_id, author_id, tags in ideas
+            for tag in dict.fromkeys(tags or [])
+            if isinstance(tag, str)
+        ]
+        self.filter(idea_id__in=idea_ids).delete()
+        self.bulk_create(rows, batch_size=1000)
+
+class IdeaTag(models.Model):
+    """
+    One row per tag of an idea, mirroring Idea.tags so tag filters and
+    counts use an index instead of reading every idea. Maintained from the
+    idea signals; rows go away with the idea.
+    """
+    idea = models.ForeignKey(Idea, on_delete=models.CASCADE, related_name='tag_rows')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idea_tags')
+    tag = models.CharField(max_length=100)
+
+    objects = IdeaTagManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['idea', 'tag'], name='unique_idea_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'tag'], name='idea_tag_author_idx'),
+        ]
+
+class IdeaLinkManager(models.Manager):
+    def sync(self, idea_ids):
+        """
+        Rewrite the link rows of the given ideas from their linked_elements.
+        """
+        rows = []
+        ideas = Idea.objects.filter(pk__in=idea_ids).values_list('id', 'author_id', 'linked_elements')
+        for idea_id, author_id, elements in ideas:
+            element_ids = set()
+            for element in elements or []:
+                try:
+                    element_ids.add(uuid.UUID(str(element)))
+                except ValueError:
+                    continue
+            rows += [self.model(idea_id=idea_id, author_id=author_id, element_id=element_id) for element_id in element_ids]
+        self.filter(idea_id__in=idea_ids).delete()
+        self.bulk_create(rows, batch_size=1000)
+
+class IdeaLink(models.Model):
+    """
+    Reverse index of Idea.linked_elements: one row per idea and linked id,
+    so the ideas pointing at an element are found without scanning every
+    idea. Maintained from the idea signals; rows go away with the idea.
+    """
+    idea = models.ForeignKey(Idea, on_delete=models.CASCADE, related_name='link_rows')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idea_links')
+    element_id = models.UUIDField()
+
+    objects = IdeaLinkManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['idea', 'element_id'], name='unique_idea_link'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'element_id'], name='idea_link_element_idx'),
+        ]
+
+# Spacing of ChapterScene.position, as RANK_GAP in ranking.py
+CHAPTER_SCENE_GAP = 1024
+
 class Chapter(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='chapters')
-    included_scenes = models.ManyToManyField(Scene, related_name='chapters', blank=True)
+    included_scenes = models.ManyToManyField(Scene, through='ChapterScene', related_name='chapters', blank=True)
     order = models.IntegerField(default=0)
     title = models.TextField()
-    content = models.TextField(blank=True)
+    # Hash of the text (see text_digest), rewritten with it; the text itself
+    # is stored as ChapterChunk rows
+    content_hash = models.CharField(max_length=32, editable=False)
+
+    # Text as assigned, or as joined from the chunks on first use
+    _content = None
+    # Text as last read from or written to the chunks, when known; lets
+    # the next revision be diffed without rebuilding the latest one
+    loaded_content = None
+    # Whether the text was assigned since it was loaded; during a save,
+    # whether that save writes it (post_save receivers check this)
+    content_changed = False
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['story', 'order'], name='chapter_story_order_idx'),
+        ]
+
+    @property
+    def content(self):
+        if self._content is None:
+            if self._state.adding:
+                self._content = ''
+            else:
+                # Chunks prefetched with ChapterChunk.objects.prefetch() save the query
+                chunks = getattr(self, '_prefetched_objects_cache', {}).get('chunks')
+                if chunks is None:
+                    chunks = ChapterChunk.objects.filter(chapter_id=self.pk).order_by('position', 'pk').only('text')
+                self._content = join_paragraphs(chunk.text for chunk in chunks)
+                self.loaded_content = self._content
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self.content_changed = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        if fields is None or 'content' in fields:
+            self._content, self.loaded_content, self.content_changed = None, None, False
+            getattr(self, '_prefetched_objects_cache', {}).pop('chunks', None)
+            if fields is not None:
+                fields = [name for name in fields if name != 'content']
+                if not fields:
+                    return
+        super().refresh_from_db(using, fields, **kwargs)
+
+    def save(self, *args, **kwargs):
+        """
+        Saving with update_fields=['content'] (or all fields) stores an
+        assigned text: the paragraphs that changed and the content hash.
+        """
+        update_fields = kwargs.get('update_fields')
+        write_content = self._state.adding or (
+            self.content_changed and (update_fields is None or 'content' in update_fields)
+        )
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = [name for name in update_fields if name != 'content'] + ['content_hash']
+        if write_content:
+            self.content_hash = text_digest(self.content)
+        pending, self.content_changed = self.content_changed, write_content
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if write_content:
+                ChapterChunk.objects.sync_text(self.pk, self.content)
+        self.content_changed = pending and not write_content
+        if write_content:
+            self.loaded_content = self.content
+        getattr(self, '_prefetched_objects_cache', {}).pop('chunks', None)
+
+class ChapterSceneManager(models.Manager):
+    def set_order(self, chapter, scenes):
+        """
+        Make the chapter include exactly these scenes, in this order.
+        Returns whether any link changed.
+        """
+        scene_ids = [getattr(scene, 'pk', scene) for scene in scenes]
+        links = {link.scene_id: link for link in self.filter(chapter=chapter)}
+        removed, _ = self.filter(chapter=chapter).exclude(scene_id__in=scene_ids).delete()
+        created, updated = [], []
+        for index, scene_id in enumerate(scene_ids, start=1):
+            position = index * CHAPTER_SCENE_GAP
+            link = links.get(scene_id)
+            if link is None:
+                created.append(self.model(chapter=chapter, scene_id=scene_id, position=position))
+            elif link.position != position:
+                link.position = position
+                updated.append(link)
+        self.bulk_create(created)
+        self.bulk_update(updated, ['position'])
+        return bool(removed or created or updated)
+
+class ChapterScene(models.Model):
+    """
+    Ordered link between a chapter and the scenes it includes. Positions
+    are spaced out (see ranking.py) so inserting or moving a scene rewrites
+    only its own row.
+    """
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='scene_links')
+    scene = models.ForeignKey(Scene, on_delete=models.CASCADE, related_name='chapter_links')
+    position = models.IntegerField(default=0)
+
+    objects = ChapterSceneManager()
+
+    class Meta:
+        db_table = 'api_chapter_included_scenes'
+        unique_together = [('chapter', 'scene')]
+        indexes = [
+            models.Index(fields=['chapter', 'position'], name='chapter_scene_position_idx'),
+        ]
+
+PARAGRAPH_SEPARATOR = '\n\n'
+
+def split_paragraphs(text):
+    return text.split(PARAGRAPH_SEPARATOR) if text else []
+
+def join_paragraphs(paragraphs):
+    return PARAGRAPH_SEPARATOR.join(paragraphs)
+
+def text_digest(text):
+    # Identifies paragraph chunks and whole chapter revisions alike
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+class ChapterChunkManager(models.Manager):
+    def prefetch(self, lookup='chunks'):
+        """
+        Prefetch of chapters' chunks in the order Chapter.content joins them.
+        """
+        return models.Prefetch(lookup, queryset=self.order_by('position', 'pk').only('chapter', 'text'))
+
+    def texts(self, chapter_ids):
+        """
+        Chapter id -> text, for any number of chapters in one query.
+        """
+        paragraphs = defaultdict(list)
+        rows = self.filter(chapter_id__in=chapter_ids).order_by('chapter_id', 'position', 'pk')
+        for chapter_id, text in rows.values_list('chapter_id', 'text').iterator(chunk_size=2000):
+            paragraphs[chapter_id].append(text)
+        return {chapter_id: join_paragraphs(paragraphs[chapter_id]) for chapter_id in chapter_ids}
+
+    def add_texts(self, texts):
+        """
+        Store the text of new chapters, {chapter id: text}, in one insert.
+        """
+        self.bulk_create([
+            self.model(chapter_id=chapter_id, position=number * CHAPTER_SCENE_GAP, digest=text_digest(text), text=text)
+            for chapter_id, content in texts.items()
+            for number, text in enumerate(split_paragraphs(content), start=1)
+        ], batch_size=500)
+
+    def sync_text(self, chapter_id, content):
+        """
+        Bring the chunks of a chapter in line with its new text, writing
+        only the paragraphs that changed. Existing chunks are matched by
+        digest, so their text is never read back.
+        """
+        chunks = list(self.filter(chapter_id=chapter_id).order_by('position', 'pk').only('pk', 'position', 'digest'))
+        paragraphs = split_paragraphs(content)
+        digests = [text_digest(text) for text in paragraphs]
+        matcher = SequenceMatcher(None, [chunk.digest for chunk in chunks], digests, autojunk=False)
+
+        # The new chunk list, reusing rows for equal and replaced paragraphs
+        result, rewritten, removed = [], [], []
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            old, new = chunks[old_start:old_end], range(new_start, new_end)
+            if tag == 'equal':
+                result += old
+                continue
+            for chunk, index in zip(old, new):
+                chunk.text, chunk.digest = paragraphs[index], digests[index]
+                rewritten.append(chunk)
+                result.append(chunk)
+            removed += old[len(new):]
+            result += [
+                self.model(chapter_id=chapter_id, text=paragraphs[index], digest=digests[index])
+                for index in new[len(old):]
+            ]
+
+        created = [chunk for chunk in result if chunk.pk is None]
+        moved = []
+        if created and not self.place(result):
+            # No room left between some neighbours: respace the chapter
+            rewritten_pks = {chunk.pk for chunk in rewritten}
+            for number, chunk in enumerate(result, start=1):
+                if chunk.position != number * CHAPTER_SCENE_GAP:
+                    chunk.position = number * CHAPTER_SCENE_GAP
+                    if chunk.pk is not None and chunk.pk not in rewritten_pks:
+                        moved.append(chunk)
+        if removed:
+            self.filter(pk__in=[chunk.pk for chunk in removed]).delete()
+        self.bulk_update(rewritten, ['position', 'digest', 'text'], batch_size=500)
+        self.bulk_update(moved, ['position'], batch_size=500)
+        self.bulk_create(created, batch_size=500)
+
+    def place(self, chunks):
+        """
+        Give new chunks (no pk yet) positions between their kept neighbours.
+        Returns False when some run of them does not fit.
+        """
+        previous, run = 0, []
+        for chunk in chunks + [None]:
+            if chunk is not None and chunk.pk is None:
+                run.append(chunk)
+                continue
+            if run:
+                if chunk is None:
+                    step = CHAPTER_SCENE_GAP
+                else:
+                    step = (chunk.position - previous) // (len(run) + 1)
+                    if step < 1:
+                        return False
+                for number, new_chunk in enumerate(run, start=1):
+                    new_chunk.position = previous + number * step
+                run = []
+            if chunk is not None:
+                previous = chunk.position
+        return True
+
+    def paragraphs(self, chapter, start=0, count=None):
+        chunks = self.filter(chapter=chapter).order_by('position', 'pk')
+        end = None if count is None else start + count
+        return list(chunks.values_list('text', flat=True)[start:end])
+
+class ChapterChunk(models.Model):
+    """
+    One paragraph of a chapter: chunks are where chapter text is stored,
+    Chapter.content joins them. Lets clients read and write a chapter a
+    few paragraphs at a time; positions are spaced out like
+    ChapterScene.position so a new paragraph is inserted without
+    renumbering the ones after it.
+    """
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='chunks')
+    position = models.IntegerField()
+    digest = models.CharField(max_length=32)
+    text = CompressedTextField(blank=True)
+
+    objects = ChapterChunkManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chapter', 'position'], name='chapter_chunk_position_idx'),
+        ]
+
+class ChapterRevision(models.Model):
+    """
+    One saved state of a chapter's content. Every few revisions hold the
+    whole text (a snapshot); the others hold the changes from the revision
+    before them (a delta), see revisions.py. Both are zlib-compressed.
+    """
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=32)
+    length = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chapter', 'number'], name='unique_chapter_revision'),
+        ]
+
+class ChangeVersion(models.Model):
+    """
+    Per-author change counter for one model, bumped whenever a row of that
+    model (or one of its many-to-many links) is saved or deleted. Shared
+    models such as Race are counted with no author.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='change_versions')
+    model = models.CharField(max_length=100)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'model'], name='unique_change_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} v{self.version}"
+
+class SearchDocument(models.Model):
+    """
+    Denormalized text of one searchable row (idea, scene, chapter, event or
+    story), kept in sync by signals. The full-text index over it lives
+    outside the ORM: a generated tsvector column with a GIN index on
+    Postgres, an FTS5 table maintained by triggers on SQLite.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_documents')
+    kind = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+class PendingSearchDocument(models.Model):
+    """
+    A row whose SearchDocument is out of date. Chapters are queued here
+    instead of being reindexed on every save, so autosaves do not rewrite
+    the whole chapter body each time; the queue is drained before the
+    author's next search.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_search_documents')
+    kind = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_pending_search_document'),
+        ]
+
+class StoryStats(models.Model):
+    """
+    Counts over one story, kept current by the signal handlers in
+    stats.py: words and characters of its chapters' content, distinct
+    scenes included in its chapters, its events, and distinct characters
+    appearing in those scenes.
+    """
+    story = models.OneToOneField(Story, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    chapters = models.PositiveIntegerField(default=0)
+    words = models.PositiveIntegerField(default=0)
+    characters = models.PositiveIntegerField(default=0)
+    scenes = models.PositiveIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+    appearing_characters = models.PositiveIntegerField(default=0)
+
+class ChapterStats(models.Model):
+    """
+    The same counts for one chapter; its events are those shown or told in
+    its scenes.
+    """
+    chapter = models.OneToOneField(Chapter, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # The story whose totals include this chapter
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='chapter_stats')
+    words = models.PositiveIntegerField(default=0)
+    characters = models.PositiveIntegerField(default=0)
+    scenes = models.PositiveIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+    appearing_characters = models.PositiveIntegerField(default=0)
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class StableCursorPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed, unique ordering, so every page costs
+    the same whatever its position in the author's collection.
+
+    Viewsets can set ``cursor_ordering`` to page in a more meaningful
+    order; it should end with a unique field to keep cursors stable.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
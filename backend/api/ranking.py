@@ -0,0 +1,164 @@
+"""
+Gap-based ordering for scenes and events (rank, per author), chapters
+(order, per story) and the scenes of a chapter (position, per chapter).
+Scene and event ranks only order the author's lists: time_order is the
+user's own value and the timeline's sort key, and is never rewritten.
+
+Ranks are spaced RANK_GAP apart, so moving a row between two neighbours
+gives it the midpoint of their ranks: one UPDATE of one row. Only when two
+neighbours have no room left between them is the whole scope renumbered,
+which the rebalance_ranks command can also do ahead of time.
+"""
+from django.db import transaction
+from django.db.models import Max, Q
+from .models import CHAPTER_SCENE_GAP, Chapter, ChapterScene, Event, Scene
+from .signals import bulk_changed
+from .versioning import get_author_id
+
+RANK_GAP = CHAPTER_SCENE_GAP
+RANK_LIMIT = 2 ** 31 - 1
+
+RANK_FIELDS = {
+    Scene: 'rank',
+    Event: 'rank',
+    Chapter: 'order',
+    ChapterScene: 'position',
+}
+
+# Rows sharing this foreign key are ordered together
+SCOPE_FIELDS = {
+    Scene: 'author',
+    Event: 'author',
+    Chapter: 'story',
+    ChapterScene: 'chapter',
+}
+
+
+def scope_id(instance):
+    return getattr(instance, f'{SCOPE_FIELDS[type(instance)]}_id')
+
+def scope_of(instance):
+    """
+    Rows ordered together with the given one.
+    """
+    model = type(instance)
+    return model.objects.filter(**{f'{SCOPE_FIELDS[model]}_id': scope_id(instance)})
+
+def notify(model, author_id, rows):
+    if not rows:
+        return
+    if model is ChapterScene:
+        # Scene order is part of the chapter
+        chapter_ids = sorted({row.chapter_id for row in rows})
+        bulk_changed.send(sender=Chapter, author_id=author_id, action='update', pks=chapter_ids, related_models=(Scene,), fields=[])
+    else:
+        bulk_changed.send(sender=model, author_id=author_id, action='update', pks=[row.pk for row in rows], related_models=(), fields=[RANK_FIELDS[model]])
+
+def rebalance(scope, author_id=None):
+    """
+    Renumber every row of a scope RANK_GAP apart, keeping their order.
+    Returns the number of rows whose rank changed.
+    """
+    model = scope.model
+    field = RANK_FIELDS[model]
+    rows = list(scope.order_by(field, 'pk').only('pk', field, f'{SCOPE_FIELDS[model]}_id'))
+    changed = []
+    for position, row in enumerate(rows, start=1):
+        if getattr(row, field) != position * RANK_GAP:
+            setattr(row, field, position * RANK_GAP)
+            changed.append(row)
+    model.objects.bulk_update(changed, [field], batch_size=1000)
+    if changed:
+        notify(model, author_id if author_id is not None else get_author_id(rows[0]), changed)
+    return len(changed)
+
+def neighbour(scope, field, target, after):
+    """
+    Rank of the row right before (or after) target, or None at the end.
+    """
+    rank = getattr(target, field)
+    if after:
+        rows = scope.filter(Q(**{f'{field}__gt': rank}) | Q(**{field: rank, 'pk__gt': target.pk}))
+        rows = rows.order_by(field, 'pk')
+    else:
+        rows = scope.filter(Q(**{f'{field}__lt': rank}) | Q(**{field: rank, 'pk__lt': target.pk}))
+        rows = rows.order_by(f'-{field}', '-pk')
+    return rows.values_list(field, flat=True).first()
+
+def free_rank(scope, field, target, after):
+    target_rank = getattr(target, field)
+    other = neighbour(scope, field, target, after)
+    if other is None:
+        rank = target_rank + RANK_GAP if after else target_rank - RANK_GAP
+        return rank if -RANK_LIMIT <= rank <= RANK_LIMIT else None
+    if abs(other - target_rank) < 2:
+        return None
+    return (other + target_rank) // 2
+
+def next_ranks(scope, count=1):
+    """
+    Ranks for ``count`` rows added after the last one of a scope,
+    rebalancing it first if they would not fit.
+    """
+    field = RANK_FIELDS[scope.model]
+    last = scope.aggregate(last=Max(field))['last']
+    if last is not None and last + count * RANK_GAP > RANK_LIMIT:
+        rebalance(scope)
+        last = scope.aggregate(last=Max(field))['last']
+    start = RANK_GAP if last is None else last + RANK_GAP
+    return [start + index * RANK_GAP for index in range(count)]
+
+def append(instance):
+    """
+    Give a new row the rank after the last one of its scope.
+    """
+    setattr(instance, RANK_FIELDS[type(instance)], next_ranks(scope_of(instance))[0])
+    instance.save()
+    return instance
+
+def move(instance, target, after=False):
+    """
+    Place ``instance`` right before (or after) ``target`` in their scope;
+    a new row is inserted there.
+    """
+    model = type(instance)
+    field = RANK_FIELDS[model]
+    with transaction.atomic():
+        scope = scope_of(instance).exclude(pk=instance.pk)
+        rank = free_rank(scope, field, target, after)
+        if rank is None:
+            rebalance(scope_of(instance))
+            target.refresh_from_db(fields=[field])
+            rank = free_rank(scope, field, target, after)
+        setattr(instance, field, rank)
+        if instance._state.adding:
+            instance.save()
+        else:
+            instance.save(update_fields=[field])
+    return instance
+
+def reorder(rows, author_id):
+    """
+    Put the given rows (all from one scope) in the given order, reusing the
+    rank slots they already hold, so rows left out keep their place.
+    """
+    if not rows:
+        return
+    model = type(rows[0])
+    field = RANK_FIELDS[model]
+    with transaction.atomic():
+        slots = sorted(getattr(row, field) for row in rows)
+        if len(set(slots)) < len(slots):
+            # Equal ranks leave no distinct slots to hand out
+            rebalance(scope_of(rows[0]), author_id)
+            ranks = dict(scope_of(rows[0]).filter(pk__in=[row.pk for row in rows]).values_list('pk', field))
+            for row in rows:
+                setattr(row, field, ranks[row.pk])
+            slots = sorted(ranks.values())
+        changed = []
+        for row, rank in zip(rows, slots):
+            if getattr(row, field) != rank:
+                setattr(row, field, rank)
+                changed.append(row)
+        model.objects.bulk_update(changed, [field], batch_size=1000)
+        notify(model, author_id, changed)
@@ -0,0 +1,133 @@
+"""
+Chapter revisions and text diffs.
+
+A revision is identified by the hash of the chapter content, so clients
+can name the text they edited. Diffs are lists of changes ``{"start",
+"end", "text"}`` replacing characters start..end-1 of the base text
+(offsets in code points, sorted and not overlapping).
+
+Saved revisions are kept in ChapterRevision: a full snapshot at least
+every SNAPSHOT_INTERVAL revisions and, in between, the diff from the
+previous revision, so rebuilding any revision decompresses one snapshot
+and applies fewer than SNAPSHOT_INTERVAL diffs. Saving the same content
+as the latest revision records nothing.
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+from django.db import transaction
+from django.db.models import Max
+from .models import Chapter, ChapterChunk, ChapterRevision, text_digest
+
+SNAPSHOT_INTERVAL = 20
+
+
+class InvalidChanges(ValueError):
+    pass
+
+
+def apply_changes(text, changes):
+    """
+    The text with the given changes applied, all offsets referring to the
+    original text.
+    """
+    if not isinstance(changes, list):
+        raise InvalidChanges('Expected a list of changes.')
+    parts, position = [], 0
+    for change in changes:
+        if not isinstance(change, dict):
+            raise InvalidChanges('Expected changes as objects with start, end and text.')
+        start, end, replacement = change.get('start'), change.get('end', change.get('start')), change.get('text', '')
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (start, end)):
+            raise InvalidChanges('Change offsets must be integers.')
+        if not isinstance(replacement, str):
+            raise InvalidChanges('Change text must be a string.')
+        if not position <= start <= end <= len(text):
+            raise InvalidChanges('Changes must be sorted, must not overlap and must stay within the text.')
+        parts += [text[position:start], replacement]
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+def diff_changes(old, new):
+    """
+    Changes turning ``old`` into ``new``, matched line by line.
+    """
+    old_lines, new_lines = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    offsets = [0]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        {'start': offsets[old_start], 'end': offsets[old_end], 'text': ''.join(new_lines[new_start:new_end])}
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+def snapshot_data(text):
+    return zlib.compress(text.encode())
+
+def delta_data(changes):
+    return zlib.compress(json.dumps(changes, separators=(',', ':')).encode())
+
+def rebuild(chapter_id, number):
+    """
+    Content of one revision of a chapter, from its nearest snapshot.
+    """
+    revisions = ChapterRevision.objects.filter(chapter_id=chapter_id, number__lte=number)
+    snapshot = revisions.filter(is_snapshot=True).order_by('-number').values_list('number', 'data').first()
+    if snapshot is None:
+        raise ChapterRevision.DoesNotExist(f'No snapshot before revision {number}.')
+    snapshot_number, data = snapshot
+    text = zlib.decompress(data).decode()
+    deltas = revisions.filter(number__gt=snapshot_number).order_by('number').values_list('data', flat=True)
+    for data in deltas:
+        text = apply_changes(text, json.loads(zlib.decompress(data)))
+    return text
+
+def record_revision(chapter_id, content, previous=None):
+    """
+    Store the chapter's content as its next revision, unless it is the
+    same as the latest one. ``previous`` is the text being replaced, if
+    the caller has it; when it matches the latest revision the delta is
+    taken from it instead of rebuilding that revision. Returns the new
+    revision or None.
+    """
+    with transaction.atomic():
+        # Concurrent saves of one chapter number their revisions in turn
+        Chapter.objects.select_for_update().filter(pk=chapter_id).values_list('pk').first()
+        revisions = ChapterRevision.objects.filter(chapter_id=chapter_id)
+        latest = revisions.order_by('-number').values_list('number', 'content_hash').first()
+        content_hash = text_digest(content)
+        if latest is not None and latest[1] == content_hash:
+            return None
+
+        number = latest[0] + 1 if latest else 1
+        is_snapshot, data = True, snapshot_data(content)
+        if latest is not None:
+            last_snapshot = revisions.filter(is_snapshot=True).aggregate(number=Max('number'))['number'] or 0
+            if number - last_snapshot < SNAPSHOT_INTERVAL:
+                if previous is None or text_digest(previous) != latest[1]:
+                    previous = rebuild(chapter_id, latest[0])
+                delta = delta_data(diff_changes(previous, content))
+                # A rewrite can leave a diff larger than the text itself
+                if len(delta) < len(data):
+                    is_snapshot, data = False, delta
+        return ChapterRevision.objects.create(
+            chapter_id=chapter_id, number=number, content_hash=content_hash,
+            length=len(content), is_snapshot=is_snapshot, data=data,
+        )
+
+def record_first_revisions(chapter_ids):
+    """
+    Snapshot chapters written in bulk that have no revision yet.
+    """
+    chapters = Chapter.objects.filter(pk__in=chapter_ids).exclude(revisions__isnull=False)
+    texts = ChapterChunk.objects.texts(list(chapters.values_list('id', flat=True)))
+    ChapterRevision.objects.bulk_create([
+        ChapterRevision(
+            chapter_id=chapter_id, number=1, content_hash=text_digest(content),
+            length=len(content), is_snapshot=True, data=snapshot_data(content),
+        )
+        for chapter_id, content in texts.items()
+    ], batch_size=500)
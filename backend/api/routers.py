@@ -0,0 +1,16 @@
+from rest_framework.routers import DefaultRouter
+
+
+class BulkRouter(DefaultRouter):
+    """
+    DefaultRouter that also routes PATCH and DELETE on list URLs to the
+    bulk_update and bulk_destroy actions of viewsets that define them.
+    """
+    routes = [
+        DefaultRouter.routes[0]._replace(mapping={
+            **DefaultRouter.routes[0].mapping,
+            'patch': 'bulk_update',
+            'delete': 'bulk_destroy',
+        }),
+        *DefaultRouter.routes[1:],
+    ]
@@ -0,0 +1,204 @@
+"""
+Full-text search over the author's writing.
+
+Searchable rows are copied into SearchDocument (a title and a body per
+row) by the signal handlers in signals.py. Chapters, saved on every
+autosave, are only queued there (PendingSearchDocument) and reindexed
+before the author's next search. The database indexes those documents
+itself: Postgres through a stored tsvector column with a GIN index,
+SQLite through an external-content FTS5 table kept current by triggers.
+Both are created in migration 0006; other backends fall back to an
+unranked substring scan.
+"""
+import re
+import uuid
+from collections import defaultdict
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+from .models import Chapter, ChapterChunk, Event, Idea, PendingSearchDocument, Scene, SearchDocument, Story
+from .versioning import get_author_id
+
+# Searchable models: (title field, body fields)
+SEARCH_FIELDS = {
+    Idea: (None, ('content',)),
+    Scene: ('short_description', ('external_conflict', 'interpersonal_conflict', 'internal_conflict')),
+    Chapter: ('title', ('content',)),
+    Event: (None, ('description',)),
+    Story: ('title', ('promise', 'plot', 'emotional_matter', 'universal_truth', 'logline')),
+}
+
+SEARCH_KINDS = {model._meta.model_name: model for model in SEARCH_FIELDS}
+
+# Models whose saves queue a reindex for the author's next search instead
+# of rebuilding the document right away (see PendingSearchDocument)
+DEFERRED_MODELS = (Chapter,)
+
+FTS_TABLE = 'api_searchdocument_fts'
+TEXT_SEARCH_CONFIG = 'english'
+TITLE_LENGTH = 80
+
+# Placeholders for the highlight markers, swapped for <mark> once the
+# snippet text has been escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def search_document(instance):
+    title_field, body_fields = SEARCH_FIELDS[type(instance)]
+    title = getattr(instance, title_field) if title_field else ''
+    body = '\n'.join(getattr(instance, name) for name in body_fields if getattr(instance, name))
+    return title or '', body
+
+def index_rows(model, pks):
+    """
+    (Re)build the search documents of the given rows in one read and a
+    handful of writes.
+    """
+    if not pks:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if model is Chapter:
+        queryset = queryset.annotate(story_author_id=F('story__author_id')).prefetch_related(ChapterChunk.objects.prefetch())
+    index_instances(model, list(queryset))
+
+def index_instances(model, rows):
+    """
+    Same as index_rows for rows already loaded, e.g. the row being saved.
+    """
+    kind = model._meta.model_name
+    existing = {
+        document.object_id: document
+        for document in SearchDocument.objects.filter(kind=kind, object_id__in=[row.pk for row in rows])
+    }
+    created, updated = [], []
+    for row in rows:
+        title, body = search_document(row)
+        author_id = getattr(row, 'story_author_id', None) or get_author_id(row)
+        document = existing.get(row.pk)
+        if document is None:
+            created.append(SearchDocument(author_id=author_id, kind=kind, object_id=row.pk, title=title, body=body))
+        elif (document.author_id, document.title, document.body) != (author_id, title, body):
+            document.author_id, document.title, document.body = author_id, title, body
+            updated.append(document)
+    SearchDocument.objects.bulk_create(created, batch_size=1000)
+    SearchDocument.objects.bulk_update(updated, ['author', 'title', 'body'], batch_size=1000)
+
+def queue_rows(model, author_id, pks):
+    PendingSearchDocument.objects.bulk_create([
+        PendingSearchDocument(author_id=author_id, kind=model._meta.model_name, object_id=pk) for pk in pks
+    ], ignore_conflicts=True)
+
+def index_pending(author_id):
+    """
+    Rebuild the author's queued documents. The queue rows are removed
+    first, so a save racing with the rebuild queues its row again.
+    """
+    pending = list(PendingSearchDocument.objects.filter(author_id=author_id).values_list('pk', 'kind', 'object_id'))
+    if not pending:
+        return
+    PendingSearchDocument.objects.filter(pk__in=[pk for pk, _, _ in pending]).delete()
+    by_kind = defaultdict(list)
+    for _, kind, object_id in pending:
+        by_kind[kind].append(object_id)
+    for kind, pks in by_kind.items():
+        index_rows(SEARCH_KINDS[kind], pks)
+
+def unindex_rows(model, pks):
+    kind = model._meta.model_name
+    PendingSearchDocument.objects.filter(kind=kind, object_id__in=pks).delete()
+    SearchDocument.objects.filter(kind=kind, object_id__in=pks).delete()
+
+def highlight(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+def fts5_query(query):
+    """
+    Turn free text into an FTS5 expression matching every word, so user
+    input can never be parsed as FTS5 syntax.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+def search_postgres(author_id, query, kinds, limit):
+    kind_filter = 'AND d.kind = ANY(%s)' if kinds else ''
+    # Rank and limit first, then build headlines for the returned rows only
+    sql = f"""
+        SELECT hit.kind, hit.object_id,
+               COALESCE(NULLIF(hit.title, ''), substr(hit.body, 1, %s)), hit.rank,
+               ts_headline(%s, hit.title || ' ' || hit.body, hit.query, %s)
+        FROM (
+            SELECT d.kind, d.object_id, d.title, d.body, q.query,
+                   ts_rank_cd(d.search_vector, q.query) AS rank
+            FROM api_searchdocument d,
+                 websearch_to_tsquery(%s, %s) AS q(query)
+            WHERE d.author_id = %s AND d.search_vector @@ q.query {kind_filter}
+            ORDER BY rank DESC, d.id
+            LIMIT %s
+        ) AS hit
+        ORDER BY hit.rank DESC
+    """
+    options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=2, MaxWords=20, MinWords=5'
+    params = [TITLE_LENGTH, TEXT_SEARCH_CONFIG, options, TEXT_SEARCH_CONFIG, query, author_id]
+    if kinds:
+        params.append(list(kinds))
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def search_sqlite(author_id, query, kinds, limit):
+    match = fts5_query(query)
+    if not match:
+        return []
+    kind_filter = f"AND d.kind IN ({', '.join(['%s'] * len(kinds))})" if kinds else ''
+    # bm25() is lower for better matches; titles weigh ten times the body
+    sql = f"""
+        SELECT d.kind, d.object_id, COALESCE(NULLIF(d.title, ''), substr(d.body, 1, %s)),
+               -bm25({FTS_TABLE}, 10.0, 1.0) AS rank,
+               snippet({FTS_TABLE}, -1, %s, %s, '…', 24)
+        FROM {FTS_TABLE}
+        JOIN api_searchdocument d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND d.author_id = %s {kind_filter}
+        ORDER BY rank DESC, d.id
+        LIMIT %s
+    """
+    params = [TITLE_LENGTH, MARK_START, MARK_END, match, author_id, *kinds, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def search_fallback(author_id, query, kinds, limit):
+    documents = SearchDocument.objects.filter(author_id=author_id)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    for word in query.split():
+        documents = documents.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    return [
+        (document.kind, document.object_id, document.title or document.body[:TITLE_LENGTH], 0.0, document.body[:200])
+        for document in documents.order_by('id')[:limit]
+    ]
+
+def search(author_id, query, kinds=(), limit=20):
+    """
+    Best matches for a free-text query among one author's documents, as
+    dicts with the kind and id of the matching row, a title, the rank and a
+    snippet with matches wrapped in <mark>.
+    """
+    index_pending(author_id)
+    if connection.vendor == 'postgresql':
+        rows = search_postgres(author_id, query, kinds, limit)
+    elif connection.vendor == 'sqlite':
+        rows = search_sqlite(author_id, query, kinds, limit)
+    else:
+        rows = search_fallback(author_id, query, kinds, limit)
+
+    results = []
+    for kind, object_id, title, rank, snippet in rows:
+        results.append({
+            'type': kind,
+            'id': str(uuid.UUID(str(object_id))),
+            'title': title,
+            'rank': float(rank),
+            'snippet': highlight(snippet),
+        })
+    return results
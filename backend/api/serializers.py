@@ -1,23 +1,217 @@
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from .models import (
     Character, CharacterArc, Place, Item,
     Story, Scene, Idea, Chapter, Race, CharacterTrait,
     CharacterRelationship, Gender, CharacterArcType, RelationshipType,
-    Event
+    Event, IdeaTag, ChapterScene, ChapterChunk, ChapterRevision, ChapterStats, StoryStats
 )
+from .hierarchy import PlaceForest
+from .links import LINKABLE_MODELS, resolve_links
+from .signals import bulk_changed
+from .versioning import get_author_id
 from accounts.serializers import UserSerializer
 
-class RaceSerializer(serializers.ModelSerializer):
+def only_columns(model, fields, extra_columns=None):
+    """
+    Model columns needed to render the given serializer fields; everything
+    else can be left out of the SELECT.
+    """
+    opts = model._meta
+    columns = {opts.pk.name}
+    for name in fields:
+        columns.update((extra_columns or {}).get(name, ()))
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            columns.add(name)
+    return columns
+
+def parse_include(value):
+    """
+    Turn "chapters.included_scenes,events" into
+    {'chapters': {'included_scenes': {}}, 'events': {}}.
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+def has_author(model):
+    try:
+        model._meta.get_field('author')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+class AuthorScopedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key relation that only accepts the requesting author's rows.
+
+    Bulk endpoints look up every referenced key ahead of validation, one
+    query per model, and pass the rows in context['resolved_relations'];
+    keys are then checked against that batch instead of one query each.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None and has_author(queryset.model):
+            queryset = queryset.filter(author=request.user)
+        return queryset
+
+    def to_internal_value(self, data):
+        model = self.queryset.model
+        resolved = self.context.get('resolved_relations', {}).get(model)
+        if resolved is None:
+            return super().to_internal_value(data)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in resolved:
+            self.fail('does_not_exist', pk_value=data)
+        return resolved[pk]
+
+class ExpandableFieldsMixin:
+    """
+    Renders relations as primary keys unless they are asked for with
+    include="relation.nested_relation", and derives the matching
+    select_related/Prefetch plan from the same declaration.
+
+    When only some fields are requested, relations outside them are not
+    loaded and unused columns are deferred.
+    """
+    # Relation name -> serializer used when the relation is included
+    expandable_fields = {}
+    # Includes handled by the serializer itself, e.g. in method fields
+    method_includes = ()
+    # Columns that a field needs besides its own, e.g. for method fields
+    extra_columns = {}
+    # Many relation -> ordering of its rows, e.g. by a through-table position
+    relation_ordering = {}
+    # Field stored outside the row -> callable giving the Prefetch it reads
+    field_prefetches = {}
+    serializer_related_field = AuthorScopedPrimaryKeyRelatedField
+
+    def __init__(self, *args, **kwargs):
+        self.include = parse_include(kwargs.pop('include', None))
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def get_relation(cls, name):
+        return cls.Meta.model._meta.get_field(name)
+
+    @classmethod
+    def is_many(cls, name):
+        relation = cls.get_relation(name)
+        return relation.many_to_many or relation.one_to_many
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, serializer_class in self.expandable_fields.items():
+            # Forward relations that are not included keep the writable
+            # primary key field ModelSerializer built for them
+            if name in self.include:
+                fields[name] = serializer_class(many=self.is_many(name), read_only=True, include=self.include[name])
+            elif self.get_relation(name).one_to_many:
+                fields[name] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+        return fields
+
+    def to_representation(self, instance):
+        # Ordered relations must come from an ordered query, even when the
+        # queryset was not set up by setup_eager_loading()
+        for name, ordering in self.relation_ordering.items():
+            if name in self.fields and name not in getattr(instance, '_prefetched_objects_cache', {}):
+                model = self.get_relation(name).related_model
+                prefetch_related_objects([instance], Prefetch(name, queryset=model.objects.order_by(*ordering)))
+        return super().to_representation(instance)
+
+    @classmethod
+    def get_invalid_includes(cls, include, prefix=''):
+        invalid = []
+        for name, nested in parse_include(include).items():
+            if name in cls.method_includes:
+                continue
+            serializer_class = cls.expandable_fields.get(name)
+            if serializer_class is None:
+                invalid.append(prefix + name)
+            else:
+                invalid += serializer_class.get_invalid_includes(nested, f'{prefix}{name}.')
+        return invalid
+
+    @classmethod
+    def get_dependencies(cls, include=None):
+        """
+        Every model whose rows can show up in this serializer's output.
+        Expandable relations always count; method includes may add models
+        only when they are included.
+        """
+        include = parse_include(include)
+        models = {cls.Meta.model}
+        for name, serializer_class in cls.expandable_fields.items():
+            models |= serializer_class.get_dependencies(include.get(name))
+        return models
+
+    @classmethod
+    def has_many_relations(cls):
+        return any(cls.is_many(name) for name in cls.expandable_fields)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, include=None):
+        include = parse_include(include)
+        related, prefetches = [], []
+        for name, serializer_class in cls.expandable_fields.items():
+            if fields is not None and name not in fields:
+                continue
+            relation = cls.get_relation(name)
+            model = relation.related_model
+            ordering = cls.relation_ordering.get(name, ())
+            if name in include:
+                if not cls.is_many(name) and not serializer_class.has_many_relations():
+                    related.append(name)
+                else:
+                    nested = serializer_class.setup_eager_loading(model.objects.order_by(*ordering), include=include[name])
+                    prefetches.append(Prefetch(name, queryset=nested))
+            elif cls.is_many(name):
+                # Only the keys are rendered; reverse FKs also need the FK
+                # column to group the rows by their parent.
+                columns = ['pk'] + ([relation.field.name] if relation.one_to_many else [])
+                prefetches.append(Prefetch(name, queryset=model.objects.only(*columns).order_by(*ordering)))
+
+        prefetches += [
+            prefetch() for name, prefetch in cls.field_prefetches.items() if fields is None or name in fields
+        ]
+
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if fields is not None:
+            queryset = queryset.only(*only_columns(cls.Meta.model, fields, cls.extra_columns))
+        return queryset
+
+class RaceSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Race
         fields = ['id', 'name', 'description']
 
-class CharacterTraitSerializer(serializers.ModelSerializer):
+class CharacterTraitSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CharacterTrait
         fields = ['id', 'name', 'description']
 
-class CharacterArcSerializer(serializers.ModelSerializer):
+class CharacterArcSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = CharacterArc
@@ -26,16 +220,22 @@ class CharacterArcSerializer(serializers.ModelSerializer):
             'arc_type', 'start_trait', 'end_trait', 'change_trigger'
         ]
 
-class CharacterRelationshipSerializer(serializers.ModelSerializer):
+class CharacterRelationshipSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    # Stored as CharacterRelationship.type_mask
+    types = serializers.ListField(child=serializers.ChoiceField(choices=RelationshipType.choices), required=False)
+    extra_columns = {'types': ('type_mask',)}
+
     class Meta:
         model = CharacterRelationship
         fields = ['id', 'from_character', 'to_character', 'types', 'description']
 
-class CharacterSerializer(serializers.ModelSerializer):
-    arcs = CharacterArcSerializer(many=True, read_only=True)
-    race = RaceSerializer(read_only=True)
-    relationships_from = CharacterRelationshipSerializer(many=True, read_only=True)
-    relationships_to = CharacterRelationshipSerializer(many=True, read_only=True)
+class CharacterSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'race': RaceSerializer,
+        'arcs': CharacterArcSerializer,
+        'relationships_from': CharacterRelationshipSerializer,
+        'relationships_to': CharacterRelationshipSerializer,
+    }
 
     class Meta:
         model = Character
@@ -44,64 +244,211 @@ class CharacterSerializer(serializers.ModelSerializer):
             'gender', 'race', 'arcs', 'relationships_from', 'relationships_to'
         ]
 
-class PlaceSerializer(serializers.ModelSerializer):
+class PlaceSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     places = serializers.SerializerMethodField()
 
+    method_includes = ('places',)
+    extra_columns = {'places': ('author',)}
+
     class Meta:
         model = Place
         fields = ['id', 'name', 'parent', 'places', 'adjectives']
 
+    def get_forest(self, author_id):
+        # The context dict is shared by the whole serializer tree, so the
+        # author's places are loaded once per response, not once per node.
+        forests = self.context.setdefault('place_forests', {})
+        if author_id not in forests:
+            forests[author_id] = PlaceForest.for_author(author_id)
+        return forests[author_id]
+
     def get_places(self, obj):
-        places = obj.places.all()
-        return PlaceSerializer(places, many=True, context=self.context).data if places else []
+        places = self.get_forest(obj.author_id).children_of(obj.id)
+        if 'places' not in self.include:
+            return [place.id for place in places]
+        # Including places expands the whole subtree below this place
+        return PlaceSerializer(places, many=True, context=self.context, include=self.include).data if places else []
 
-class ItemSerializer(serializers.ModelSerializer):
-    owners = CharacterSerializer(many=True, read_only=True)
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None:
+            if self.instance.is_inside(parent.pk):
+                raise serializers.ValidationError('A place cannot be moved inside itself or one of its sub-places.')
+        return parent
+
+class PlaceNodeSerializer(serializers.ModelSerializer):
+    """
+    Flat place representation used by the hierarchy endpoints, with the
+    distance to the place the query started from.
+    """
+    depth = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Place
+        fields = ['id', 'name', 'parent', 'depth']
+
+class ItemSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'owners': CharacterSerializer,
+    }
 
     class Meta:
         model = Item
         fields = ['id', 'name', 'origin', 'owners']
 
-class EventSerializer(serializers.ModelSerializer):
-    characters = CharacterSerializer(many=True, read_only=True)
-    place = PlaceSerializer(read_only=True)
-    items = ItemSerializer(many=True, read_only=True)
+class EventSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'characters': CharacterSerializer,
+        'place': PlaceSerializer,
+        'items': ItemSerializer,
+    }
 
     class Meta:
         model = Event
-        fields = ['id', 'description', 'characters', 'place', 'items', 'time_order']
+        fields = ['id', 'description', 'characters', 'place', 'items', 'time_order', 'rank']
+        # Changed with the move/ and reorder/ actions
+        read_only_fields = ['rank']
 
-class SceneSerializer(serializers.ModelSerializer):
-    characters = CharacterSerializer(many=True, read_only=True)
-    items = ItemSerializer(many=True, read_only=True)
-    place = PlaceSerializer(read_only=True)
-    shown_events = EventSerializer(many=True, read_only=True)
-    told_events = EventSerializer(many=True, read_only=True)
+class SceneSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'characters': CharacterSerializer,
+        'items': ItemSerializer,
+        'place': PlaceSerializer,
+        'shown_events': EventSerializer,
+        'told_events': EventSerializer,
+    }
 
     class Meta:
         model = Scene
         fields = [
             'id', 'short_description', 'characters', 'place',
             'items', 'shown_events', 'told_events', 'external_conflict',
-            'interpersonal_conflict', 'internal_conflict', 'time_order'
+            'interpersonal_conflict', 'internal_conflict', 'time_order', 'rank'
         ]
+        # Changed with the move/ and reorder/ actions
+        read_only_fields = ['rank']
+
+class IdeaListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        ideas = list(data.all() if hasattr(data, 'all') else data)
+        # Resolve the links of the whole page in one batch
+        if 'linked_elements' in self.child.include:
+            self.child.preload_links(ideas)
+        return super().to_representation(ideas)
 
-class IdeaSerializer(serializers.ModelSerializer):
+class IdeaSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    method_includes = ('linked_elements',)
+    extra_columns = {'linked_elements': ('author',)}
 
     class Meta:
         model = Idea
         fields = ['id', 'content', 'type', 'tags', 'linked_elements']
+        list_serializer_class = IdeaListSerializer
 
-class ChapterSerializer(serializers.ModelSerializer):
-    included_scenes = SceneSerializer(many=True, read_only=True)
+    @classmethod
+    def get_dependencies(cls, include=None):
+        models = super().get_dependencies(include)
+        # Included links render labels of the linked rows
+        if 'linked_elements' in parse_include(include):
+            models |= set(LINKABLE_MODELS)
+        return models
+
+    def preload_links(self, ideas):
+        links = self.context.setdefault('linked_elements', {})
+        missing = {}
+        for idea in ideas:
+            for element_id in idea.linked_elements or []:
+                if str(element_id) not in links:
+                    missing.setdefault(idea.author_id, set()).add(str(element_id))
+        for author_id, element_ids in missing.items():
+            links.update(resolve_links(author_id, element_ids))
+        return links
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'linked_elements' in self.include and 'linked_elements' in data:
+            links = self.preload_links([instance])
+            data['linked_elements'] = [links[str(element_id)] for element_id in instance.linked_elements or []]
+        return data
+
+    def validate_tags(self, tags):
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            raise serializers.ValidationError('Tags must be a list of strings.')
+        max_length = IdeaTag._meta.get_field('tag').max_length
+        if any(len(tag) > max_length for tag in tags):
+            raise serializers.ValidationError(f'Tags can be at most {max_length} characters long.')
+        return tags
+
+class ChapterSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'included_scenes': SceneSerializer,
+    }
+    relation_ordering = {
+        'included_scenes': ('chapter_links__position',),
+    }
+    # Declared since ModelSerializer makes relations with a through model
+    # read-only; the given order is stored in ChapterScene.position
+    included_scenes = AuthorScopedPrimaryKeyRelatedField(many=True, queryset=Scene.objects.all(), required=False)
+    # Stored as ChapterChunk rows, see Chapter.content; kept exactly as
+    # sent, since diff offsets and the revision hash refer to every character
+    content = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    # Hash of the content, the base for diff updates
+    revision = serializers.CharField(source='content_hash', read_only=True)
+
+    extra_columns = {'revision': ('content_hash',)}
+    field_prefetches = {'content': ChapterChunk.objects.prefetch}
 
     class Meta:
         model = Chapter
-        fields = ['id', 'story', 'included_scenes', 'order', 'title', 'content']
+        fields = ['id', 'story', 'included_scenes', 'order', 'title', 'content', 'revision']
+
+    def validate_included_scenes(self, scenes):
+        if len({scene.pk for scene in scenes}) != len(scenes):
+            raise serializers.ValidationError('A scene can only be included once.')
+        return scenes
 
-class StorySerializer(serializers.ModelSerializer):
-    chapters = ChapterSerializer(many=True, read_only=True)
-    events = EventSerializer(many=True, read_only=True)
+    def create(self, validated_data):
+        scenes = validated_data.pop('included_scenes', [])
+        chapter = super().create(validated_data)
+        self.set_scenes(chapter, scenes)
+        return chapter
+
+    def update(self, instance, validated_data):
+        scenes = validated_data.pop('included_scenes', None)
+        chapter = super().update(instance, validated_data)
+        if scenes is not None:
+            self.set_scenes(chapter, scenes)
+        return chapter
+
+    def set_scenes(self, chapter, scenes):
+        if ChapterScene.objects.set_order(chapter, scenes):
+            bulk_changed.send(
+                sender=Chapter, author_id=get_author_id(chapter), action='update',
+                pks=[chapter.pk], related_models=[Scene], fields=[],
+            )
+
+class ChapterRevisionSerializer(serializers.ModelSerializer):
+    revision = serializers.CharField(source='content_hash', read_only=True)
+    snapshot = serializers.BooleanField(source='is_snapshot', read_only=True)
+
+    class Meta:
+        model = ChapterRevision
+        fields = ['number', 'revision', 'length', 'snapshot', 'created_at']
+
+class ChapterStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChapterStats
+        fields = ['chapter', 'words', 'characters', 'scenes', 'events', 'appearing_characters']
+
+class StoryStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StoryStats
+        fields = ['story', 'chapters', 'words', 'characters', 'scenes', 'events', 'appearing_characters']
+
+class StorySerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'chapters': ChapterSerializer,
+        'events': EventSerializer,
+    }
 
     class Meta:
         model = Story
@@ -109,3 +456,4 @@ class StorySerializer(serializers.ModelSerializer):
             'id', 'title', 'promise', 'plot', 'emotional_matter',
             'universal_truth', 'logline', 'events', 'chapters'
         ]
+
@@ -0,0 +1,225 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal
+from .models import (
+    Character, CharacterArc, Place, Item,
+    Story, Scene, Idea, Chapter, Race, CharacterTrait,
+    CharacterRelationship, Event, PlaceClosure, IdeaTag, IdeaLink, ChapterScene, StoryStats
+)
+from .revisions import record_first_revisions, record_revision
+from .search import DEFERRED_MODELS, SEARCH_FIELDS, index_instances, index_rows, queue_rows, unindex_rows
+from .stats import (
+    chapters_for_character, chapters_for_event, content_saved, refresh_chapters, refresh_stories, scenes_changed
+)
+from .versioning import bump_versions, get_author_id
+
+# Sent after bulk endpoints write rows without per-row model signals, with
+# author_id, action ('create' or 'update'), the affected pks, the models
+# whose many-to-many links were rewritten and, optionally, the fields
+# written to the rows themselves (None when unknown or on create).
+bulk_changed = Signal()
+
+TRACKED_MODELS = [
+    Character, CharacterArc, CharacterRelationship, Place, Item,
+    Event, Story, Scene, Idea, Chapter, Race, CharacterTrait,
+]
+
+# Scene links that count towards chapter and story stats -> their other column
+STATS_SCENE_LINKS = {
+    Scene.characters.through: 'character_id',
+    Scene.shown_events.through: 'event_id',
+    Scene.told_events.through: 'event_id',
+}
+
+TRACKED_M2M = [
+    Item.owners, Event.characters, Event.items, Story.events,
+    Scene.characters, Scene.items, Scene.shown_events, Scene.told_events,
+    Chapter.included_scenes,
+]
+
+
+def instance_changed(sender, instance, origin=None, **kwargs):
+    # The author's counters are going away with the author
+    if isinstance(origin, User):
+        return
+    bump_versions(get_author_id(instance), [sender])
+
+def links_changed(sender, instance, action, model, **kwargs):
+    if action.startswith('post_'):
+        bump_versions(get_author_id(instance), [type(instance), model])
+
+def scene_link_changed(sender, instance, origin=None, **kwargs):
+    # Deleting the author or the chapter already covers its links
+    if isinstance(origin, (User, Chapter)):
+        return
+    bump_versions(get_author_id(instance), [Chapter, Scene])
+
+def bulk_rows_changed(sender, author_id, related_models=(), **kwargs):
+    bump_versions(author_id, [sender, *related_models])
+
+def places_bulk_created(sender, action, pks, **kwargs):
+    if action == 'create':
+        PlaceClosure.objects.insert_many(pks)
+
+def chapter_revision_saved(sender, instance, **kwargs):
+    if instance.content_changed:
+        record_revision(instance.pk, instance.content, instance.loaded_content)
+
+def chapter_revisions_bulk_created(sender, action, pks, **kwargs):
+    if action == 'create':
+        record_first_revisions(pks)
+
+def stats_chapter_saved(sender, instance, update_fields=None, **kwargs):
+    if instance.content_changed or update_fields is None or 'story' in update_fields:
+        content_saved(instance)
+
+def stats_chapter_deleted(sender, instance, origin=None, **kwargs):
+    # Stats of a deleted story or author go with it
+    if isinstance(origin, (User, Story)):
+        return
+    refresh_stories([instance.story_id])
+
+def stats_story_created(sender, instance, created, **kwargs):
+    if created:
+        StoryStats.objects.get_or_create(story=instance)
+
+def stats_scene_link_changed(sender, instance, origin=None, **kwargs):
+    # A deleted chapter recounts its story once, not once per scene
+    if isinstance(origin, (User, Story, Chapter)):
+        return
+    refresh_stories(refresh_chapters([instance.chapter_id]))
+
+def stats_scene_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    column = STATS_SCENE_LINKS[sender]
+    if action == 'pre_clear' and reverse:
+        # The scenes are gone by post_clear
+        instance._stats_scene_ids = list(sender.objects.filter(**{column: instance.pk}).values_list('scene_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        scenes_changed([instance.pk])
+    else:
+        scenes_changed(pk_set if action != 'post_clear' else instance.__dict__.pop('_stats_scene_ids', []))
+
+def stats_chapter_scenes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # included_scenes.add()/set() write ChapterScene rows without save signals
+    if action == 'pre_clear' and reverse:
+        instance._stats_chapter_ids = list(sender.objects.filter(scene_id=instance.pk).values_list('chapter_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        chapter_ids = [instance.pk]
+    else:
+        chapter_ids = pk_set if action != 'post_clear' else instance.__dict__.pop('_stats_chapter_ids', [])
+    if chapter_ids:
+        refresh_stories(refresh_chapters(chapter_ids))
+
+def stats_story_events_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._stats_story_ids = list(sender.objects.filter(event_id=instance.pk).values_list('story_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_stories([instance.pk])
+    else:
+        refresh_stories(pk_set if action != 'post_clear' else instance.__dict__.pop('_stats_story_ids', []))
+
+def stats_before_delete(sender, instance, origin=None, **kwargs):
+    # Characters and events drop out of scenes without m2m signals
+    if isinstance(origin, User):
+        return
+    if sender is Character:
+        instance._stats_chapter_ids = list(chapters_for_character(instance.pk))
+    else:
+        instance._stats_chapter_ids = list(chapters_for_event(instance.pk))
+        instance._stats_story_ids = list(Story.events.through.objects.filter(event_id=instance.pk).values_list('story_id', flat=True))
+
+def stats_after_delete(sender, instance, origin=None, **kwargs):
+    chapter_ids = instance.__dict__.pop('_stats_chapter_ids', [])
+    story_ids = set(instance.__dict__.pop('_stats_story_ids', []))
+    if chapter_ids:
+        story_ids |= refresh_chapters(chapter_ids)
+    if story_ids:
+        refresh_stories(story_ids)
+
+def stats_bulk_changed(sender, action, pks, related_models=(), **kwargs):
+    if sender is Story and action == 'create':
+        refresh_stories(pks)
+    elif sender is Chapter and (action == 'create' or related_models):
+        refresh_stories(refresh_chapters(pks))
+    elif sender is Scene and related_models:
+        scenes_changed(pks)
+
+def idea_indexes_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'tags' in update_fields:
+        IdeaTag.objects.sync([instance.pk])
+    if update_fields is None or 'linked_elements' in update_fields:
+        IdeaLink.objects.sync([instance.pk])
+
+def idea_indexes_bulk_changed(sender, pks, **kwargs):
+    IdeaTag.objects.sync(pks)
+    IdeaLink.objects.sync(pks)
+
+def search_fields_changed(model, fields):
+    if fields is None:
+        return True
+    title_field, body_fields = SEARCH_FIELDS[model]
+    return not {title_field, *body_fields}.isdisjoint(fields)
+
+def search_row_saved(sender, instance, update_fields=None, **kwargs):
+    if sender in DEFERRED_MODELS:
+        if search_fields_changed(sender, update_fields) or instance.content_changed:
+            queue_rows(sender, get_author_id(instance), [instance.pk])
+    elif search_fields_changed(sender, update_fields):
+        index_instances(sender, [instance])
+
+def search_row_deleted(sender, instance, origin=None, **kwargs):
+    # The author's documents cascade with the author
+    if isinstance(origin, User):
+        return
+    unindex_rows(sender, [instance.pk])
+
+def search_rows_changed(sender, pks, fields=None, **kwargs):
+    if sender in SEARCH_FIELDS and search_fields_changed(sender, fields):
+        index_rows(sender, pks)
+
+
+for tracked_model in TRACKED_MODELS:
+    post_save.connect(instance_changed, sender=tracked_model, dispatch_uid=f'version-save-{tracked_model.__name__}')
+    post_delete.connect(instance_changed, sender=tracked_model, dispatch_uid=f'version-delete-{tracked_model.__name__}')
+
+for descriptor in TRACKED_M2M:
+    m2m_changed.connect(links_changed, sender=descriptor.through, dispatch_uid=f'version-m2m-{descriptor.through.__name__}')
+
+post_save.connect(scene_link_changed, sender=ChapterScene, dispatch_uid='version-save-ChapterScene')
+post_delete.connect(scene_link_changed, sender=ChapterScene, dispatch_uid='version-delete-ChapterScene')
+
+for searchable_model in SEARCH_FIELDS:
+    post_save.connect(search_row_saved, sender=searchable_model, dispatch_uid=f'search-save-{searchable_model.__name__}')
+    post_delete.connect(search_row_deleted, sender=searchable_model, dispatch_uid=f'search-delete-{searchable_model.__name__}')
+
+bulk_changed.connect(bulk_rows_changed, dispatch_uid='version-bulk')
+bulk_changed.connect(search_rows_changed, dispatch_uid='search-bulk')
+bulk_changed.connect(places_bulk_created, sender=Place, dispatch_uid='place-closure-bulk')
+
+post_save.connect(idea_indexes_saved, sender=Idea, dispatch_uid='idea-indexes-save')
+bulk_changed.connect(idea_indexes_bulk_changed, sender=Idea, dispatch_uid='idea-indexes-bulk')
+
+post_save.connect(chapter_revision_saved, sender=Chapter, dispatch_uid='chapter-revision-save')
+bulk_changed.connect(chapter_revisions_bulk_created, sender=Chapter, dispatch_uid='chapter-revisions-bulk')
+
+post_save.connect(stats_chapter_saved, sender=Chapter, dispatch_uid='stats-chapter-save')
+post_delete.connect(stats_chapter_deleted, sender=Chapter, dispatch_uid='stats-chapter-delete')
+post_save.connect(stats_story_created, sender=Story, dispatch_uid='stats-story-save')
+post_save.connect(stats_scene_link_changed, sender=ChapterScene, dispatch_uid='stats-scene-link-save')
+post_delete.connect(stats_scene_link_changed, sender=ChapterScene, dispatch_uid='stats-scene-link-delete')
+m2m_changed.connect(stats_chapter_scenes_changed, sender=ChapterScene, dispatch_uid='stats-chapter-scenes')
+m2m_changed.connect(stats_story_events_changed, sender=Story.events.through, dispatch_uid='stats-story-events')
+bulk_changed.connect(stats_bulk_changed, dispatch_uid='stats-bulk')
+
+for through in STATS_SCENE_LINKS:
+    m2m_changed.connect(stats_scene_m2m_changed, sender=through, dispatch_uid=f'stats-m2m-{through.__name__}')
+
+for stats_model in (Character, Event):
+    pre_delete.connect(stats_before_delete, sender=stats_model, dispatch_uid=f'stats-before-delete-{stats_model.__name__}')
+    post_delete.connect(stats_after_delete, sender=stats_model, dispatch_uid=f'stats-after-delete-{stats_model.__name__}')
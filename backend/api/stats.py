@@ -0,0 +1,150 @@
+"""
+Per-story and per-chapter counts (StoryStats, ChapterStats).
+
+Saving a chapter's content counts that one text and moves the chapter and
+story totals by the difference, so autosaves never read other chapters.
+Structural changes (chapters added or removed, scenes linked, characters
+or events attached to scenes) recount from the link tables and the stored
+chapter counts, never from the text. Rows missing for data older than
+these tables are filled in on first use.
+"""
+from collections import defaultdict
+from django.db.models import Count, F, Q, Sum
+from .models import Chapter, ChapterChunk, ChapterScene, ChapterStats, Scene, Story, StoryStats
+
+COUNT_FIELDS = ['words', 'characters', 'scenes', 'events', 'appearing_characters']
+
+
+def text_counts(text):
+    return len(text.split()), len(text)
+
+def scene_counts(chapter_ids):
+    """
+    Chapter id -> (scenes, events, appearing characters) from the links of
+    the chapters' scenes, in four queries for any number of chapters.
+    """
+    scenes = defaultdict(set)
+    for chapter_id, scene_id in ChapterScene.objects.filter(chapter_id__in=chapter_ids).values_list('chapter_id', 'scene_id'):
+        scenes[chapter_id].add(scene_id)
+    scene_ids = set().union(*scenes.values())
+
+    def linked(descriptor, column):
+        rows = descriptor.through.objects.filter(scene_id__in=scene_ids).values_list('scene_id', column)
+        by_scene = defaultdict(set)
+        for scene_id, value in rows:
+            by_scene[scene_id].add(value)
+        return by_scene
+
+    characters = linked(Scene.characters, 'character_id')
+    events = linked(Scene.shown_events, 'event_id')
+    for scene_id, event_ids in linked(Scene.told_events, 'event_id').items():
+        events[scene_id] |= event_ids
+
+    counts = {}
+    for chapter_id in chapter_ids:
+        chapter_scenes = scenes.get(chapter_id, set())
+        counts[chapter_id] = (
+            len(chapter_scenes),
+            len(set().union(*(events.get(scene_id, set()) for scene_id in chapter_scenes))),
+            len(set().union(*(characters.get(scene_id, set()) for scene_id in chapter_scenes))),
+        )
+    return counts
+
+def refresh_chapters(chapter_ids, texts=None):
+    """
+    Recount the given chapters, reading the text only of chapters that
+    have no stats yet; ``texts`` gives the text of chapters whose chunks
+    are not written yet. Returns the ids of the stories whose totals need a
+    recount, including stories a chapter has left.
+    """
+    existing = {
+        row[0]: row[1:]
+        for row in ChapterStats.objects.filter(chapter_id__in=chapter_ids).values_list('chapter_id', 'story_id', 'words', 'characters')
+    }
+    chapters = Chapter.objects.filter(pk__in=chapter_ids)
+    texts = texts or {}
+    text = {**ChapterChunk.objects.texts([pk for pk in chapter_ids if pk not in existing and pk not in texts]), **texts}
+    counts = scene_counts(list(chapter_ids))
+    rows, story_ids = [], {story_id for story_id, _, _ in existing.values()}
+    for chapter_id, story_id in chapters.values_list('id', 'story_id'):
+        story_ids.add(story_id)
+        words, characters = text_counts(text[chapter_id]) if chapter_id in text else existing[chapter_id][1:]
+        scenes, events, appearing_characters = counts[chapter_id]
+        rows.append(ChapterStats(
+            chapter_id=chapter_id, story_id=story_id, words=words, characters=characters,
+            scenes=scenes, events=events, appearing_characters=appearing_characters,
+        ))
+    ChapterStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['chapter'], update_fields=['story', *COUNT_FIELDS], batch_size=500,
+    )
+    return story_ids
+
+def refresh_stories(story_ids):
+    """
+    Recount the totals of the given stories from their chapter stats and
+    the link tables.
+    """
+    missing = Chapter.objects.filter(story_id__in=story_ids, stats__isnull=True).values_list('id', flat=True)
+    if missing:
+        refresh_chapters(list(missing))
+    totals = {
+        row['story_id']: row
+        for row in ChapterStats.objects.filter(story_id__in=story_ids).values('story_id').annotate(
+            chapters=Count('pk'), words=Sum('words'), characters=Sum('characters'),
+        )
+    }
+    rows = []
+    for story_id in Story.objects.filter(pk__in=story_ids).values_list('pk', flat=True):
+        links = ChapterScene.objects.filter(chapter__story_id=story_id)
+        total = totals.get(story_id, {})
+        rows.append(StoryStats(
+            story_id=story_id,
+            chapters=total.get('chapters', 0),
+            words=total.get('words', 0),
+            characters=total.get('characters', 0),
+            scenes=links.values('scene_id').distinct().count(),
+            events=Story.events.through.objects.filter(story_id=story_id).count(),
+            appearing_characters=Scene.characters.through.objects.filter(
+                scene__chapter_links__chapter__story_id=story_id
+            ).values('character_id').distinct().count(),
+        ))
+    StoryStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['story'], update_fields=['chapters', *COUNT_FIELDS], batch_size=500,
+    )
+
+def content_saved(chapter):
+    """
+    Move the chapter and story word and character counts by the change
+    in this chapter's text.
+    """
+    words, characters = text_counts(chapter.content)
+    previous = ChapterStats.objects.filter(chapter_id=chapter.pk).values_list('story_id', 'words', 'characters').first()
+    if previous is None or previous[0] != chapter.story_id:
+        # New chapter, or moved to another story
+        ChapterStats.objects.filter(chapter_id=chapter.pk).update(words=words, characters=characters)
+        refresh_stories(refresh_chapters([chapter.pk], {chapter.pk: chapter.content}) | {chapter.story_id})
+        return
+    story_id, previous_words, previous_characters = previous
+    if (words, characters) == (previous_words, previous_characters):
+        return
+    ChapterStats.objects.filter(chapter_id=chapter.pk).update(words=words, characters=characters)
+    StoryStats.objects.filter(story_id=story_id).update(
+        words=F('words') + (words - previous_words),
+        characters=F('characters') + (characters - previous_characters),
+    )
+
+def scenes_changed(scene_ids):
+    """
+    Recount the chapters (and their stories) that include these scenes.
+    """
+    chapter_ids = set(ChapterScene.objects.filter(scene_id__in=scene_ids).values_list('chapter_id', flat=True))
+    if chapter_ids:
+        refresh_stories(refresh_chapters(chapter_ids))
+
+def chapters_for_character(character_id):
+    return ChapterScene.objects.filter(scene__characters=character_id).values_list('chapter_id', flat=True)
+
+def chapters_for_event(event_id):
+    return ChapterScene.objects.filter(
+        Q(scene__shown_events=event_id) | Q(scene__told_events=event_id)
+    ).values_list('chapter_id', flat=True)
@@ -0,0 +1,83 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """
+    Migrate the api app back to `migrate_from`, seed rows through the
+    historical models, then migrate forward to `migrate_to`.
+    """
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.leaf = executor.loader.graph.leaf_nodes('api')
+        self.migrate([('api', self.migrate_from)])
+
+    def tearDown(self):
+        self.migrate(self.leaf)
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+
+class SceneEventRankMigrationTest(MigrationTestCase):
+    migrate_from = '0015_story_stats'
+    migrate_to = '0016_scene_event_rank'
+
+    def test_ranks_follow_time_order_per_author(self):
+        apps = self.migrate([('api', self.migrate_from)])
+        User = apps.get_model('auth', 'User')
+        Scene = apps.get_model('api', 'Scene')
+        author = User.objects.create(username='writer')
+        other = User.objects.create(username='other')
+        late = Scene.objects.create(short_description='Late', time_order=2, author=author)
+        early = Scene.objects.create(short_description='Early', time_order=1, author=author)
+        foreign = Scene.objects.create(short_description='Foreign', time_order=5, author=other)
+
+        apps = self.migrate([('api', self.migrate_to)])
+        Scene = apps.get_model('api', 'Scene')
+        ranks = dict(Scene.objects.values_list('pk', 'rank'))
+        self.assertEqual([ranks[early.pk], ranks[late.pk]], [1024, 2048])
+        self.assertEqual(ranks[foreign.pk], 1024)
+
+
+class ChapterTextMigrationTest(MigrationTestCase):
+    migrate_from = '0016_scene_event_rank'
+    migrate_to = '0018_remove_chapter_content'
+
+    def seed(self):
+        apps = self.migrate([('api', self.migrate_from)])
+        User = apps.get_model('auth', 'User')
+        Story = apps.get_model('api', 'Story')
+        Chapter = apps.get_model('api', 'Chapter')
+        story = Story.objects.create(title='Story', author=User.objects.create(username='writer'))
+        chapter = Chapter.objects.create(story=story, title='One', order=1, content='First paragraph\n\nSecond one')
+        empty = Chapter.objects.create(story=story, title='Two', order=2, content='')
+        return chapter, empty
+
+    def test_text_moves_into_chunks_and_back(self):
+        chapter, empty = self.seed()
+
+        apps = self.migrate([('api', self.migrate_to)])
+        Chapter = apps.get_model('api', 'Chapter')
+        ChapterChunk = apps.get_model('api', 'ChapterChunk')
+        chunks = ChapterChunk.objects.filter(chapter_id=chapter.pk).order_by('position')
+        self.assertEqual([(chunk.position, chunk.text) for chunk in chunks], [
+            (1024, 'First paragraph'), (2048, 'Second one'),
+        ])
+        self.assertFalse(ChapterChunk.objects.filter(chapter_id=empty.pk).exists())
+        hashes = dict(Chapter.objects.values_list('pk', 'content_hash'))
+        self.assertEqual(len(hashes[chapter.pk]), 32)
+        self.assertNotEqual(hashes[chapter.pk], hashes[empty.pk])
+
+        apps = self.migrate([('api', self.migrate_from)])
+        Chapter = apps.get_model('api', 'Chapter')
+        contents = dict(Chapter.objects.values_list('pk', 'content'))
+        self.assertEqual(contents, {chapter.pk: 'First paragraph\n\nSecond one', empty.pk: ''})
@@ -1,10 +1,14 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from api.models import (
     Character, CharacterArc, Place, Item,
     Story, Scene, Idea, IdeaType, Chapter, Race, CharacterTrait,
-    CharacterRelationship, Gender, CharacterArcType, RelationshipType
+    CharacterRelationship, Gender, CharacterArcType, RelationshipType,
+    PlaceClosure, ChapterChunk, text_digest
 )
+from api.fields import compress_text, decompress_text
 
 
 
@@ -129,6 +133,32 @@ class CharacterRelationshipModelTest(TestCase):
     def test_types_field(self):
         self.assertEqual(self.relationship.types, [RelationshipType.FRIEND, RelationshipType.MENTOR])
 
+    def test_types_are_stored_as_a_mask(self):
+        self.relationship.refresh_from_db()
+        self.assertEqual(self.relationship.type_mask, 1 | 4)
+        self.assertEqual(self.relationship.types, [RelationshipType.FRIEND, RelationshipType.MENTOR])
+
+    def test_filter_by_type(self):
+        CharacterRelationship.objects.create(
+            from_character=self.character2, to_character=self.character1, types=[RelationshipType.ENEMY]
+        )
+        mentors = CharacterRelationship.objects.with_types([RelationshipType.MENTOR, RelationshipType.LOVER])
+        self.assertEqual(list(mentors), [self.relationship])
+
+    def test_pair_columns_are_generated(self):
+        reverse = CharacterRelationship.objects.create(from_character=self.character2, to_character=self.character1)
+        for relationship in (self.relationship, reverse):
+            relationship.refresh_from_db()
+            self.assertEqual(relationship.pair_low, min(self.character1.pk, self.character2.pk))
+            self.assertEqual(relationship.pair_high, max(self.character1.pk, self.character2.pk))
+
+    def test_between_finds_both_directions(self):
+        reverse = CharacterRelationship.objects.create(from_character=self.character2, to_character=self.character1)
+        third = Character.objects.create(name='Character 3', author=self.test_user)
+        CharacterRelationship.objects.create(from_character=self.character1, to_character=third)
+        found = CharacterRelationship.objects.between(self.character2, self.character1)
+        self.assertEqual({relationship.pk for relationship in found}, {self.relationship.pk, reverse.pk})
+
 class CharacterArcModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -210,6 +240,40 @@ class PlaceModelTest(TestCase):
         self.assertEqual(self.child_place.parent, self.parent_place)
         self.assertIn(self.child_place, self.parent_place.places.all())
 
+    def closure(self):
+        return set(PlaceClosure.objects.values_list('ancestor__name', 'descendant__name', 'depth'))
+
+    def test_closure_maintained_on_create(self):
+        self.assertEqual(self.closure(), {
+            ('Parent Place', 'Parent Place', 0),
+            ('Child Place', 'Child Place', 0),
+            ('Parent Place', 'Child Place', 1),
+        })
+
+    def test_closure_maintained_on_move_and_delete(self):
+        # Move the child (with a grandchild) under a new root
+        grandchild = Place.objects.create(name='Grandchild', author=self.test_user, parent=self.child_place)
+        new_root = Place.objects.create(name='New Root', author=self.test_user)
+        child = Place.objects.get(pk=self.child_place.pk)
+        child.parent = new_root
+        child.save()
+        self.assertEqual(
+            set(PlaceClosure.objects.filter(descendant=grandchild).values_list('ancestor__name', 'depth')),
+            {('Grandchild', 0), ('Child Place', 1), ('New Root', 2)}
+        )
+
+        # Deleting the subtree removes every link that touches it
+        new_root.delete()
+        self.assertEqual(self.closure(), {('Parent Place', 'Parent Place', 0)})
+
+    def test_move_into_own_subtree_is_rejected_before_saving(self):
+        parent = Place.objects.get(pk=self.parent_place.pk)
+        parent.parent = self.child_place
+        with self.assertRaises(ValueError):
+            parent.save()
+        self.assertIsNone(Place.objects.get(pk=parent.pk).parent_id)
+        self.assertEqual(len(self.closure()), 3)
+
 class ItemModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -501,3 +565,88 @@ class ChapterModelTest(TestCase):
         chapters = Chapter.objects.filter(story=self.story)
         self.assertEqual(chapters[0], self.chapter1)
         self.assertEqual(chapters[1], self.chapter2)
+
+
+class ChapterChunkModelTest(TestCase):
+    def setUp(self):
+        # Create a chapter of three paragraphs
+        user = User.objects.create_user(username='testuser', password='12345')
+        story = Story.objects.create(title='Test Story', author=user)
+        self.chapter = Chapter.objects.create(story=story, title='Chapter 1', content='One\n\nTwo\n\nThree')
+
+    def chunks(self):
+        return list(ChapterChunk.objects.filter(chapter=self.chapter).order_by('position').values_list('pk', 'text'))
+
+    def test_content_is_split_into_paragraphs(self):
+        self.assertEqual([text for _, text in self.chunks()], ['One', 'Two', 'Three'])
+        self.assertEqual(ChapterChunk.objects.paragraphs(self.chapter, 1, 5), ['Two', 'Three'])
+
+    def test_only_changed_paragraphs_are_rewritten(self):
+        before = dict((text, pk) for pk, text in self.chunks())
+        self.chapter.content = 'One\n\nNew\n\nTwo\n\nThree, edited'
+        self.chapter.save()
+        after = self.chunks()
+        self.assertEqual([text for _, text in after], ['One', 'New', 'Two', 'Three, edited'])
+        # Untouched paragraphs keep their rows, the edited one is updated in place
+        self.assertEqual([pk for pk, _ in after][0], before['One'])
+        self.assertEqual([pk for pk, _ in after][2], before['Two'])
+        self.assertEqual([pk for pk, _ in after][3], before['Three'])
+
+    def test_respaces_when_out_of_room(self):
+        ChapterChunk.objects.filter(chapter=self.chapter, text='Two').update(position=1025)
+        self.chapter.content = 'One\n\nA\n\nB\n\nTwo\n\nThree'
+        self.chapter.save()
+        self.assertEqual([text for _, text in self.chunks()], ['One', 'A', 'B', 'Two', 'Three'])
+
+    def test_emptied_content_removes_chunks(self):
+        self.chapter.content = ''
+        self.chapter.save(update_fields=['content'])
+        self.assertEqual(self.chunks(), [])
+
+    def test_content_is_read_from_chunks(self):
+        ChapterChunk.objects.filter(chapter=self.chapter, text='Two').update(text='Deux')
+        chapter = Chapter.objects.get(pk=self.chapter.pk)
+        self.assertEqual(chapter.content, 'One\n\nDeux\n\nThree')
+        self.assertEqual(chapter.content_hash, text_digest('One\n\nTwo\n\nThree'))
+
+        chapter = Chapter.objects.prefetch_related(ChapterChunk.objects.prefetch()).get(pk=self.chapter.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(chapter.content, 'One\n\nDeux\n\nThree')
+
+        # Saving other fields leaves the chunks alone
+        with CaptureQueriesContext(connection) as queries:
+            chapter.title = 'Renamed'
+            chapter.save(update_fields=['title'])
+        self.assertFalse(any('api_chapterchunk' in query['sql'] for query in queries))
+
+
+class CompressedTextFieldTest(TestCase):
+    def setUp(self):
+        # Create a story with a long plot
+        user = User.objects.create_user(username='testuser', password='12345')
+        self.plot = 'The hero leaves home and comes back changed. ' * 100
+        self.story = Story.objects.create(title='Test Story', author=user, plot=self.plot)
+
+    def stored_plot(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT plot FROM api_story WHERE id = %s', [self.story.id.hex])
+            return bytes(cursor.fetchone()[0])
+
+    def test_round_trip(self):
+        self.assertEqual(Story.objects.get(pk=self.story.pk).plot, self.plot)
+        self.assertEqual(Story.objects.values_list('plot', flat=True).get(), self.plot)
+        self.assertLess(len(self.stored_plot()), len(self.plot) // 4)
+
+    def test_short_text_is_stored_as_is(self):
+        self.story.plot = 'Short.'
+        self.story.save()
+        self.assertEqual(self.stored_plot(), b'rShort.')
+        self.assertEqual(Story.objects.get(pk=self.story.pk).plot, 'Short.')
+
+    def test_every_encoding_is_readable(self):
+        for algorithm in ('zlib', 'lzma'):
+            self.assertEqual(decompress_text(compress_text(self.plot, algorithm)), self.plot)
+
+    def test_deferred_column_is_not_loaded(self):
+        story = Story.objects.only('title').get(pk=self.story.pk)
+        self.assertIn('plot', story.get_deferred_fields())
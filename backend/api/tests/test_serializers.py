@@ -65,13 +65,18 @@ class CharacterSerializerTest(TestCase):
         )
 
     def test_character_serializer(self):
-        serializer = CharacterSerializer(self.character)
+        serializer = CharacterSerializer(self.character, include='race')
         self.assertEqual(serializer.data['name'], 'Test Character')
         self.assertEqual(serializer.data['surname'], 'Test Surname')
         self.assertEqual(serializer.data['nickname'], 'Test Nickname')
         self.assertEqual(serializer.data['gender'], Gender.MALE)
         self.assertEqual(serializer.data['race']['name'], 'Test Race')
 
+    def test_relations_default_to_primary_keys(self):
+        serializer = CharacterSerializer(self.character)
+        self.assertEqual(serializer.data['race'], self.race.id)
+        self.assertEqual(serializer.data['arcs'], [])
+
 
 class CharacterRelationshipSerializerTest(TestCase):
     @classmethod
@@ -163,12 +168,28 @@ class PlaceSerializerTest(TestCase):
         )
 
     def test_place_serializer(self):
-        serializer = PlaceSerializer(self.parent_place)
+        serializer = PlaceSerializer(self.parent_place, include='places')
         self.assertEqual(serializer.data['name'], 'Parent Place')
         self.assertEqual(serializer.data['adjectives'], 'big, spacious')
         self.assertEqual(len(serializer.data['places']), 1)
         self.assertEqual(serializer.data['places'][0]['name'], 'Child Place')
 
+    def test_place_hierarchy_is_loaded_in_one_query(self):
+        # Grow the tree a few levels deep and wide
+        parents = [self.child_place]
+        for depth in range(3):
+            parents = [
+                Place.objects.create(name=f'Place {depth}.{i}', author=self.user, parent=parent)
+                for parent in parents for i in range(2)
+            ]
+
+        with self.assertNumQueries(1):
+            data = PlaceSerializer(self.parent_place, include='places').data
+
+        grandchildren = data['places'][0]['places']
+        self.assertEqual(len(grandchildren), 2)
+        self.assertEqual(len(grandchildren[0]['places']), 2)
+
 
 class ItemsSerializerTest(TestCase):
     @classmethod
@@ -193,7 +214,7 @@ class ItemsSerializerTest(TestCase):
         cls.item.owners.add(cls.character)
 
     def test_item_serializer(self):
-        serializer = ItemSerializer(self.item)
+        serializer = ItemSerializer(self.item, include='owners')
         self.assertEqual(serializer.data['name'], 'Test Item')
         self.assertEqual(serializer.data['origin'], 'Test origin')
         self.assertEqual(len(serializer.data['owners']), 1)
@@ -233,7 +254,7 @@ class StorySerializerTest(TestCase):
         )
 
     def test_story_serializer(self):
-        serializer = StorySerializer(self.story)
+        serializer = StorySerializer(self.story, include='chapters')
         self.assertEqual(serializer.data['title'], 'Test Story')
         self.assertEqual(serializer.data['promise'], 'Test promise')
         self.assertEqual(serializer.data['plot'], 'Test plot')
@@ -244,6 +265,14 @@ class StorySerializerTest(TestCase):
         self.assertEqual(serializer.data['chapters'][0]['title'], 'Chapter 1')
         self.assertEqual(serializer.data['chapters'][1]['title'], 'Chapter 2')
 
+    def test_chapters_default_to_primary_keys(self):
+        serializer = StorySerializer(self.story)
+        self.assertEqual(serializer.data['chapters'], [self.chapter1.id, self.chapter2.id])
+
+    def test_invalid_includes(self):
+        self.assertEqual(StorySerializer.get_invalid_includes('chapters.included_scenes.characters.race'), [])
+        self.assertEqual(StorySerializer.get_invalid_includes('chapters.bogus,plot'), ['chapters.bogus', 'plot'])
+
 
 class ChapterSerializerTest(TestCase):
     @classmethod
@@ -324,7 +353,7 @@ class SceneSerializerTest(TestCase):
         cls.scene.items.add(cls.item1, cls.item2)
 
     def test_scene_serializer(self):
-        serializer = SceneSerializer(self.scene)
+        serializer = SceneSerializer(self.scene, include='place')
         self.assertEqual(serializer.data['short_description'], 'Test scene description')
         self.assertEqual(serializer.data['place']['name'], 'Test Place')
         self.assertEqual(serializer.data['external_conflict'], 'Test external conflict')
@@ -1,11 +1,21 @@
+import json
+import uuid
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from api.models import (
     Character, CharacterArc, Story, Chapter, Race, CharacterTrait,
-    CharacterRelationship, Gender, CharacterArcType, RelationshipType
+    CharacterRelationship, Gender, CharacterArcType, RelationshipType,
+    Place, PlaceClosure, Item, Event, Scene, Idea, IdeaType, ChapterScene, ChapterChunk,
+    ChapterRevision, ChapterStats, StoryStats, SearchDocument, PendingSearchDocument
 )
+from api.workspace import WorkspaceImporter
 
 
 
@@ -40,7 +50,7 @@ class CharacterViewSetTest(APITestCase):
     def test_get_characters_list(self):
         response = self.client.get(self.characters_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_character(self):
         data = {
@@ -92,7 +102,7 @@ class CharacterArcViewSetTest(APITestCase):
     def test_get_arcs_list(self):
         response = self.client.get(self.arcs_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_arc(self):
         data = {
@@ -133,7 +143,7 @@ class StoryViewSetTest(APITestCase):
     def test_get_stories_list(self):
         response = self.client.get(self.stories_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_story(self):
         data = {
@@ -181,7 +191,7 @@ class ChapterViewSetTest(APITestCase):
     def test_get_chapters_list(self):
         response = self.client.get(self.chapters_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_chapter(self):
         data = {
@@ -197,3 +207,1512 @@ class ChapterViewSetTest(APITestCase):
         new_chapter = Chapter.objects.filter(title='New Chapter').first()
         self.assertIsNotNone(new_chapter)
         self.assertEqual(new_chapter.title, 'New Chapter')
+
+class StoryQueryCountTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a story
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.place = Place.objects.create(name='Test Place', author=self.user)
+
+    def add_chapter(self, order):
+        # Create a chapter with a scene, a character, an item and an event
+        character = Character.objects.create(name=f'Character {order}', author=self.user)
+        CharacterArc.objects.create(character=character, author=self.user, description='Arc')
+        item = Item.objects.create(name=f'Item {order}', author=self.user)
+        item.owners.add(character)
+        event = Event.objects.create(description=f'Event {order}', author=self.user, place=self.place)
+        event.characters.add(character)
+        event.items.add(item)
+        self.story.events.add(event)
+        scene = Scene.objects.create(short_description=f'Scene {order}', author=self.user, place=self.place)
+        scene.characters.add(character)
+        scene.items.add(item)
+        scene.shown_events.add(event)
+        chapter = Chapter.objects.create(story=self.story, title=f'Chapter {order}', order=order)
+        chapter.included_scenes.add(scene)
+
+    def count_queries(self, url):
+        include = (
+            'events.characters.arcs,events.items.owners,events.place,'
+            'chapters.included_scenes.characters.race,chapters.included_scenes.place,'
+            'chapters.included_scenes.shown_events.items'
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'include': include})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_story_detail_query_count_is_constant(self):
+        url = reverse('story-detail', args=[self.story.id])
+        self.add_chapter(1)
+        baseline = self.count_queries(url)
+        for order in range(2, 6):
+            self.add_chapter(order)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_story_list_query_count_is_constant(self):
+        url = reverse('story-list')
+        self.add_chapter(1)
+        baseline = self.count_queries(url)
+        Story.objects.create(title='Second Story', author=self.user)
+        for order in range(2, 6):
+            self.add_chapter(order)
+        self.assertEqual(self.count_queries(url), baseline)
+
+class PlaceHierarchyViewTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a continent > country > tavern hierarchy
+        self.continent = Place.objects.create(name='Continent', author=self.user)
+        self.country = Place.objects.create(name='Country', author=self.user, parent=self.continent)
+        self.tavern = Place.objects.create(name='Tavern', author=self.user, parent=self.country)
+
+    def test_subtree(self):
+        response = self.client.get(reverse('place-subtree', args=[self.continent.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(p['name'], p['depth']) for p in response.data], [('Country', 1), ('Tavern', 2)])
+
+    def test_ancestors(self):
+        response = self.client.get(reverse('place-ancestors', args=[self.tavern.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['name'] for p in response.data], ['Continent', 'Country'])
+
+    def test_depth(self):
+        response = self.client.get(reverse('place-depth', args=[self.tavern.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['depth'], 2)
+
+    def test_cannot_move_place_into_its_subtree(self):
+        url = reverse('place-detail', args=[self.continent.id])
+        response = self.client.patch(url, {'parent': str(self.tavern.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a story with a chapter
+        self.story = Story.objects.create(title='Test Story', author=self.user, plot='A very long plot')
+        Chapter.objects.create(story=self.story, title='Chapter 1', content='Long content', order=1)
+
+    def test_fields_limit_output_and_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('story-list'), {'fields': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['title'], 'Test Story')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        # Neither the plot column nor the chapters are read
+        story_queries = [q['sql'] for q in context.captured_queries if '"api_story"' in q['sql']]
+        self.assertEqual(len(story_queries), 1)
+        self.assertNotIn('"plot"', story_queries[0])
+        self.assertFalse(any('"api_chapter"' in q['sql'] for q in context.captured_queries))
+
+    def test_fields_keep_requested_relations(self):
+        response = self.client.get(reverse('chapter-list'), {'fields': 'title,story'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'story'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('story-list'), {'fields': 'title,bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class IncludeExpansionTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a story with a chapter showing one scene with one character
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.character = Character.objects.create(name='Test Character', author=self.user)
+        self.scene = Scene.objects.create(short_description='Test Scene', author=self.user)
+        self.scene.characters.add(self.character)
+        self.chapter = Chapter.objects.create(story=self.story, title='Chapter 1', order=1)
+        self.chapter.included_scenes.add(self.scene)
+        self.url = reverse('story-detail', args=[self.story.id])
+
+    def test_relations_default_to_ids(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['chapters'], [self.chapter.id])
+
+    def test_include_expands_only_requested_path(self):
+        response = self.client.get(self.url, {'include': 'chapters.included_scenes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        scene = response.data['chapters'][0]['included_scenes'][0]
+        self.assertEqual(scene['short_description'], 'Test Scene')
+        self.assertEqual(scene['characters'], [self.character.id])
+
+        response = self.client.get(self.url, {'include': 'chapters.included_scenes.characters'})
+        scene = response.data['chapters'][0]['included_scenes'][0]
+        self.assertEqual(scene['characters'][0]['name'], 'Test Character')
+
+    def test_unknown_include_is_rejected(self):
+        response = self.client.get(self.url, {'include': 'chapters.bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class PaginationTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a handful of characters
+        for i in range(5):
+            Character.objects.create(name=f'Character {i}', author=self.user)
+
+    def test_cursor_pages_cover_collection_once(self):
+        url = reverse('character-list')
+        seen = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [character['id'] for character in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(str(c.id) for c in Character.objects.all()))
+
+    def test_chapters_are_paged_in_order(self):
+        stories = [Story.objects.create(title=f'Story {index}', author=self.user) for index in range(2)]
+        for story in stories:
+            for order in (3, 1, 2):
+                Chapter.objects.create(story=story, title=f'Chapter {order}', order=order)
+        response = self.client.get(reverse('chapter-list'), {'page_size': 2})
+        chapters = []
+        while True:
+            chapters += [(c['story'], c['order']) for c in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        # Each story's chapters come together, in order
+        expected = [(story.id, order) for story in sorted(stories, key=lambda story: story.id) for order in (1, 2, 3)]
+        self.assertEqual(chapters, expected)
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a scene with a character
+        self.character = Character.objects.create(name='Test Character', author=self.user)
+        self.scene = Scene.objects.create(short_description='Test Scene', author=self.user)
+        self.scene.characters.add(self.character)
+
+    def test_unchanged_collection_returns_304_without_main_query(self):
+        url = reverse('character-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_query_and_data(self):
+        url = reverse('character-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'fields': 'name'})['ETag'], etag)
+
+        Character.objects.create(name='Another Character', author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_embedded_model_change_invalidates_etag(self):
+        url = reverse('scene-detail', args=[self.scene.id])
+        etag = self.client.get(url)['ETag']
+        self.character.name = 'Renamed'
+        self.character.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_other_authors_changes_keep_etag(self):
+        url = reverse('character-list')
+        etag = self.client.get(url)['ETag']
+        other = User.objects.create_user(username='other', password='12345')
+        Character.objects.create(name='Other Character', author=other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_wildcard_matches_only_readable_rows(self):
+        url = reverse('scene-detail', args=[self.scene.id])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = User.objects.create_user(username='other', password='12345')
+        foreign = Scene.objects.create(short_description='Other Scene', author=other)
+        for pk in (foreign.id, uuid.uuid4()):
+            response = self.client.get(reverse('scene-detail', args=[pk]), HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a story whose event embeds a character
+        self.character = Character.objects.create(name='Test Character', author=self.user)
+        self.event = Event.objects.create(description='Test Event', author=self.user)
+        self.event.characters.add(self.character)
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.story.events.add(self.event)
+        self.idea = Idea.objects.create(content='Test idea', type=IdeaType.CONCEPT, author=self.user)
+        self.url = reverse('story-detail', args=[self.story.id])
+        self.params = {'include': 'events.characters'}
+
+    def test_cached_payload_skips_main_query(self):
+        first = self.client.get(self.url, self.params)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url, self.params)
+        self.assertEqual(second.data, first.data)
+
+    def test_embedded_change_invalidates_dependent_payloads(self):
+        self.client.get(self.url, self.params)
+        idea_url = reverse('idea-detail', args=[self.idea.id])
+        self.client.get(idea_url)
+
+        self.character.name = 'Renamed'
+        self.character.save()
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data['events'][0]['characters'][0]['name'], 'Renamed')
+        # Ideas never embed characters, so their payload is still cached
+        with self.assertNumQueries(1):
+            self.client.get(idea_url)
+
+    def test_link_change_invalidates_payload(self):
+        self.client.get(self.url)
+        self.story.events.clear()
+        self.assertEqual(self.client.get(self.url).data['events'], [])
+
+class BulkEndpointTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create characters and a place to reference
+        self.characters = [Character.objects.create(name=f'Character {i}', author=self.user) for i in range(3)]
+        self.place = Place.objects.create(name='Test Place', author=self.user)
+        self.scenes_url = reverse('scene-list')
+
+    def scene_rows(self, count):
+        return [
+            {
+                'short_description': f'Scene {i}',
+                'place': str(self.place.id),
+                'characters': [str(c.id) for c in self.characters],
+                'time_order': i,
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_query_count_does_not_grow_with_rows(self):
+        # The first write also creates the author's change version rows
+        self.client.post(self.scenes_url, self.scene_rows(1), format='json')
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.post(self.scenes_url, self.scene_rows(2), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(self.scenes_url, self.scene_rows(20), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+        self.assertEqual(Scene.objects.count(), 23)
+        scene = Scene.objects.get(short_description='Scene 19', time_order=19)
+        self.assertEqual(scene.place, self.place)
+        self.assertEqual(scene.characters.count(), 3)
+        self.assertEqual(len(response.data), 20)
+
+    def test_bulk_create_rejects_other_authors_references(self):
+        other = User.objects.create_user(username='other', password='12345')
+        foreign = Character.objects.create(name='Foreign', author=other)
+        rows = self.scene_rows(2)
+        rows[1]['characters'].append(str(foreign.id))
+        response = self.client.post(self.scenes_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Scene.objects.count(), 0)
+
+    def test_bulk_create_stores_repeated_keys_once(self):
+        rows = self.scene_rows(1)
+        rows[0]['characters'] = [str(self.characters[0].id)] * 2
+        response = self.client.post(self.scenes_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Scene.objects.get().characters.count(), 1)
+
+    def test_bulk_update(self):
+        self.client.post(self.scenes_url, self.scene_rows(3), format='json')
+        scenes = list(Scene.objects.order_by('time_order'))
+        rows = [
+            {'id': str(scenes[0].id), 'short_description': 'Opening'},
+            {'id': str(scenes[1].id), 'characters': [str(self.characters[0].id)]},
+        ]
+        response = self.client.patch(self.scenes_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        scenes[0].refresh_from_db()
+        self.assertEqual(scenes[0].short_description, 'Opening')
+        self.assertEqual(list(scenes[1].characters.all()), [self.characters[0]])
+        self.assertEqual(scenes[2].characters.count(), 3)
+
+    def test_bulk_update_rejects_unknown_ids(self):
+        rows = [{'id': str(self.place.id), 'short_description': 'Nope'}]
+        response = self.client.patch(self.scenes_url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete(self):
+        url = reverse('character-list')
+        ids = [str(c.id) for c in self.characters[:2]]
+        response = self.client.delete(url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Character.objects.all()), [self.characters[2]])
+
+    def test_bulk_delete_is_all_or_nothing(self):
+        url = reverse('character-list')
+        response = self.client.delete(url, [str(self.characters[0].id), str(self.place.id)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Character.objects.count(), 3)
+
+    def test_bulk_create_bumps_versions(self):
+        etag = self.client.get(self.scenes_url)['ETag']
+        self.client.post(self.scenes_url, self.scene_rows(2), format='json')
+        response = self.client.get(self.scenes_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class WorkspaceExportTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a small workspace
+        self.race = Race.objects.create(name='Elf')
+        self.character = Character.objects.create(name='Test Character', author=self.user, race=self.race)
+        self.parent_place = Place.objects.create(name='Continent', author=self.user)
+        self.child_place = Place.objects.create(name='Tavern', author=self.user, parent=self.parent_place)
+        self.scene = Scene.objects.create(short_description='Test Scene', author=self.user, place=self.child_place)
+        self.scene.characters.add(self.character)
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        chapter = Chapter.objects.create(story=self.story, title='Chapter 1', content='Once upon a time')
+        chapter.included_scenes.add(self.scene)
+        self.friend = Character.objects.create(name='Friend', author=self.user)
+        CharacterRelationship.objects.create(
+            from_character=self.character, to_character=self.friend, types=[RelationshipType.FRIEND]
+        )
+
+        # Another author's data must not leak into the export
+        other = User.objects.create_user(username='other', password='12345')
+        Character.objects.create(name='Foreign', author=other)
+
+    def export(self):
+        response = self.client.get(reverse('workspace-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+    def test_export_streams_every_model_in_dependency_order(self):
+        header, records = self.export()
+        self.assertEqual(header['format'], 'storyteller-workspace')
+        models = [record['model'] for record in records]
+        self.assertEqual(models, [
+            'race', 'character', 'character', 'characterrelationship', 'place', 'place', 'story', 'scene',
+            'scene.characters', 'chapter', 'chapter.included_scenes',
+        ])
+        places = [record['data'] for record in records if record['model'] == 'place']
+        self.assertEqual([place['name'] for place in places], ['Continent', 'Tavern'])
+        self.assertEqual(places[1]['parent_id'], str(self.parent_place.id))
+        chapter = next(record['data'] for record in records if record['model'] == 'chapter')
+        self.assertEqual(chapter['content'], 'Once upon a time')
+        link = next(record['data'] for record in records if record['model'] == 'chapter.included_scenes')
+        self.assertEqual(set(link), {'chapter_id', 'scene_id', 'position'})
+        self.assertNotIn('Foreign', json.dumps(records))
+
+    def test_import_round_trip_into_another_account(self):
+        dump = b''.join(self.client.get(reverse('workspace-export')).streaming_content)
+
+        importer = User.objects.create_user(username='importer', password='12345')
+        self.client.force_authenticate(user=importer)
+        response = self.client.post(reverse('workspace-import'), dump, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created']['place'], 2)
+        self.assertEqual(response.data['created']['scene.characters'], 1)
+        # The race already exists and is shared, so it is not duplicated
+        self.assertNotIn('race', response.data['created'])
+        self.assertEqual(Race.objects.count(), 1)
+
+        character = Character.objects.get(author=importer, name='Test Character')
+        self.assertNotEqual(character.id, self.character.id)
+        relationship = CharacterRelationship.objects.get(from_character=character)
+        self.assertEqual(relationship.to_character.name, 'Friend')
+        self.assertEqual(relationship.types, [RelationshipType.FRIEND])
+        self.assertEqual(character.race_id, self.race.id)
+        tavern = Place.objects.get(author=importer, name='Tavern')
+        self.assertEqual(tavern.parent.name, 'Continent')
+        self.assertEqual(tavern.parent.author, importer)
+        self.assertEqual(PlaceClosure.objects.filter(descendant=tavern).count(), 2)
+        scene = Scene.objects.get(author=importer)
+        self.assertEqual(list(scene.characters.all()), [character])
+        chapter = Chapter.objects.get(story__author=importer)
+        self.assertEqual(list(chapter.included_scenes.all()), [scene])
+        self.assertEqual(ChapterChunk.objects.paragraphs(chapter), ['Once upon a time'])
+        # History is not part of the dump: the imported text is revision 1
+        self.assertEqual(list(chapter.revisions.values_list('number', flat=True)), [1])
+
+        # The importer's cached reads are invalidated
+        response = self.client.get(reverse('character-list'))
+        self.assertEqual(len(response.data['results']), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'imports use COPY only on Postgres')
+    def test_import_with_copy_keeps_every_column_type(self):
+        plot = 'The hero leaves home. ' * 100
+        Story.objects.filter(pk=self.story.pk).update(plot=plot)
+        Idea.objects.create(
+            content='Idea', type=IdeaType.CONCEPT, tags=['quest', 'elves'],
+            linked_elements=[str(self.character.id)], author=self.user,
+        )
+        dump = b''.join(self.client.get(reverse('workspace-export')).streaming_content)
+
+        importer = User.objects.create_user(username='importer', password='12345')
+        self.assertTrue(WorkspaceImporter(importer).use_copy)
+        self.client.force_authenticate(user=importer)
+        response = self.client.post(reverse('workspace-import'), dump, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Compressed text, JSON lists and remapped ids survive the CSV encoding
+        self.assertEqual(Story.objects.get(author=importer).plot, plot)
+        character = Character.objects.get(author=importer, name='Test Character')
+        idea = Idea.objects.get(author=importer)
+        self.assertEqual(idea.tags, ['quest', 'elves'])
+        self.assertEqual(idea.linked_elements, [str(character.id)])
+        self.assertEqual(Chapter.objects.get(story__author=importer).content, 'Once upon a time')
+        # The generated pair columns are filled in by the database
+        friend = Character.objects.get(author=importer, name='Friend')
+        relationship = CharacterRelationship.objects.get(from_character=character)
+        self.assertEqual(list(CharacterRelationship.objects.between(friend, character)), [relationship])
+
+    def test_import_reads_version_1_relationship_types(self):
+        lines = [
+            {'format': 'storyteller-workspace', 'version': 1},
+            {'model': 'character', 'data': {'id': str(uuid.uuid4()), 'name': 'One'}},
+            {'model': 'character', 'data': {'id': str(uuid.uuid4()), 'name': 'Two'}},
+        ]
+        lines.append({'model': 'characterrelationship', 'data': {
+            'id': str(uuid.uuid4()), 'from_character_id': lines[1]['data']['id'],
+            'to_character_id': lines[2]['data']['id'], 'types': ['ENEMY', 'LOVER'], 'description': '',
+        }})
+        dump = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+        response = self.client.post(reverse('workspace-import'), dump, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        relationship = CharacterRelationship.objects.get(from_character__name='One')
+        self.assertEqual(relationship.types, [RelationshipType.ENEMY, RelationshipType.LOVER])
+
+    def test_import_rejects_malformed_dump(self):
+        response = self.client.post(reverse('workspace-import'), b'{"format": "other"}\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        header = json.dumps({'format': 'storyteller-workspace', 'version': 1})
+        record = json.dumps({'model': 'scene', 'data': {'place_id': '00000000-0000-0000-0000-000000000000'}})
+        response = self.client.post(
+            reverse('workspace-import'), f'{header}\n{record}\n'.encode(), content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Scene.objects.count(), 1)
+
+    def test_import_rejects_invalid_values(self):
+        header = json.dumps({'format': 'storyteller-workspace', 'version': 2})
+        for record in [
+            {'model': 'event', 'data': {'id': str(uuid.uuid4()), 'description': 'Battle', 'time_order': 'abc'}},
+            {'model': 'race', 'data': {'id': str(uuid.uuid4()), 'name': None}},
+            {'model': 'idea', 'data': {'id': str(uuid.uuid4()), 'content': 'Idea', 'type': 'CONCEPT', 'tags': 'abc'}},
+            {'model': 'idea', 'data': {'id': str(uuid.uuid4()), 'content': 'Idea', 'type': 'CONCEPT', 'tags': ['x' * 101]}},
+            {'model': 'idea', 'data': {'id': str(uuid.uuid4()), 'content': 'Idea', 'type': 'NOT_A_TYPE'}},
+            {'model': 'character', 'data': {'id': str(uuid.uuid4()), 'name': 'x' * 1000}},
+        ]:
+            response = self.client.post(
+                reverse('workspace-import'), f'{header}\n{json.dumps(record)}\n'.encode(), content_type='application/x-ndjson'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, record)
+        self.assertEqual(Idea.objects.count(), 0)
+        self.assertEqual(Event.objects.count(), 0)
+
+    def test_import_reports_errors_from_the_final_write(self):
+        header = json.dumps({'format': 'storyteller-workspace', 'version': 2})
+        record = json.dumps({'model': 'race', 'data': {'id': str(uuid.uuid4()), 'name': 'Elf'}})
+        with mock.patch('api.workspace.Race.objects.bulk_create', side_effect=IntegrityError('duplicate race')):
+            response = self.client.post(
+                reverse('workspace-import'), f'{header}\n{record}\n'.encode(), content_type='application/x-ndjson'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class SearchTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create searchable content
+        self.idea = Idea.objects.create(content='A dragon guards the <old> bridge', type=IdeaType.CONCEPT, author=self.user)
+        self.scene = Scene.objects.create(
+            short_description='Crossing the river', internal_conflict='She fears the dragon', author=self.user
+        )
+        self.story = Story.objects.create(title='Dragon Song', plot='A quiet village', author=self.user)
+        self.chapter = Chapter.objects.create(story=self.story, title='Chapter 1', content='Nothing happens here')
+
+        # Another author's matching content must stay private
+        other = User.objects.create_user(username='other', password='12345')
+        Idea.objects.create(content='Another dragon', type=IdeaType.CONCEPT, author=other)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_search_ranks_and_highlights_matches(self):
+        results = self.search(q='dragons')
+        self.assertEqual({result['id'] for result in results}, {str(self.idea.id), str(self.scene.id), str(self.story.id)})
+        # A match in the title ranks first
+        self.assertEqual(results[0]['type'], 'story')
+        self.assertEqual(results[0]['title'], 'Dragon Song')
+        idea = next(result for result in results if result['type'] == 'idea')
+        self.assertIn('<mark>dragon</mark>', idea['snippet'])
+        self.assertIn('&lt;old&gt;', idea['snippet'])
+
+    def test_search_filters_by_type(self):
+        results = self.search(q='dragon', type='scene,idea')
+        self.assertEqual({result['type'] for result in results}, {'scene', 'idea'})
+
+    def test_search_follows_edits_and_deletes(self):
+        self.chapter.content = 'The dragon wakes'
+        self.chapter.save()
+        self.assertIn(str(self.chapter.id), [result['id'] for result in self.search(q='dragon')])
+
+        self.idea.delete()
+        self.story.delete()
+        ids = [result['id'] for result in self.search(q='dragon')]
+        self.assertEqual(ids, [str(self.scene.id)])
+
+    def test_search_indexes_bulk_created_rows(self):
+        response = self.client.post(
+            reverse('idea-list'), [{'content': 'Griffins nest in the cliffs', 'type': IdeaType.CONCEPT}], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.search(q='griffins')), 1)
+
+    def test_search_skips_saves_of_unsearched_fields(self):
+        with mock.patch('api.signals.index_rows') as index_rows:
+            self.scene.time_order = 5
+            self.scene.save(update_fields=['time_order'])
+            response = self.client.patch(
+                reverse('scene-list'), [{'id': str(self.scene.id), 'time_order': 6}], format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            index_rows.assert_not_called()
+
+            self.client.patch(
+                reverse('scene-list'), [{'id': str(self.scene.id), 'short_description': 'Fording'}], format='json'
+            )
+            index_rows.assert_called_once_with(Scene, [self.scene.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'the tsvector column only exists on Postgres')
+    def test_search_vector_is_generated_from_the_document(self):
+        def vector(kind, obj):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT search_vector::text FROM api_searchdocument WHERE kind = %s AND object_id = %s',
+                    [kind, obj.pk],
+                )
+                return cursor.fetchone()[0]
+
+        # Title words carry weight A, body words weight B
+        self.assertIn("'dragon':1A", vector('story', self.story))
+        self.assertIn("'villag':", vector('story', self.story))
+        self.scene.internal_conflict = 'She fears the wyvern'
+        self.scene.save()
+        self.assertIn("'wyvern'", vector('scene', self.scene))
+        self.assertNotIn("'dragon'", vector('scene', self.scene))
+
+    @skipUnless(connection.vendor == 'postgresql', 'websearch_to_tsquery is Postgres only')
+    def test_postgres_reads_web_search_syntax(self):
+        ids = {result['id'] for result in self.search(q='dragon -bridge')}
+        self.assertEqual(ids, {str(self.scene.id), str(self.story.id)})
+        ids = {result['id'] for result in self.search(q='"dragon guards"')}
+        self.assertEqual(ids, {str(self.idea.id)})
+
+    def test_chapter_saves_are_indexed_before_the_next_search(self):
+        self.search(q='nothing')
+        document = SearchDocument.objects.get(kind='chapter', object_id=self.chapter.pk)
+        for text in ('The dragon', 'The dragon stirs', 'The dragon wakes'):
+            self.chapter.content = text
+            self.chapter.save(update_fields=['content'])
+        # Saves only queue the chapter; its document is rebuilt once
+        document.refresh_from_db()
+        self.assertEqual(document.body, 'Nothing happens here')
+        self.assertEqual(PendingSearchDocument.objects.filter(object_id=self.chapter.pk).count(), 1)
+
+        self.assertIn(str(self.chapter.id), [result['id'] for result in self.search(q='wakes')])
+        self.assertFalse(PendingSearchDocument.objects.exists())
+
+    def test_search_validates_parameters(self):
+        self.assertEqual(self.client.get(reverse('search')).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('search'), {'q': 'dragon', 'type': 'place'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # FTS5 syntax in user input is treated as plain words
+        self.assertEqual(self.search(q='dragon" OR NEAR('), [])
+
+class IdeaTagFilterTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create tagged ideas
+        self.magic = Idea.objects.create(content='Magic', type=IdeaType.CONCEPT, tags=['magic'], author=self.user)
+        self.both = Idea.objects.create(content='Dark magic', type=IdeaType.CONCEPT, tags=['magic', 'dark'], author=self.user)
+        self.plain = Idea.objects.create(content='Plain', type=IdeaType.CONCEPT, author=self.user)
+
+        # Another author's tags must not be counted
+        other = User.objects.create_user(username='other', password='12345')
+        Idea.objects.create(content='Foreign', type=IdeaType.CONCEPT, tags=['magic'], author=other)
+
+    def list_ids(self, **params):
+        response = self.client.get(reverse('idea-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {idea['id'] for idea in response.data['results']}
+
+    def test_filter_by_any_tag(self):
+        self.assertEqual(self.list_ids(tags='dark,magic'), {str(self.magic.id), str(self.both.id)})
+
+    def test_filter_by_all_tags(self):
+        self.assertEqual(self.list_ids(tags='dark,magic', tag_match='all'), {str(self.both.id)})
+        response = self.client.get(reverse('idea-list'), {'tags': 'dark', 'tag_match': 'some'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_follows_tag_changes(self):
+        response = self.client.patch(reverse('idea-detail', args=[self.plain.id]), {'tags': ['dark']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.list_ids(tags='dark'), {str(self.both.id), str(self.plain.id)})
+
+        response = self.client.patch(reverse('idea-list'), [{'id': str(self.both.id), 'tags': []}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.list_ids(tags='dark'), {str(self.plain.id)})
+
+    def test_tag_facets(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('idea-tags'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'tag': 'magic', 'count': 2}, {'tag': 'dark', 'count': 1}])
+
+        response = self.client.get(reverse('idea-tags'), {'tags': 'dark'})
+        self.assertEqual(response.data, [{'tag': 'dark', 'count': 1}, {'tag': 'magic', 'count': 1}])
+
+    def test_tags_must_be_strings(self):
+        response = self.client.post(reverse('idea-list'), {'content': 'Bad', 'type': IdeaType.CONCEPT, 'tags': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class IdeaLinksTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create linkable elements
+        self.character = Character.objects.create(name='Test Character', author=self.user)
+        self.place = Place.objects.create(name='Tavern', author=self.user)
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.chapter = Chapter.objects.create(story=self.story, title='Chapter 1')
+        other = User.objects.create_user(username='other', password='12345')
+        self.foreign = Character.objects.create(name='Foreign', author=other)
+
+        self.idea = Idea.objects.create(
+            content='Test Idea', type=IdeaType.CONCEPT, author=self.user,
+            linked_elements=[str(self.chapter.id), str(self.character.id), 'not-a-uuid', str(self.foreign.id)],
+        )
+        for index in range(5):
+            Idea.objects.create(
+                content=f'Idea {index}', type=IdeaType.CONCEPT, author=self.user,
+                linked_elements=[str(self.character.id), str(self.place.id)],
+            )
+
+    def test_links_endpoint_returns_typed_stubs(self):
+        response = self.client.get(reverse('idea-links', args=[self.idea.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'id': str(self.chapter.id), 'type': 'chapter', 'label': 'Chapter 1'},
+            {'id': str(self.character.id), 'type': 'character', 'label': 'Test Character'},
+            {'id': 'not-a-uuid', 'type': None, 'label': None},
+            # Other authors' rows are never resolved
+            {'id': str(self.foreign.id), 'type': None, 'label': None},
+        ])
+
+    def test_links_endpoint_resolves_every_spelling_of_an_id(self):
+        spellings = [str(self.character.id), str(self.character.id).upper(), self.character.id.hex]
+        self.idea.linked_elements = spellings
+        self.idea.save()
+        response = self.client.get(reverse('idea-links', args=[self.idea.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'id': element_id, 'type': 'character', 'label': 'Test Character'} for element_id in spellings
+        ])
+
+    def test_include_resolves_a_page_with_one_query_per_model(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('idea-list'), {'include': 'linked_elements'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        link_queries = [query for query in queries if 'api_idea' not in query['sql'] and 'api_changeversion' not in query['sql']]
+        # Every model is asked once for the whole page
+        self.assertEqual(len(link_queries), 7)
+
+        idea = next(idea for idea in response.data['results'] if idea['id'] == str(self.idea.id))
+        self.assertEqual(idea['linked_elements'][1]['type'], 'character')
+
+        # Without the include the stored ids are returned unchanged
+        response = self.client.get(reverse('idea-detail', args=[self.idea.id]))
+        self.assertEqual(response.data['linked_elements'], self.idea.linked_elements)
+
+    def test_renaming_a_linked_element_changes_the_etag(self):
+        url = reverse('idea-detail', args=[self.idea.id])
+        etag = self.client.get(url, {'include': 'linked_elements'})['ETag']
+        self.character.name = 'Renamed'
+        self.character.save()
+        response = self.client.get(url, {'include': 'linked_elements'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['linked_elements'][1]['label'], 'Renamed')
+
+class LinkedIdeasTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create elements and ideas linking to them
+        self.character = Character.objects.create(name='Test Character', author=self.user)
+        self.place = Place.objects.create(name='Tavern', author=self.user)
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.chapter = Chapter.objects.create(story=self.story, title='Chapter 1', order=1)
+        self.first = Idea.objects.create(
+            content='First', type=IdeaType.CONCEPT, author=self.user,
+            linked_elements=[str(self.character.id), str(self.place.id)],
+        )
+        self.second = Idea.objects.create(
+            content='Second', type=IdeaType.CONCEPT, author=self.user,
+            linked_elements=[str(self.character.id), 'not-a-uuid', str(self.chapter.id)],
+        )
+
+    def idea_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {idea['id'] for idea in response.data['results']}
+
+    def test_ideas_linking_to_an_element(self):
+        self.assertEqual(
+            self.idea_ids(reverse('character-ideas', args=[self.character.id])),
+            {str(self.first.id), str(self.second.id)},
+        )
+        self.assertEqual(self.idea_ids(reverse('place-ideas', args=[self.place.id])), {str(self.first.id)})
+        self.assertEqual(self.idea_ids(reverse('chapter-ideas', args=[self.chapter.id])), {str(self.second.id)})
+        self.assertEqual(self.idea_ids(reverse('story-ideas', args=[self.story.id])), set())
+
+    def test_reverse_index_follows_idea_changes(self):
+        self.first.linked_elements = [str(self.place.id)]
+        self.first.save()
+        self.second.delete()
+        self.assertEqual(self.idea_ids(reverse('character-ideas', args=[self.character.id])), set())
+
+        response = self.client.post(
+            reverse('idea-list'),
+            [{'content': 'Bulk', 'type': IdeaType.CONCEPT, 'linked_elements': [str(self.story.id)]}],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.idea_ids(reverse('story-ideas', args=[self.story.id])), {response.data[0]['id']})
+
+    def test_other_authors_elements_are_not_found(self):
+        other = User.objects.create_user(username='other', password='12345')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('character-ideas', args=[self.character.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('chapter-ideas', args=[self.chapter.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('chapter-ideas', args=['not-an-id']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_element_is_looked_up_without_its_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.idea_ids(reverse('chapter-ideas', args=[self.chapter.id]))
+        self.assertFalse(any('api_chapterchunk' in query['sql'] or 'api_chapterscene' in query['sql'] for query in queries))
+
+class RelationshipGraphTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a chain a - b - c - d, with an enemy edge b - d, and a loner
+        self.a, self.b, self.c, self.d, self.loner = [
+            Character.objects.create(name=name, author=self.user) for name in ['Anna', 'Ben', 'Cleo', 'Dan', 'Loner']
+        ]
+        CharacterRelationship.objects.create(from_character=self.a, to_character=self.b, types=[RelationshipType.FRIEND])
+        CharacterRelationship.objects.create(from_character=self.c, to_character=self.b, types=[RelationshipType.FAMILY])
+        CharacterRelationship.objects.create(from_character=self.c, to_character=self.d, types=[RelationshipType.FRIEND])
+        CharacterRelationship.objects.create(from_character=self.b, to_character=self.d, types=[RelationshipType.ENEMY])
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_shortest_path(self):
+        data = self.get('character-graph-path', **{'from': self.a.id, 'to': self.d.id})
+        self.assertEqual([node['name'] for node in data['path']], ['Anna', 'Ben', 'Dan'])
+        self.assertEqual(data['length'], 2)
+
+        data = self.get('character-graph-path', **{'from': self.a.id, 'to': self.d.id, 'types': 'FRIEND,FAMILY'})
+        self.assertEqual([node['name'] for node in data['path']], ['Anna', 'Ben', 'Cleo', 'Dan'])
+
+        data = self.get('character-graph-path', **{'from': self.a.id, 'to': self.loner.id})
+        self.assertIsNone(data['path'])
+
+    def test_neighborhood(self):
+        data = self.get('character-graph-neighborhood', character=self.a.id, hops=2)
+        self.assertEqual([(node['name'], node['distance']) for node in data], [('Ben', 1), ('Cleo', 2), ('Dan', 2)])
+
+    def test_components_and_degrees(self):
+        components = self.get('character-graph-components', types='FRIEND')
+        self.assertEqual(
+            sorted(sorted(node['name'] for node in component) for component in components),
+            [['Anna', 'Ben'], ['Cleo', 'Dan'], ['Loner']],
+        )
+        degrees = self.get('character-graph-degrees', limit=2)
+        self.assertEqual([(node['name'], node['degree']) for node in degrees], [('Ben', 3), ('Cleo', 2)])
+
+    def test_graph_is_rebuilt_after_changes(self):
+        self.assertEqual(len(self.get('character-graph')['edges']), 4)
+        CharacterRelationship.objects.create(from_character=self.loner, to_character=self.a, types=[RelationshipType.LOVER])
+        edges = self.get('character-graph', types='LOVER')['edges']
+        self.assertEqual(len(edges), 1)
+        self.assertEqual({edges[0]['source'], edges[0]['target']}, {self.a.id, self.loner.id})
+        self.assertEqual(edges[0]['types'], ['LOVER'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cached_graph_needs_no_relationship_queries(self):
+        cache.clear()
+        self.get('character-graph-components')
+        with self.assertNumQueries(1):
+            self.get('character-graph-degrees')
+
+    def test_invalid_parameters(self):
+        response = self.client.get(reverse('character-graph-components'), {'types': 'RIVAL'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        other = Character.objects.create(name='Foreign', author=User.objects.create_user(username='other'))
+        response = self.client.get(reverse('character-graph-neighborhood'), {'character': other.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class CharacterRelationshipFilterTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create characters and relationships
+        self.a, self.b, self.c = [Character.objects.create(name=name, author=self.user) for name in ['A', 'B', 'C']]
+        self.friends = CharacterRelationship.objects.create(
+            from_character=self.a, to_character=self.b, types=[RelationshipType.FRIEND, RelationshipType.FAMILY]
+        )
+        self.enemies = CharacterRelationship.objects.create(
+            from_character=self.b, to_character=self.a, types=[RelationshipType.ENEMY]
+        )
+        self.mentor = CharacterRelationship.objects.create(
+            from_character=self.c, to_character=self.a, types=[RelationshipType.MENTOR]
+        )
+
+    def list_ids(self, **params):
+        response = self.client.get(reverse('character-relationship-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {relationship['id'] for relationship in response.data['results']}
+
+    def test_filter_by_types(self):
+        self.assertEqual(self.list_ids(types='FAMILY'), {str(self.friends.id)})
+        self.assertEqual(self.list_ids(types='ENEMY,MENTOR'), {str(self.enemies.id), str(self.mentor.id)})
+        response = self.client.get(reverse('character-relationship-list'), {'types': 'RIVAL'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_between_two_characters(self):
+        self.assertEqual(self.list_ids(between=f'{self.b.id},{self.a.id}'), {str(self.friends.id), str(self.enemies.id)})
+
+    def test_types_keep_their_json_shape(self):
+        response = self.client.post(reverse('character-relationship-list'), {
+            'from_character': str(self.b.id), 'to_character': str(self.c.id), 'types': ['LOVER', 'FRIEND'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['types'], ['FRIEND', 'LOVER'])
+
+        response = self.client.post(reverse('character-relationship-list'), {
+            'from_character': str(self.b.id), 'to_character': str(self.c.id), 'types': ['RIVAL'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class TimelineTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create interleaved events and scenes
+        self.events = [
+            Event.objects.create(description=f'Event {order}', time_order=order, author=self.user) for order in (1, 3, 3, 5)
+        ]
+        self.scenes = [
+            Scene.objects.create(short_description=f'Scene {order}', time_order=order, author=self.user) for order in (2, 3, 6)
+        ]
+
+    def timeline(self, **params):
+        response = self.client.get(reverse('timeline'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_timeline_merges_events_and_scenes(self):
+        results = self.timeline()['results']
+        self.assertEqual([item['time_order'] for item in results], [1, 2, 3, 3, 3, 5, 6])
+        # At equal time_order events come before scenes
+        self.assertEqual([item['type'] for item in results[2:5]], ['event', 'event', 'scene'])
+        self.assertEqual(results[0]['summary'], 'Event 1')
+
+    def test_keyset_pages_cover_everything_once(self):
+        data = self.timeline(page_size=2)
+        seen = [item['id'] for item in data['results']]
+        while data['next']:
+            response = self.client.get(data['next'])
+            data = response.data
+            seen += [item['id'] for item in data['results']]
+        expected = [item['id'] for item in self.timeline()['results']]
+        self.assertEqual(seen, expected)
+
+    def test_window_and_story_filters(self):
+        results = self.timeline(**{'from': 3, 'to': 5})['results']
+        self.assertEqual([item['time_order'] for item in results], [3, 3, 3, 5])
+
+        story = Story.objects.create(title='Test Story', author=self.user)
+        story.events.add(self.events[1])
+        chapter = Chapter.objects.create(story=story, title='Chapter 1')
+        chapter.included_scenes.add(self.scenes[2])
+        results = self.timeline(story=story.id)['results']
+        self.assertEqual([item['id'] for item in results], [self.events[1].id, self.scenes[2].id])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('timeline'), {'from': 'soon'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('timeline'), {'cursor': 'garbage'}).status_code, status.HTTP_404_NOT_FOUND)
+        other = Story.objects.create(title='Foreign', author=User.objects.create_user(username='other'))
+        self.assertEqual(self.client.get(reverse('timeline'), {'story': other.id}).status_code, status.HTTP_404_NOT_FOUND)
+
+class RankingTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create chapters with gapped ranks
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.chapters = [
+            Chapter.objects.create(story=self.story, title=f'Chapter {index}', order=index * 1024) for index in range(1, 5)
+        ]
+
+    def chapter_titles(self):
+        return list(Chapter.objects.filter(story=self.story).order_by('order', 'id').values_list('title', flat=True))
+
+    def test_move_updates_a_single_row(self):
+        url = reverse('chapter-move', args=[self.chapters[3].id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'before': str(self.chapters[0].id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.chapter_titles(), ['Chapter 4', 'Chapter 1', 'Chapter 2', 'Chapter 3'])
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "api_chapter"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertFalse(any('api_chapterchunk' in query['sql'] for query in queries))
+
+        response = self.client.post(url, {'after': str(self.chapters[1].id)}, format='json')
+        self.assertEqual(self.chapter_titles(), ['Chapter 1', 'Chapter 2', 'Chapter 4', 'Chapter 3'])
+        self.assertEqual(response.data, {'id': self.chapters[3].id, 'order': (2048 + 3072) // 2})
+
+    def test_move_rebalances_when_out_of_room(self):
+        Chapter.objects.filter(pk=self.chapters[1].pk).update(order=1025)
+        response = self.client.post(
+            reverse('chapter-move', args=[self.chapters[3].id]), {'after': str(self.chapters[0].id)}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.chapter_titles(), ['Chapter 1', 'Chapter 4', 'Chapter 2', 'Chapter 3'])
+
+    def test_reorder_in_one_request(self):
+        ids = [str(chapter.id) for chapter in reversed(self.chapters)]
+        response = self.client.post(reverse('chapter-reorder'), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.chapter_titles(), ['Chapter 4', 'Chapter 3', 'Chapter 2', 'Chapter 1'])
+
+    def test_reorder_subset_with_equal_ranks(self):
+        scenes = [Scene.objects.create(short_description=f'Scene {index}', author=self.user) for index in range(3)]
+        response = self.client.post(reverse('scene-reorder'), [str(scenes[2].id), str(scenes[0].id)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ordered = Scene.objects.filter(pk__in=[scenes[0].pk, scenes[2].pk]).order_by('rank')
+        self.assertEqual(list(ordered), [scenes[2], scenes[0]])
+
+    def test_new_rows_are_ranked_at_the_end(self):
+        ids = [
+            self.client.post(reverse('event-list'), {'description': f'Event {index}'}, format='json').data['id']
+            for index in range(2)
+        ]
+        ids += [row['id'] for row in self.client.post(
+            reverse('event-list'), [{'description': 'Event 2'}, {'description': 'Event 3'}], format='json'
+        ).data]
+        response = self.client.post(reverse('chapter-list'), {'story': str(self.story.id), 'title': 'Chapter 5'}, format='json')
+        self.assertEqual(response.data['order'], 5 * 1024)
+
+        ranks = dict(Event.objects.values_list('id', 'rank'))
+        self.assertEqual([ranks[uuid.UUID(pk)] for pk in ids], [1024, 2048, 3072, 4096])
+        listed = self.client.get(reverse('event-list')).data['results']
+        self.assertEqual([row['id'] for row in listed], ids)
+
+    def test_moves_keep_time_order_and_the_timeline(self):
+        events = [
+            Event.objects.create(description=f'Event {order}', time_order=order, rank=index, author=self.user)
+            for index, order in enumerate((10, 11, 20, 30))
+        ]
+        Scene.objects.create(short_description='Scene 25', time_order=25, author=self.user)
+        response = self.client.post(reverse('event-move', args=[events[2].id]), {'after': str(events[0].id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ranked = Event.objects.filter(author=self.user).order_by('rank', 'id')
+        self.assertEqual([event.description for event in ranked], ['Event 10', 'Event 20', 'Event 11', 'Event 30'])
+        self.assertEqual(sorted(ranked.values_list('time_order', flat=True)), [10, 11, 20, 30])
+        timeline = self.client.get(reverse('timeline')).data['results']
+        self.assertEqual([item['time_order'] for item in timeline], [10, 11, 20, 25, 30])
+
+    def test_invalid_moves(self):
+        other_story = Story.objects.create(title='Other Story', author=self.user)
+        other = Chapter.objects.create(story=other_story, title='Elsewhere')
+        url = reverse('chapter-move', args=[self.chapters[0].id])
+        self.assertEqual(self.client.post(url, {'before': str(other.id)}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('chapter-reorder'), [str(self.chapters[0].id), str(other.id)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChapterScenesTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a chapter whose scenes are not in time order
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.scenes = [
+            Scene.objects.create(short_description=f'Scene {index}', author=self.user, time_order=index)
+            for index in range(4)
+        ]
+        self.chapter = Chapter.objects.create(story=self.story, title='Chapter 1')
+        ChapterScene.objects.set_order(self.chapter, [self.scenes[2], self.scenes[0], self.scenes[1]])
+
+    def scene_ids(self):
+        response = self.client.get(reverse('chapter-detail', args=[self.chapter.id]))
+        return response.data['included_scenes']
+
+    def test_serializer_keeps_the_chapter_order(self):
+        expected = [self.scenes[2].id, self.scenes[0].id, self.scenes[1].id]
+        self.assertEqual(self.scene_ids(), expected)
+        response = self.client.get(reverse('story-detail', args=[self.story.id]), {'include': 'chapters.included_scenes'})
+        nested = response.data['chapters'][0]['included_scenes']
+        self.assertEqual([scene['id'] for scene in nested], [str(pk) for pk in expected])
+
+    def test_write_stores_the_given_order(self):
+        ids = [str(self.scenes[3].id), str(self.scenes[2].id)]
+        response = self.client.patch(
+            reverse('chapter-detail', args=[self.chapter.id]), {'included_scenes': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([str(pk) for pk in response.data['included_scenes']], ids)
+        self.assertEqual([str(pk) for pk in self.scene_ids()], ids)
+
+    def test_write_rejects_repeated_scenes(self):
+        scene_id = str(self.scenes[0].id)
+        response = self.client.post(
+            reverse('chapter-list'),
+            {'story': str(self.story.id), 'title': 'Again', 'included_scenes': [scene_id, scene_id]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('included_scenes', response.data)
+
+    def test_insert_and_move_write_a_single_row(self):
+        url = reverse('chapter-scenes', args=[self.chapter.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'scene': str(self.scenes[3].id), 'after': str(self.scenes[2].id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [query for query in queries if query['sql'].startswith(('INSERT INTO "api_chapter_included', 'UPDATE "api_chapter_included'))]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.scene_ids(), [self.scenes[2].id, self.scenes[3].id, self.scenes[0].id, self.scenes[1].id])
+
+        url = reverse('chapter-move-scene', args=[self.chapter.id, self.scenes[2].id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'after': str(self.scenes[1].id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [query for query in queries if query['sql'].startswith('UPDATE "api_chapter_included')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.scene_ids(), [self.scenes[3].id, self.scenes[0].id, self.scenes[1].id, self.scenes[2].id])
+
+    def test_append_list_and_remove(self):
+        response = self.client.post(reverse('chapter-scenes', args=[self.chapter.id]), {'scene': str(self.scenes[3].id)}, format='json')
+        self.assertEqual(response.data['position'], 4 * 1024)
+        response = self.client.get(reverse('chapter-scenes', args=[self.chapter.id]))
+        self.assertEqual([link['scene'] for link in response.data], [self.scenes[2].id, self.scenes[0].id, self.scenes[1].id, self.scenes[3].id])
+
+        response = self.client.delete(reverse('chapter-scene', args=[self.chapter.id, self.scenes[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.scene_ids(), [self.scenes[2].id, self.scenes[1].id, self.scenes[3].id])
+
+    def test_invalid_scene_changes(self):
+        url = reverse('chapter-scenes', args=[self.chapter.id])
+        other = User.objects.create_user(username='other', password='12345')
+        foreign = Scene.objects.create(short_description='Foreign', author=other)
+        self.assertEqual(self.client.post(url, {'scene': str(foreign.id)}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'scene': str(self.scenes[0].id)}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'scene': str(self.scenes[3].id), 'before': str(uuid.uuid4())}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(reverse('chapter-scene', args=[self.chapter.id, self.scenes[3].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChapterParagraphsTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a long chapter
+        story = Story.objects.create(title='Test Story', author=self.user)
+        self.texts = [f'Paragraph {index}.' for index in range(200)]
+        self.chapter = Chapter.objects.create(story=story, title='Chapter 1', content='\n\n'.join(self.texts))
+        self.url = reverse('chapter-paragraphs', args=[self.chapter.id])
+
+    def test_fetch_a_range(self):
+        response = self.client.get(self.url, {'start': 10, 'count': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'start': 10, 'total': 200, 'paragraphs': self.texts[10:13]})
+        self.assertEqual(len(self.client.get(self.url).data['paragraphs']), 50)
+        self.assertEqual(self.client.get(self.url, {'count': 10000}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_replace_a_range_rewrites_only_changed_chunks(self):
+        data = {'start': 5, 'end': 7, 'paragraphs': ['Paragraph 5.', 'Rewritten.', 'Inserted.']}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'start': 5, 'end': 8, 'total': 201})
+        chunk_writes = [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('INSERT INTO "api_chapterchunk"', 'UPDATE "api_chapterchunk"', 'DELETE FROM "api_chapterchunk"'))
+        ]
+        self.assertEqual(len(chunk_writes), 2)
+
+        # Existing clients still read the whole text from content
+        expected = self.texts[:6] + ['Rewritten.', 'Inserted.'] + self.texts[7:]
+        response = self.client.get(reverse('chapter-detail', args=[self.chapter.id]))
+        self.assertEqual(response.data['content'], '\n\n'.join(expected))
+        self.assertEqual(ChapterChunk.objects.paragraphs(self.chapter), expected)
+
+    def test_invalid_ranges(self):
+        for data in [
+            {'start': 201, 'end': 201, 'paragraphs': []},
+            {'start': 5, 'end': 4, 'paragraphs': []},
+            {'start': 0, 'paragraphs': 'text'},
+            {'start': 0, 'paragraphs': ['Two\n\nparagraphs']},
+            {'start': 0, 'end': 2, 'paragraphs': ['Trailing\n', 'break']},
+            {'start': 0, 'paragraphs': ['\nLeading break']},
+        ]:
+            self.assertEqual(self.client.patch(self.url, data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ChapterChunk.objects.paragraphs(self.chapter), self.texts)
+
+
+class ChapterDiffUpdateTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a chapter
+        story = Story.objects.create(title='Test Story', author=self.user)
+        self.chapter = Chapter.objects.create(story=story, title='Chapter 1', content='The cat sat on the mat.')
+        self.url = reverse('chapter-detail', args=[self.chapter.id])
+
+    def revision(self):
+        return self.client.get(self.url).data['revision']
+
+    def test_changes_apply_to_the_base_revision(self):
+        data = {
+            'base_revision': self.revision(),
+            'changes': [{'start': 4, 'end': 7, 'text': 'dog'}, {'start': 22, 'end': 22, 'text': ' again'}],
+            'title': 'Renamed',
+        }
+        # The delta is taken from the text just read, not a rebuilt revision
+        with mock.patch('api.revisions.rebuild') as rebuild:
+            response = self.client.patch(self.url, data, format='json')
+        rebuild.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id', 'revision', 'revision_number'})
+        self.assertEqual(response.data['revision_number'], 2)
+        self.chapter.refresh_from_db()
+        self.assertEqual(self.chapter.content, 'The dog sat on the mat again.')
+        self.assertEqual(self.chapter.title, 'Renamed')
+        self.assertEqual(response.data['revision'], self.revision())
+
+    def test_changes_rewrite_only_the_edited_paragraph(self):
+        self.chapter.content = '\n\n'.join(f'Paragraph {index}.' for index in range(100))
+        self.chapter.save()
+        start = self.chapter.content.index('Paragraph 50.')
+        data = {'base_revision': self.revision(), 'changes': [{'start': start, 'end': start + 9, 'text': 'Part'}]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chunk_writes = [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('INSERT INTO "api_chapterchunk"', 'UPDATE "api_chapterchunk"', 'DELETE FROM "api_chapterchunk"'))
+        ]
+        self.assertEqual(len(chunk_writes), 1)
+        self.assertEqual(ChapterChunk.objects.paragraphs(self.chapter, 50, 1), ['Part 50.'])
+
+    def test_whitespace_edits_are_kept(self):
+        data = {'base_revision': self.revision(), 'changes': [{'start': 23, 'text': ' '}]}
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The next diff refers to offsets after the added space
+        data = {'base_revision': response.data['revision'], 'changes': [{'start': 24, 'text': 'The end.'}]}
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.chapter.refresh_from_db()
+        self.assertEqual(self.chapter.content, 'The cat sat on the mat. The end.')
+
+    def test_stale_base_revision_conflicts(self):
+        base = self.revision()
+        self.client.patch(self.url, {'content': 'Edited elsewhere.'}, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'base_revision': base, 'changes': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(any('api_chapterchunk' in query['sql'] for query in queries))
+        self.assertEqual(response.data['revision'], self.revision())
+        self.chapter.refresh_from_db()
+        self.assertEqual(self.chapter.content, 'Edited elsewhere.')
+
+    def test_revision_is_read_without_the_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,revision'})
+        self.assertEqual(response.data, {'id': str(self.chapter.id), 'revision': self.chapter.content_hash})
+        self.assertFalse(any('api_chapterchunk' in query['sql'] for query in queries))
+
+    def test_invalid_changes(self):
+        base = self.revision()
+        for changes in [
+            [{'start': 10, 'end': 5, 'text': ''}],
+            [{'start': 0, 'end': 100, 'text': ''}],
+            [{'start': 8, 'end': 10}, {'start': 4, 'end': 6}],
+            'not a list',
+        ]:
+            response = self.client.patch(self.url, {'base_revision': base, 'changes': changes}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(self.url, {'changes': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChapterRevisionsTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a chapter saved many times
+        story = Story.objects.create(title='Test Story', author=self.user)
+        opening = 'Once upon a time. ' * 200 + '\n'
+        self.chapter = Chapter.objects.create(story=story, title='Chapter 1', content=opening)
+        self.contents = [opening]
+        for index in range(1, 45):
+            self.chapter.content = self.chapter.content + f'Line {index}\n'
+            self.chapter.save()
+            self.contents.append(self.chapter.content)
+
+    def test_snapshots_and_deltas(self):
+        revisions = ChapterRevision.objects.filter(chapter=self.chapter).order_by('number')
+        self.assertEqual(revisions.count(), 45)
+        self.assertEqual([revision.number for revision in revisions if revision.is_snapshot], [1, 21, 41])
+        # Deltas hold the change, not the text
+        self.assertLess(len(revisions[39].data), len(self.contents[39]) // 4)
+
+    def test_identical_saves_are_not_recorded(self):
+        self.chapter.save()
+        self.chapter.save(update_fields=['title'])
+        self.assertEqual(ChapterRevision.objects.filter(chapter=self.chapter).count(), 45)
+
+    def test_list_and_rebuild(self):
+        response = self.client.get(reverse('chapter-revisions', args=[self.chapter.id]), {'page_size': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([revision['number'] for revision in response.data['results']], [45, 44, 43, 42, 41])
+        self.assertNotIn('content', response.data['results'][0])
+
+        for number in (1, 20, 21, 40, 45):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('chapter-revision', args=[self.chapter.id, number]))
+            self.assertEqual(response.data['content'], self.contents[number - 1])
+            self.assertLessEqual(len(queries), 6)
+        response = self.client.get(reverse('chapter-revision', args=[self.chapter.id, 46]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restore(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('chapter-restore-revision', args=[self.chapter.id, 3]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The replaced text is not read back from its chunks
+        text_reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and '"api_chapterchunk"."text"' in query['sql']]
+        self.assertEqual(text_reads, [])
+        self.assertEqual(response.data['content'], self.contents[2])
+        latest = ChapterRevision.objects.filter(chapter=self.chapter).order_by('-number').first()
+        self.assertEqual(latest.number, 46)
+
+
+class StoryStatsTest(APITestCase):
+    def setUp(self):
+        # Create a user
+        self.user = User.objects.create_user(username='testuser', password='12345')
+
+        # Create a client and force authentication
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # Create a story with two chapters, scenes, characters and events
+        self.story = Story.objects.create(title='Test Story', author=self.user)
+        self.hero = Character.objects.create(name='Hero', author=self.user)
+        self.villain = Character.objects.create(name='Villain', author=self.user)
+        self.battle = Event.objects.create(description='Battle', author=self.user)
+        self.scenes = [Scene.objects.create(short_description=f'Scene {index}', author=self.user) for index in range(3)]
+        self.scenes[0].characters.add(self.hero)
+        self.scenes[1].characters.add(self.hero, self.villain)
+        self.scenes[1].shown_events.add(self.battle)
+        self.story.events.add(self.battle)
+        self.first = Chapter.objects.create(story=self.story, title='One', order=1, content='It was a dark night.')
+        self.second = Chapter.objects.create(story=self.story, title='Two', order=2, content='The end.')
+        self.first.included_scenes.add(self.scenes[0], self.scenes[1])
+        self.second.included_scenes.add(self.scenes[1])
+        self.url = reverse('story-stats', args=[self.story.id])
+
+    def test_stats(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {name: response.data[name] for name in ('chapters', 'words', 'characters', 'scenes', 'events', 'appearing_characters')},
+            {'chapters': 2, 'words': 7, 'characters': 28, 'scenes': 2, 'events': 1, 'appearing_characters': 2},
+        )
+        first = response.data['chapter_stats'][0]
+        self.assertEqual((first['words'], first['scenes'], first['events'], first['appearing_characters']), (5, 2, 1, 2))
+
+    def test_content_saves_are_incremental(self):
+        self.first.content = 'It was a dark and stormy night.'
+        with CaptureQueriesContext(connection) as queries:
+            self.first.save(update_fields=['content'])
+        # Neither the other chapter nor the chapter totals are read again
+        recounts = [query for query in queries if self.second.id.hex in query['sql'] or 'SUM(' in query['sql']]
+        self.assertEqual(recounts, [])
+        self.assertEqual(self.client.get(self.url).data['words'], 9)
+
+    def test_structure_changes(self):
+        self.second.included_scenes.add(self.scenes[2])
+        self.scenes[2].characters.add(Character.objects.create(name='Stranger', author=self.user))
+        self.assertEqual(self.client.get(self.url).data['scenes'], 3)
+        self.assertEqual(self.client.get(self.url).data['appearing_characters'], 3)
+
+        self.villain.delete()
+        self.story.events.clear()
+        self.first.delete()
+        data = self.client.get(self.url).data
+        self.assertEqual((data['chapters'], data['words'], data['scenes'], data['events']), (1, 2, 2, 0))
+        self.assertEqual(data['appearing_characters'], 2)
+
+    def test_stories_without_stats_are_counted_on_read(self):
+        StoryStats.objects.all().delete()
+        ChapterStats.objects.all().delete()
+        self.assertEqual(self.client.get(self.url).data['words'], 7)
+        other = User.objects.create_user(username='other', password='12345')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,89 @@
+"""
+Merged, time-ordered view of an author's events and scenes.
+
+Items are ordered by (time_order, kind, id) and paged by keyset: the
+cursor holds the last item's key, and each source is read from there with
+a range scan on its (author, time_order, id) index. Neither source is
+ever counted or offset, so every page costs the same.
+"""
+import base64
+import heapq
+import json
+import uuid
+from django.db.models import Q
+from django.db.models.functions import Left
+from .models import Event, Scene
+
+# Source model, position in the ordering at equal time_order, summary field
+TIMELINE_SOURCES = [
+    (Event, 0, 'description'),
+    (Scene, 1, 'short_description'),
+]
+
+SUMMARY_LENGTH = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    time_order, rank, item_id = key
+    raw = json.dumps([time_order, rank, str(item_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(value):
+    try:
+        time_order, rank, item_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return int(time_order), int(rank), uuid.UUID(item_id)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor.')
+
+def after_key(rank, key):
+    """
+    Rows of the source at ``rank`` that sort after ``key``.
+    """
+    time_order, key_rank, item_id = key
+    if rank > key_rank:
+        return Q(time_order__gte=time_order)
+    if rank < key_rank:
+        return Q(time_order__gt=time_order)
+    return Q(time_order__gt=time_order) | Q(time_order=time_order, id__gt=item_id)
+
+def source_rows(model, rank, summary_field, author, story, start, end, after, limit):
+    rows = model.objects.filter(author=author)
+    if story is not None:
+        if model is Event:
+            rows = rows.filter(stories=story)
+        else:
+            rows = rows.filter(chapters__story=story).distinct()
+    if start is not None:
+        rows = rows.filter(time_order__gte=start)
+    if end is not None:
+        rows = rows.filter(time_order__lte=end)
+    if after is not None:
+        rows = rows.filter(after_key(rank, after))
+    rows = rows.order_by('time_order', 'id').values_list('id', 'time_order', Left(summary_field, SUMMARY_LENGTH))
+    return [
+        ((time_order, rank, item_id), model._meta.model_name, summary)
+        for item_id, time_order, summary in rows[:limit]
+    ]
+
+def timeline_page(author, story=None, start=None, end=None, after=None, size=100):
+    """
+    Up to ``size`` timeline items after the ``after`` key, and the key to
+    continue from (None on the last page). With a story, events come from
+    Story.events and scenes from the story's chapters.
+    """
+    sources = [
+        source_rows(model, rank, summary_field, author, story, start, end, after, size + 1)
+        for model, rank, summary_field in TIMELINE_SOURCES
+    ]
+    merged = list(heapq.merge(*sources, key=lambda row: row[0]))
+    page = merged[:size]
+    items = [
+        {'type': kind, 'id': key[2], 'time_order': key[0], 'summary': summary}
+        for key, kind, summary in page
+    ]
+    next_key = page[-1][0] if len(merged) > size else None
+    return items, next_key
@@ -1,13 +1,14 @@
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from .routers import BulkRouter
 from .views import (
     UserViewSet, CharacterViewSet, CharacterArcViewSet,
     PlaceViewSet, ItemViewSet, StoryViewSet, SceneViewSet,
     IdeaViewSet, ChapterViewSet, RaceViewSet, CharacterTraitViewSet,
-    CharacterRelationshipViewSet, EventViewSet
+    CharacterRelationshipViewSet, EventViewSet, WorkspaceExportView, WorkspaceImportView,
+    SearchView, TimelineView
 )
 
-router = DefaultRouter()
+router = BulkRouter()
 router.register(r'users', UserViewSet)
 router.register(r'characters', CharacterViewSet, basename='character')
 router.register(r'character-arcs', CharacterArcViewSet, basename='character-arc')
@@ -23,5 +24,9 @@ router.register(r'races', RaceViewSet, basename='race')
 router.register(r'character-traits', CharacterTraitViewSet, basename='character-trait')
 
 urlpatterns = [
+    path('export/', WorkspaceExportView.as_view(), name='workspace-export'),
+    path('import/', WorkspaceImportView.as_view(), name='workspace-import'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('timeline/', TimelineView.as_view(), name='timeline'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,47 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from .models import ChangeVersion, Chapter, ChapterScene, CharacterRelationship, Story, Character
+
+
+def version_label(model):
+    return model._meta.model_name
+
+def get_author_id(instance):
+    """
+    Author owning a row, or None for shared models like Race.
+    """
+    if hasattr(instance, 'author_id'):
+        return instance.author_id
+    if isinstance(instance, Chapter):
+        return Story.objects.filter(pk=instance.story_id).values_list('author_id', flat=True).first()
+    if isinstance(instance, ChapterScene):
+        return Story.objects.filter(chapters=instance.chapter_id).values_list('author_id', flat=True).first()
+    if isinstance(instance, CharacterRelationship):
+        return Character.objects.filter(pk=instance.from_character_id).values_list('author_id', flat=True).first()
+    return None
+
+def bump_versions(author_id, models):
+    for label in {version_label(model) for model in models}:
+        changed = ChangeVersion.objects.filter(author_id=author_id, model=label).update(version=F('version') + 1)
+        if changed:
+            continue
+        try:
+            with transaction.atomic():
+                ChangeVersion.objects.create(author_id=author_id, model=label, version=1)
+        except IntegrityError:
+            # Created concurrently by another request
+            ChangeVersion.objects.filter(author_id=author_id, model=label).update(version=F('version') + 1)
+
+def get_versions(author_id, models):
+    """
+    Current versions of the given models as seen by one author, including
+    the shared (author-less) counters, in one query.
+    """
+    labels = {version_label(model) for model in models}
+    rows = ChangeVersion.objects.filter(
+        Q(author_id=author_id) | Q(author__isnull=True), model__in=labels
+    ).values_list('author_id', 'model', 'version')
+    versions = dict.fromkeys(sorted(labels), 0)
+    for row_author_id, label, version in rows:
+        versions[label] += version
+    return versions
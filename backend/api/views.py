@@ -1,131 +1,725 @@
-from rest_framework import viewsets
+import uuid
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
 from .models import (
     Character, CharacterArc, Place, Item,
     Story, Scene, Idea, Chapter, Race, CharacterTrait,
-    CharacterRelationship, Event
+    CharacterRelationship, Event, PlaceClosure, IdeaTag, ChapterScene, ChapterChunk, ChapterRevision,
+    ChapterStats, StoryStats,
+    PARAGRAPH_SEPARATOR, join_paragraphs, split_paragraphs,
+    ALL_RELATIONSHIP_TYPES, RELATIONSHIP_TYPE_BITS, relationship_mask_to_types, relationship_types_to_mask
+)
+from .mixins import (
+    FieldSelectionMixin, ConditionalGetMixin, ResponseCacheMixin, BulkModelMixin, LinkedIdeasMixin,
+    RankedMixin
 )
 from .serializers import (
     UserSerializer, CharacterSerializer, CharacterArcSerializer,
     PlaceSerializer, ItemSerializer, StorySerializer, SceneSerializer,
     IdeaSerializer, ChapterSerializer, RaceSerializer, CharacterTraitSerializer,
-    CharacterRelationshipSerializer, EventSerializer
+    CharacterRelationshipSerializer, EventSerializer, PlaceNodeSerializer, ChapterRevisionSerializer,
+    ChapterStatsSerializer, StoryStatsSerializer
 )
-
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+from .graph import RelationshipGraph
+from .links import resolve_links
+from .ranking import append, move
+from .pagination import StableCursorPagination
+from .revisions import InvalidChanges, apply_changes, rebuild
+from .search import SEARCH_KINDS, search
+from .stats import refresh_stories
+from .timeline import InvalidCursor, decode_cursor, encode_cursor, timeline_page
+from .workspace import WorkspaceFormatError, WorkspaceImporter, iter_export
+
+def parse_relationship_types(value, param='types'):
+    values = [value for value in (value or '').split(',') if value]
+    unknown = [value for value in values if value not in RELATIONSHIP_TYPE_BITS]
+    if unknown:
+        raise ValidationError({param: [f"Unknown relationship type(s): {', '.join(unknown)}"]})
+    return values
+
+class UserViewSet(FieldSelectionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return self.setup_eager_loading(super().get_queryset())
+
 
 
-class CharacterViewSet(viewsets.ModelViewSet):
+class CharacterViewSet(BulkModelMixin, LinkedIdeasMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = CharacterSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Character.objects.filter(author=self.request.user)
+        queryset = Character.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class CharacterArcViewSet(viewsets.ModelViewSet):
+    def get_graph_mask(self):
+        """
+        Type mask from ?types=FRIEND,ENEMY; all types when absent
+        """
+        values = parse_relationship_types(self.request.query_params.get('types'))
+        return relationship_types_to_mask(values) if values else ALL_RELATIONSHIP_TYPES
+
+    def get_graph_character(self, graph, param):
+        value = self.request.query_params.get(param)
+        if not value:
+            raise ValidationError({param: ['This parameter is required.']})
+        try:
+            character_id = uuid.UUID(value)
+        except ValueError:
+            raise ValidationError({param: ['Expected a character id.']})
+        if character_id not in graph:
+            raise NotFound(f'Character {value} not found.')
+        return character_id
+
+    @action(detail=False)
+    def graph(self, request):
+        """
+        The whole relationship graph as nodes and undirected edges
+        """
+        graph = RelationshipGraph.cached(request.user.pk)
+        mask = self.get_graph_mask()
+        return Response({
+            'nodes': [graph.node(number) for number in range(len(graph.ids))],
+            'edges': [
+                {'source': graph.ids[source], 'target': graph.ids[target], 'types': relationship_mask_to_types(types)}
+                for source, target, types in graph.edges(mask)
+            ],
+        })
+
+    @action(detail=False, url_path='graph/path', url_name='graph-path')
+    def graph_path(self, request):
+        """
+        Shortest chain of relationships between ?from= and ?to=
+        """
+        graph = RelationshipGraph.cached(request.user.pk)
+        mask = self.get_graph_mask()
+        path = graph.shortest_path(
+            self.get_graph_character(graph, 'from'), self.get_graph_character(graph, 'to'), mask
+        )
+        if path is None:
+            return Response({'path': None, 'length': None})
+        return Response({'path': [graph.node(number) for number in path], 'length': len(path) - 1})
+
+    @action(detail=False, url_path='graph/neighborhood', url_name='graph-neighborhood')
+    def graph_neighborhood(self, request):
+        """
+        Characters within ?hops= (default 1, at most 6) of ?character=
+        """
+        graph = RelationshipGraph.cached(request.user.pk)
+        mask = self.get_graph_mask()
+        character_id = self.get_graph_character(graph, 'character')
+        try:
+            hops = int(request.query_params.get('hops', 1))
+        except ValueError:
+            hops = 0
+        if not 1 <= hops <= 6:
+            raise ValidationError({'hops': ['Expected an integer between 1 and 6.']})
+        distances = graph.neighbourhood(character_id, hops, mask)
+        ordered = sorted(distances.items(), key=lambda item: (item[1], graph.names[item[0]]))
+        return Response([dict(graph.node(number), distance=distance) for number, distance in ordered])
+
+    @action(detail=False, url_path='graph/components', url_name='graph-components')
+    def graph_components(self, request):
+        """
+        Groups of characters connected by relationships, largest first
+        """
+        graph = RelationshipGraph.cached(request.user.pk)
+        components = graph.components(self.get_graph_mask())
+        return Response([[graph.node(number) for number in component] for component in components])
+
+    @action(detail=False, url_path='graph/degrees', url_name='graph-degrees')
+    def graph_degrees(self, request):
+        """
+        Characters ranked by number of related characters, ?limit= (default 20)
+        """
+        graph = RelationshipGraph.cached(request.user.pk)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({'limit': ['Expected a positive integer.']})
+        degrees = graph.degrees(self.get_graph_mask())[:limit]
+        return Response([dict(graph.node(number), degree=degree) for number, degree in degrees])
+
+class CharacterArcViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = CharacterArcSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CharacterArc.objects.filter(author=self.request.user)
+        queryset = CharacterArc.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class PlaceViewSet(viewsets.ModelViewSet):
+class PlaceViewSet(LinkedIdeasMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = PlaceSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Place.objects.filter(author=self.request.user)
+        queryset = Place.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class ItemViewSet(viewsets.ModelViewSet):
+    def closure_nodes(self, links, place_attr):
+        nodes = []
+        for link in links:
+            place = getattr(link, place_attr)
+            place.depth = link.depth
+            nodes.append(place)
+        return PlaceNodeSerializer(nodes, many=True).data
+
+    @action(detail=True)
+    def subtree(self, request, pk=None):
+        """
+        Every place nested under this one, nearest levels first
+        """
+        links = PlaceClosure.objects.filter(
+            ancestor=self.get_object(), depth__gt=0
+        ).select_related('descendant').order_by('depth')
+        return Response(self.closure_nodes(links, 'descendant'))
+
+    @action(detail=True)
+    def ancestors(self, request, pk=None):
+        """
+        Breadcrumb from the root place down to this place's parent
+        """
+        links = PlaceClosure.objects.filter(
+            descendant=self.get_object(), depth__gt=0
+        ).select_related('ancestor').order_by('-depth')
+        return Response(self.closure_nodes(links, 'ancestor'))
+
+    @action(detail=True)
+    def depth(self, request, pk=None):
+        place = self.get_object()
+        depth = PlaceClosure.objects.filter(descendant=place).aggregate(depth=Max('depth'))['depth']
+        return Response({'id': place.id, 'depth': depth or 0})
+
+class ItemViewSet(LinkedIdeasMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = ItemSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Item.objects.filter(author=self.request.user)
+        queryset = Item.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(BulkModelMixin, LinkedIdeasMixin, RankedMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('rank', 'id')
 
     def get_queryset(self):
-        return Event.objects.filter(author=self.request.user)
+        queryset = Event.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        self.save_ranked(serializer, author=self.request.user)
 
-class StoryViewSet(viewsets.ModelViewSet):
+class StoryViewSet(LinkedIdeasMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = StorySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Story.objects.filter(author=self.request.user)
+        queryset = Story.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class SceneViewSet(viewsets.ModelViewSet):
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        """
+        Word, character, scene, event and cast counts of the story and of
+        each of its chapters, read from the maintained stats rows.
+        """
+        story = Story.objects.filter(author=request.user, pk=pk).only('pk').first()
+        if story is None:
+            raise NotFound('Story not found.')
+        stats = StoryStats.objects.filter(story=story).first()
+        if stats is None:
+            # Stories older than the stats tables are counted once
+            refresh_stories([story.pk])
+            stats = StoryStats.objects.get(story=story)
+        chapters = ChapterStats.objects.filter(story=story).order_by('chapter__order', 'chapter_id')
+        data = StoryStatsSerializer(stats).data
+        data['chapter_stats'] = ChapterStatsSerializer(chapters, many=True).data
+        return Response(data)
+
+class SceneViewSet(BulkModelMixin, LinkedIdeasMixin, RankedMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = SceneSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('rank', 'id')
 
     def get_queryset(self):
-        return Scene.objects.filter(author=self.request.user)
+        queryset = Scene.objects.filter(author=self.request.user)
+        return self.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        self.save_ranked(serializer, author=self.request.user)
 
-class IdeaViewSet(viewsets.ModelViewSet):
+class IdeaViewSet(BulkModelMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
+    """
+    Ideas can be filtered by tag: ?tags=a,b matches ideas with any of the
+    tags, adding &tag_match=all only those with every tag.
+    """
     serializer_class = IdeaSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Idea.objects.filter(author=self.request.user)
+        queryset = Idea.objects.filter(author=self.request.user)
+        if self.action == 'list':
+            queryset = self.filter_by_tags(queryset)
+        return self.setup_eager_loading(queryset)
+
+    def get_tag_filter(self):
+        tags = [tag for value in self.request.query_params.getlist('tags') for tag in value.split(',') if tag]
+        match = self.request.query_params.get('tag_match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'tag_match': ["Expected 'any' or 'all'."]})
+        return list(dict.fromkeys(tags)), match
+
+    def filter_by_tags(self, queryset):
+        tags, match = self.get_tag_filter()
+        if not tags:
+            return queryset
+        rows = IdeaTag.objects.filter(author=self.request.user, tag__in=tags)
+        if match == 'all':
+            rows = rows.values('idea_id').annotate(matched=Count('tag')).filter(matched=len(tags))
+        return queryset.filter(pk__in=rows.values('idea_id'))
+
+    @action(detail=False)
+    def tags(self, request):
+        """
+        Number of ideas per tag, most used first. With ?tags= the counts
+        cover only the ideas matching that filter.
+        """
+        rows = IdeaTag.objects.filter(author=request.user)
+        if self.get_tag_filter()[0]:
+            rows = rows.filter(idea__in=self.filter_by_tags(Idea.objects.filter(author=request.user)))
+        counts = rows.values('tag').annotate(count=Count('id')).order_by('-count', 'tag')
+        return Response(list(counts))
+
+    @action(detail=True)
+    def links(self, request, pk=None):
+        """
+        The idea's linked elements as typed stubs, in stored order
+        """
+        idea = self.get_object()
+        links = resolve_links(idea.author_id, idea.linked_elements or [])
+        return Response([links[str(element_id)] for element_id in idea.linked_elements or []])
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class ChapterViewSet(viewsets.ModelViewSet):
+class ChapterViewSet(LinkedIdeasMixin, RankedMixin, ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = ChapterSerializer
     permission_classes = [IsAuthenticated]
+    author_lookup = 'story__author'
+    # order is only unique within a story, so pages keep each story together
+    cursor_ordering = ('story_id', 'order', 'id')
 
     def get_queryset(self):
+        queryset = Chapter.objects.filter(story__author=self.request.user)
+        return self.setup_eager_loading(queryset)
+
+    def get_ranked_queryset(self):
         return Chapter.objects.filter(story__author=self.request.user)
 
-class RaceViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        self.save_ranked(serializer)
+
+    def partial_update(self, request, *args, **kwargs):
+        """
+        Besides plain field updates, PATCH takes {"base_revision", "changes"}
+        to edit the content by diff (see revisions.py). The changes apply
+        only if the content is still at base_revision, else 409 Conflict with
+        the current revision. The response is just {"id", "revision",
+        "revision_number"}.
+        """
+        data = request.data
+        if not isinstance(data, dict) or 'changes' not in data:
+            return super().partial_update(request, *args, **kwargs)
+        if 'content' in data:
+            raise ValidationError({'content': ['Send either content or changes, not both.']})
+        if not isinstance(data.get('base_revision'), str):
+            raise ValidationError({'base_revision': ['This field is required with changes.']})
+
+        with transaction.atomic():
+            # Lock the row and check the stored hash before reading any text
+            instance = get_object_or_404(self.get_ranked_queryset().select_for_update(), pk=kwargs['pk'])
+            self.check_object_permissions(request, instance)
+            if data['base_revision'] != instance.content_hash:
+                return Response(
+                    {'detail': 'The chapter has changed since the base revision.', 'revision': instance.content_hash},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            try:
+                content = apply_changes(instance.content, data['changes'])
+            except InvalidChanges as error:
+                raise ValidationError({'changes': [str(error)]})
+
+            fields = {name: value for name, value in data.items() if name not in ('base_revision', 'changes')}
+            serializer = self.get_serializer(instance, data=fields, partial=True)
+            serializer.is_valid(raise_exception=True)
+            # Saved with the other fields; only the paragraphs that changed are written
+            instance.content = content
+            self.perform_update(serializer)
+            number = instance.revisions.order_by('-number').values_list('number', flat=True).first()
+
+        return Response({'id': instance.pk, 'revision': instance.content_hash, 'revision_number': number})
+
+    def get_chapter_revision(self, pk, number):
+        revision = ChapterRevision.objects.filter(chapter=self.get_ranked_chapter(pk), number=number).first()
+        if revision is None:
+            raise NotFound('Revision not found.')
+        return revision
+
+    @action(detail=True)
+    def revisions(self, request, pk=None):
+        """
+        The chapter's saved revisions, newest first, without their content.
+        """
+        revisions = ChapterRevision.objects.filter(chapter=self.get_ranked_chapter(pk)).defer('data')
+        paginator = StableCursorPagination()
+        paginator.ordering = ('-number',)
+        page = paginator.paginate_queryset(revisions, request)
+        return paginator.get_paginated_response(ChapterRevisionSerializer(page, many=True).data)
+
+    @action(detail=True, url_path=r'revisions/(?P<number>[0-9]+)', url_name='revision')
+    def revision(self, request, pk=None, number=None):
+        revision = self.get_chapter_revision(pk, number)
+        data = ChapterRevisionSerializer(revision).data
+        data['content'] = rebuild(revision.chapter_id, revision.number)
+        return Response(data)
+
+    @action(detail=True, methods=['post'], url_path=r'revisions/(?P<number>[0-9]+)/restore', url_name='restore-revision')
+    def restore_revision(self, request, pk=None, number=None):
+        """
+        Make a past revision the chapter's content again, as a new revision.
+        """
+        revision = self.get_chapter_revision(pk, number)
+        with transaction.atomic():
+            # The current text is replaced, so its chunks are never read
+            instance = get_object_or_404(self.get_ranked_queryset().select_for_update(), pk=pk)
+            instance.content = rebuild(revision.chapter_id, revision.number)
+            instance.save(update_fields=['content'])
+        return Response(self.get_serializer(instance).data)
+
+    def get_ranked_chapter(self, pk):
+        chapter = self.get_ranked_queryset().filter(pk=pk).only('pk').first()
+        if chapter is None:
+            raise NotFound('Chapter not found.')
+        return chapter
+
+    def parse_scene_id(self, value, name):
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            raise ValidationError({name: ['Expected a scene id.']})
+
+    def get_scene_link(self, chapter, value, name=None):
+        link = ChapterScene.objects.filter(chapter=chapter, scene_id=self.parse_scene_id(value, name or 'scene')).first()
+        if link is None:
+            if name is None:
+                raise NotFound('Scene not in this chapter.')
+            raise ValidationError({name: ['Expected a scene of this chapter.']})
+        return link
+
+    def place_scene_link(self, link, data):
+        """
+        Put a link before or after another scene of the chapter, or at the
+        end when neither is given.
+        """
+        if 'before' in data and 'after' in data:
+            raise ValidationError({'non_field_errors': ['Give at most one of "before" or "after".']})
+        name = 'after' if 'after' in data else 'before' if 'before' in data else None
+        if name is None:
+            return append(link)
+        target = self.get_scene_link(link.chapter_id, data[name], name)
+        if target.pk == link.pk:
+            raise ValidationError({name: ['Expected another scene of this chapter.']})
+        return move(link, target, after=name == 'after')
+
+    paragraph_page_size = 50
+    paragraph_max_page_size = 500
+
+    def parse_paragraph_index(self, value, name, default=None, maximum=None):
+        if value is None and default is not None:
+            return default
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: ['Expected a non-negative integer.']})
+        if value < 0:
+            raise ValidationError({name: ['Expected a non-negative integer.']})
+        if maximum is not None and value > maximum:
+            raise ValidationError({name: [f'Expected at most {maximum}.']})
+        return value
+
+    @action(detail=True, methods=['get', 'patch'])
+    def paragraphs(self, request, pk=None):
+        """
+        A range of the chapter's paragraphs (content split on blank lines):
+        GET ?start=&count= reads them, PATCH {"start", "end", "paragraphs"}
+        replaces paragraphs start..end-1 with the given ones. Only the
+        paragraphs that actually change are rewritten.
+        """
+        if request.method == 'GET':
+            chapter = self.get_ranked_chapter(pk)
+            start = self.parse_paragraph_index(request.query_params.get('start'), 'start', default=0)
+            count = self.parse_paragraph_index(
+                request.query_params.get('count'), 'count',
+                default=self.paragraph_page_size, maximum=self.paragraph_max_page_size,
+            )
+            return Response({
+                'start': start,
+                'total': ChapterChunk.objects.filter(chapter=chapter).count(),
+                'paragraphs': ChapterChunk.objects.paragraphs(chapter, start, count),
+            })
+
+        data = request.data if isinstance(request.data, dict) else {}
+        paragraphs = data.get('paragraphs')
+        if not isinstance(paragraphs, list) or not all(isinstance(text, str) for text in paragraphs):
+            raise ValidationError({'paragraphs': ['Expected a list of strings.']})
+        if any(PARAGRAPH_SEPARATOR in text for text in paragraphs):
+            raise ValidationError({'paragraphs': ['Paragraphs cannot contain blank lines.']})
+        # A line break next to the separator would move the paragraph boundary
+        if any(text.startswith('\n') or text.endswith('\n') for text in paragraphs):
+            raise ValidationError({'paragraphs': ['Paragraphs cannot start or end with a line break.']})
+        with transaction.atomic():
+            chapter = self.get_ranked_queryset().select_for_update().filter(pk=pk).only('pk', 'story').first()
+            if chapter is None:
+                raise NotFound('Chapter not found.')
+            current = split_paragraphs(chapter.content)
+            start = self.parse_paragraph_index(data.get('start'), 'start', maximum=len(current))
+            end = self.parse_paragraph_index(data.get('end', start), 'end', maximum=len(current))
+            if end < start:
+                raise ValidationError({'end': ['Expected an index not before start.']})
+            current[start:end] = paragraphs
+            chapter.content = join_paragraphs(current)
+            chapter.save(update_fields=['content'])
+        return Response({
+            'start': start,
+            'end': start + len(paragraphs),
+            'total': ChapterChunk.objects.filter(chapter=chapter).count(),
+        })
+
+    @staticmethod
+    def scene_link_data(link):
+        return {'scene': link.scene_id, 'position': link.position}
+
+    @action(detail=True, methods=['get', 'post'], url_path='scenes', url_name='scenes')
+    def scenes(self, request, pk=None):
+        """
+        The chapter's scenes in order. POST {"scene": id} adds a scene at
+        the end, or next to another one with "before" or "after".
+        """
+        chapter = self.get_ranked_chapter(pk)
+        if request.method == 'GET':
+            links = ChapterScene.objects.filter(chapter=chapter).order_by('position', 'pk')
+            return Response([self.scene_link_data(link) for link in links])
+
+        data = request.data if isinstance(request.data, dict) else {}
+        scene_id = self.parse_scene_id(data.get('scene'), 'scene')
+        if not Scene.objects.filter(pk=scene_id, author=request.user).exists():
+            raise ValidationError({'scene': ['Scene not found.']})
+        if ChapterScene.objects.filter(chapter=chapter, scene_id=scene_id).exists():
+            raise ValidationError({'scene': ['The scene is already in this chapter.']})
+        link = self.place_scene_link(ChapterScene(chapter=chapter, scene_id=scene_id), data)
+        return Response(self.scene_link_data(link), status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['delete'], url_path=r'scenes/(?P<scene_id>[^/.]+)', url_name='scene')
+    def remove_scene(self, request, pk=None, scene_id=None):
+        self.get_scene_link(self.get_ranked_chapter(pk), scene_id).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], url_path=r'scenes/(?P<scene_id>[^/.]+)/move', url_name='move-scene')
+    def move_scene(self, request, pk=None, scene_id=None):
+        """
+        Move a scene of the chapter before or after another one.
+        """
+        link = self.get_scene_link(self.get_ranked_chapter(pk), scene_id)
+        data = request.data if isinstance(request.data, dict) else {}
+        if 'before' not in data and 'after' not in data:
+            raise ValidationError({'non_field_errors': ['Give exactly one of "before" or "after".']})
+        link = self.place_scene_link(link, data)
+        return Response(self.scene_link_data(link))
+
+class RaceViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = RaceSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Race.objects.all()
+        queryset = Race.objects.all()
+        return self.setup_eager_loading(queryset)
 
-class CharacterTraitViewSet(viewsets.ModelViewSet):
+class CharacterTraitViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = CharacterTraitSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CharacterTrait.objects.all()
+        queryset = CharacterTrait.objects.all()
+        return self.setup_eager_loading(queryset)
 
-class CharacterRelationshipViewSet(viewsets.ModelViewSet):
+class CharacterRelationshipViewSet(ConditionalGetMixin, ResponseCacheMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     serializer_class = CharacterRelationshipSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CharacterRelationship.objects.filter(
+        queryset = CharacterRelationship.objects.filter(
             from_character__author=self.request.user
         )
+        if self.action == 'list':
+            queryset = self.filter_relationships(queryset)
+        return self.setup_eager_loading(queryset)
+
+    def filter_relationships(self, queryset):
+        """
+        ?types=ENEMY,LOVER keeps relationships with any of the types;
+        ?between=<character id>,<character id> keeps those between two
+        characters, in either direction.
+        """
+        types = parse_relationship_types(self.request.query_params.get('types'))
+        if types:
+            queryset = queryset.with_types(types)
+        between = self.request.query_params.get('between')
+        if between:
+            try:
+                character_a, character_b = [uuid.UUID(value) for value in between.split(',')]
+            except ValueError:
+                raise ValidationError({'between': ['Expected two comma-separated character ids.']})
+            queryset = queryset.between(character_a, character_b)
+        return queryset
+
+class WorkspaceExportView(APIView):
+    """
+    API endpoint streaming the author's whole workspace as NDJSON
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        response = StreamingHttpResponse(iter_export(request.user), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="storyteller-workspace.ndjson"'
+        return response
+
+class WorkspaceImportView(APIView):
+    """
+    API endpoint loading a workspace dump into the author's account, either
+    as the raw NDJSON request body or as a multipart upload named "file"
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'detail': 'No file uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+            lines = upload
+        else:
+            lines = request.stream or []
+        try:
+            counts = WorkspaceImporter(request.user).load(lines)
+        except WorkspaceFormatError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': counts}, status=status.HTTP_201_CREATED)
+
+class SearchView(APIView):
+    """
+    API endpoint for ranked full-text search over the author's ideas,
+    scenes, chapters, events and stories: ?q=<text>[&type=idea,scene][&limit=20]
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['This parameter is required.']})
+
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in SEARCH_KINDS]
+        if unknown:
+            raise ValidationError(
+                {'type': [f"Unknown type(s): {', '.join(unknown)}. Choose from {', '.join(SEARCH_KINDS)}."]}
+            )
+
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({'limit': ['Expected a positive integer.']})
+
+        results = search(request.user.pk, query, kinds=kinds, limit=limit)
+        return Response({'query': query, 'results': results})
+
+class TimelineView(APIView):
+    """
+    API endpoint merging the author's events and scenes in time_order:
+    ?from=&to= limit the time_order window, ?story= keeps the events of one
+    story and the scenes of its chapters. Pages follow the "next" link.
+    """
+    permission_classes = [IsAuthenticated]
+    max_page_size = 500
+
+    def get_int_param(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: ['Expected an integer.']})
+
+    def get(self, request):
+        start, end = self.get_int_param('from'), self.get_int_param('to')
+        size = self.get_int_param('page_size', api_settings.PAGE_SIZE)
+        if size < 1:
+            raise ValidationError({'page_size': ['Expected a positive integer.']})
+        size = min(size, self.max_page_size)
+
+        story = None
+        story_id = request.query_params.get('story')
+        if story_id:
+            try:
+                story = Story.objects.get(pk=uuid.UUID(story_id), author=request.user)
+            except (ValueError, Story.DoesNotExist):
+                raise NotFound('Story not found.')
+
+        after = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except InvalidCursor as error:
+                raise NotFound(str(error))
+
+        items, next_key = timeline_page(request.user, story, start, end, after, size)
+        next_url = None
+        if next_key is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(next_key))
+        return Response({'next': next_url, 'results': items})
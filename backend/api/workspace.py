@@ -0,0 +1,374 @@
+"""
+Workspace dump format shared by the export endpoint and the importers.
+
+A dump is NDJSON: a header line, then one line per row,
+``{"model": "character", "data": {...}}``, with columns under their
+attribute names (``race_id``, ``parent_id``...). Many-to-many links are
+their own records, e.g. ``{"model": "scene.characters", "data":
+{"scene_id": ..., "character_id": ...}}``, plus any extra columns of the
+link table (``position`` for chapter.included_scenes). Records are written so that
+every row comes after the rows it references.
+
+Only the current state is dumped: chapter revisions (ChapterRevision) are
+left out, and an imported chapter starts its history with its imported
+text as revision 1.
+"""
+import csv
+import io
+import json
+import uuid
+from collections import defaultdict
+from itertools import islice
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, connection, transaction
+from django.db.models import CharField, JSONField, Max, TextField
+from .signals import bulk_changed
+from .models import (
+    Character, CharacterArc, Place, Item,
+    Story, Scene, Idea, IdeaTag, Chapter, ChapterChunk, Race,
+    CharacterRelationship, Event, RELATIONSHIP_TYPE_BITS, relationship_types_to_mask, text_digest
+)
+
+FORMAT_NAME = 'storyteller-workspace'
+FORMAT_VERSION = 2
+# Version 1 stored relationship types as a "types" list instead of type_mask
+READABLE_VERSIONS = (1, 2)
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 5000
+
+
+class WorkspaceFormatError(ValueError):
+    pass
+
+# Errors from bad values in a dump, reported as a WorkspaceFormatError
+LOAD_ERRORS = (ValueError, DjangoValidationError, DataError, IntegrityError)
+
+
+def error_message(error):
+    if isinstance(error, DjangoValidationError):
+        return ' '.join(error.messages)
+    return str(error)
+
+def clean_value(field, value):
+    """
+    A dump value converted and checked like model validation would (type,
+    null, choices, max_length), except that blank values are kept as
+    exported.
+    """
+    if isinstance(field, (CharField, TextField)) and value is not None and not isinstance(value, str):
+        raise WorkspaceFormatError(f'{field.name} must be a string')
+    try:
+        value = field.to_python(value)
+        if value is None:
+            if not field.null:
+                raise DjangoValidationError('This field cannot be null.')
+            return None
+        if field.choices and value not in field.empty_values and value not in {choice for choice, _ in field.flatchoices}:
+            raise DjangoValidationError(f'{value!r} is not a valid choice.')
+        field.run_validators(value)
+    except DjangoValidationError as error:
+        raise WorkspaceFormatError(f'{field.name}: {error_message(error)}')
+    return value
+
+def clean_string_list(name, value, max_length=None):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise WorkspaceFormatError(f'{name} must be a list of strings')
+    if max_length is not None and any(len(item) > max_length for item in value):
+        raise WorkspaceFormatError(f'{name} can be at most {max_length} characters long')
+    return value
+
+
+def author_rows(model, author):
+    querysets = {
+        Race: lambda: Race.objects.filter(characters__author=author).distinct(),
+        CharacterRelationship: lambda: CharacterRelationship.objects.filter(from_character__author=author),
+        # Parents before children, so importers can rebuild the hierarchy in order
+        Place: lambda: Place.objects.filter(author=author).annotate(
+            depth=Max('ancestor_links__depth')
+        ).order_by('depth', 'id'),
+        Chapter: lambda: Chapter.objects.filter(story__author=author),
+    }
+    if model in querysets:
+        return querysets[model]()
+    return model.objects.filter(author=author)
+
+def link_rows(descriptor, author):
+    field = descriptor.field
+    source = field.m2m_field_name()
+    if field.model is Chapter:
+        lookup = f'{source}__story__author'
+    else:
+        lookup = f'{source}__author'
+    return descriptor.through.objects.filter(**{lookup: author})
+
+# Models and M2M relations in dependency order
+EXPORT_PLAN = [
+    Race, Character, CharacterArc, CharacterRelationship, Place,
+    Item, Item.owners,
+    Event, Event.characters, Event.items,
+    Story, Story.events,
+    Scene, Scene.characters, Scene.items, Scene.shown_events, Scene.told_events,
+    Chapter, Chapter.included_scenes,
+    Idea,
+]
+
+def record_label(entry):
+    if isinstance(entry, type):
+        return entry._meta.model_name
+    return f'{entry.field.model._meta.model_name}.{entry.field.name}'
+
+def stored_fields(model):
+    # Generated columns are computed by the database on insert
+    return [field for field in model._meta.concrete_fields if not field.generated]
+
+def record_columns(entry):
+    if entry is Chapter:
+        # The text is stored as chunks and hashed again on import
+        return [field.attname for field in stored_fields(Chapter) if field.name != 'content_hash'] + ['content']
+    if isinstance(entry, type):
+        return [field.attname for field in stored_fields(entry) if field.name != 'author']
+    return link_columns(entry) + [field.attname for field in link_extra_fields(entry)]
+
+def link_columns(descriptor):
+    field = descriptor.field
+    return [f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id']
+
+def link_extra_fields(descriptor):
+    # Columns of a custom through model besides its id and both keys,
+    # e.g. ChapterScene.position
+    return [
+        field for field in stored_fields(descriptor.through)
+        if not field.primary_key and field.attname not in link_columns(descriptor)
+    ]
+
+def export_rows(entry, rows, columns):
+    """
+    Rows as dicts of their columns, read in chunks. Chapter text is joined
+    from its chunks a batch of chapters at a time.
+    """
+    stored = [column for column in columns if column != 'content'] if entry is Chapter else columns
+    values = rows.values_list(*stored).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while batch := [dict(zip(stored, row)) for row in islice(values, EXPORT_CHUNK_SIZE)]:
+        if entry is Chapter:
+            texts = ChapterChunk.objects.texts([data['id'] for data in batch])
+            for data in batch:
+                data['content'] = texts[data['id']]
+        yield from batch
+
+def iter_export(author):
+    """
+    Yield the author's workspace as NDJSON lines, reading every table in
+    chunks inside one snapshot so the dump is consistent.
+    """
+    start_snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+    with transaction.atomic():
+        if start_snapshot:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+        yield json.dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION}) + '\n'
+        for entry in EXPORT_PLAN:
+            label, columns = record_label(entry), record_columns(entry)
+            rows = author_rows(entry, author) if isinstance(entry, type) else link_rows(entry, author)
+            for data in export_rows(entry, rows, columns):
+                record = {'model': label, 'data': data}
+                yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def copy_value(field, value):
+    """
+    Text for one column of a Postgres COPY ... (FORMAT csv) row.
+    """
+    if value is None:
+        return None
+    if isinstance(field, JSONField):
+        return json.dumps(value)
+    value = field.get_db_prep_save(value, connection)
+    if isinstance(value, (bytes, memoryview)):
+        return '\\x' + bytes(value).hex()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+def copy_rows(model, rows):
+    """
+    Load rows (dicts keyed by attname) into a table with COPY.
+    """
+    fields = [field for field in stored_fields(model) if field.attname in rows[0]]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([copy_value(field, row[field.attname]) for field in fields])
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        quote(model._meta.db_table), ', '.join(quote(field.column) for field in fields)
+    )
+    with connection.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.read())
+
+class WorkspaceImporter:
+    """
+    Load a workspace dump into an author's account.
+
+    Every row gets a fresh primary key; old keys are remapped in memory as
+    the stream is read, so references never need a lookup. Rows are
+    buffered per table and written with COPY on Postgres, batched
+    bulk_create elsewhere, all in one transaction. Shared races keep their
+    ids and are only created when missing.
+    """
+
+    def __init__(self, author, batch_size=IMPORT_BATCH_SIZE):
+        self.author = author
+        self.batch_size = batch_size
+        self.entries = {record_label(entry): entry for entry in EXPORT_PLAN}
+        self.ids = {}
+        self.buffers = defaultdict(list)
+        self.created = defaultdict(list)
+        self.counts = defaultdict(int)
+        # Chapter id -> text, stored as chunks once the chapter is written
+        self.texts = {}
+        self.use_copy = connection.vendor == 'postgresql'
+
+    def remap(self, value, create=False):
+        if value is None:
+            return None
+        key = str(value)
+        if key not in self.ids:
+            if not create:
+                raise WorkspaceFormatError(f'Reference to unknown id {key}')
+            self.ids[key] = uuid.uuid4()
+        return self.ids[key]
+
+    def convert(self, label, data):
+        entry = self.entries[label]
+        if not isinstance(data, dict):
+            raise WorkspaceFormatError(f'Invalid {label} record')
+        if entry is CharacterRelationship and 'types' in data:
+            data = dict(data)
+            data['type_mask'] = relationship_types_to_mask(
+                [value for value in data.pop('types') or [] if value in RELATIONSHIP_TYPE_BITS]
+            )
+        unknown = set(data) - set(record_columns(entry))
+        if unknown:
+            raise WorkspaceFormatError(f"Unknown {label} column(s): {', '.join(sorted(unknown))}")
+
+        if not isinstance(entry, type):
+            row = {column: self.remap(data.get(column)) for column in link_columns(entry)}
+            for field in link_extra_fields(entry):
+                row[field.attname] = clean_value(field, data[field.attname]) if field.attname in data else field.get_default()
+            return row
+
+        row = {}
+        for field in stored_fields(entry):
+            if field.name == 'author':
+                row['author_id'] = self.author.pk
+            elif field.primary_key:
+                if entry is Race:
+                    self.ids[str(data.get('id'))] = uuid.UUID(str(data.get('id')))
+                    row['id'] = self.ids[str(data.get('id'))]
+                else:
+                    row['id'] = self.remap(data.get('id'), create=True)
+            elif field.is_relation:
+                row[field.attname] = self.remap(data.get(field.attname))
+            elif field.attname in data:
+                row[field.attname] = clean_value(field, data[field.attname])
+            else:
+                row[field.attname] = field.get_default()
+        if entry is Chapter:
+            content = data.get('content') or ''
+            if not isinstance(content, str):
+                raise WorkspaceFormatError('Chapter content must be a string')
+            row['content_hash'] = text_digest(content)
+            self.texts[row['id']] = content
+        if entry is Idea:
+            clean_string_list('tags', row['tags'], IdeaTag._meta.get_field('tag').max_length)
+            row['linked_elements'] = [
+                str(self.ids.get(str(element), element))
+                for element in clean_string_list('linked_elements', row['linked_elements'])
+            ]
+        return row
+
+    def add(self, label, data):
+        if label not in self.entries:
+            raise WorkspaceFormatError(f'Unknown record type {label!r}')
+        self.buffers[label].append(self.convert(label, data))
+        if len(self.buffers[label]) >= self.batch_size:
+            self.flush(label)
+
+    def flush(self, label):
+        rows, self.buffers[label] = self.buffers[label], []
+        if not rows:
+            return
+        entry = self.entries[label]
+        model = entry if isinstance(entry, type) else entry.through
+        if entry is Race:
+            existing = set(Race.objects.filter(pk__in=[row['id'] for row in rows]).values_list('pk', flat=True))
+            rows = [row for row in rows if row['id'] not in existing]
+            if not rows:
+                return
+
+        if self.use_copy:
+            copy_rows(model, rows)
+        else:
+            model.objects.bulk_create([model(**row) for row in rows], batch_size=1000)
+        if entry is Chapter:
+            ChapterChunk.objects.add_texts({row['id']: self.texts.pop(row['id']) for row in rows})
+        if isinstance(entry, type):
+            self.created[entry] += [row['id'] for row in rows]
+        self.counts[label] += len(rows)
+
+    def finish(self):
+        for label in self.entries:
+            self.flush(label)
+        related = defaultdict(set)
+        for entry in EXPORT_PLAN:
+            if not isinstance(entry, type) and self.counts[record_label(entry)]:
+                related[entry.field.model].add(entry.field.related_model)
+        for entry in EXPORT_PLAN:
+            if isinstance(entry, type) and (self.created[entry] or related[entry]):
+                bulk_changed.send(
+                    sender=entry, author_id=self.author.pk if entry is not Race else None,
+                    action='create', pks=self.created[entry], related_models=related[entry],
+                )
+        return dict(self.counts)
+
+    def load(self, lines):
+        """
+        Import an iterable of NDJSON lines (str or bytes) and return the
+        number of rows written per record type.
+        """
+        with transaction.atomic():
+            header = None
+            for number, line in enumerate(lines, start=1):
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise WorkspaceFormatError(f'Line {number} is not valid JSON')
+                if header is None:
+                    header = record
+                    if header.get('format') != FORMAT_NAME or header.get('version') not in READABLE_VERSIONS:
+                        raise WorkspaceFormatError('Not a storyteller workspace dump')
+                    continue
+                try:
+                    self.add(record['model'], record['data'])
+                except (KeyError, TypeError):
+                    raise WorkspaceFormatError(f'Line {number} is not a workspace record')
+                except LOAD_ERRORS as error:
+                    raise WorkspaceFormatError(f'Line {number}: {error_message(error)}')
+            if header is None:
+                raise WorkspaceFormatError('Empty workspace dump')
+            try:
+                return self.finish()
+            except LOAD_ERRORS as error:
+                raise WorkspaceFormatError(error_message(error))
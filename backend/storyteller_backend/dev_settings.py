@@ -146,6 +146,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StableCursorPagination',
+    'PAGE_SIZE': 100,
     # Use JSON renderer only for testing (faster)
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     # Disable throttling for testing
@@ -153,6 +155,18 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {},
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'storyteller',
+    }
+}
+
+API_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -156,6 +156,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StableCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '100')),
     'DEFAULT_THROTTLE_CLASSES': [
         'storyteller_backend.throttles.IPRequestRateHighThrottle',
         'storyteller_backend.throttles.UserRequestRateThrottle',
@@ -170,6 +172,19 @@ REST_FRAMEWORK = {
     },
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'storyteller'),
+    }
+}
+
+# Lifetime of cached API payloads; entries are also superseded on change
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', '300'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -99,13 +99,27 @@ WSGI_APPLICATION = 'storyteller_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Use SQLite for testing (faster and doesn't require a running database server)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': ':memory:',
+# Use SQLite for testing (faster and doesn't require a running database server).
+# TEST_DATABASE=postgres runs the suite on Postgres instead, including the
+# tests of the Postgres-only paths (full-text search SQL, COPY imports...)
+if os.environ.get('TEST_DATABASE') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'storyteller'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'postgres'),
+            'HOST': os.environ.get('POSTGRES_HOST', 'db'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
     }
-}
 
 
 # Password validation
@@ -145,6 +159,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StableCursorPagination',
+    'PAGE_SIZE': 100,
     # Use JSON renderer only for testing (faster)
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     # Disable throttling for testing
@@ -152,6 +168,15 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {},
 }
 
+# Disable caching for testing; cache tests opt in with override_settings
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
+API_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
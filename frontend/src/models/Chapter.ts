@@ -1,11 +1,8 @@
 
-import Story from './Story'
-import Scene from './Scene'
-
 export default interface Chapter {
   id: string // UUID
-  story: Story
-  included_scenes: Scene[]
+  story: string // UUID
+  included_scenes: string[] // UUIDs, in chapter order
   order: number
   title: string
   content: string
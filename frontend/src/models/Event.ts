@@ -1,14 +1,12 @@
 import User from './User'
-import Character from './Character'
-import Place from './Place'
-import Item from './Item'
 
 export default interface Event {
   id: string // UUID
   author: User
   description: string
-  characters: Character[]
-  place?: Place
-  items: Item[]
+  characters: string[] // UUIDs
+  place?: string // UUID
+  items: string[] // UUIDs
   time_order: number
+  rank: number // list position, changed with move/ and reorder/
 }
@@ -1,20 +1,17 @@
 import User from './User'
-import Character from './Character'
-import Place from './Place'
-import Item from './Item'
-import Event from './Event'
 
 export default interface Scene {
   id: string // UUID
   author: User
   short_description: string
-  characters: Character[]
-  place?: Place
-  items: Item[]
-  shown_events: Event[]
-  told_events: Event[]
+  characters: string[] // UUIDs
+  place?: string // UUID
+  items: string[] // UUIDs
+  shown_events: string[] // UUIDs
+  told_events: string[] // UUIDs
   external_conflict: string
   interpersonal_conflict: string
   internal_conflict: string
   time_order: number
+  rank: number // list position, changed with move/ and reorder/
 }
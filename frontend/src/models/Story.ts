@@ -1,5 +1,3 @@
-import Chapter from './Chapter'
-import Event from './Event'
 import User from './User'
 
 export default interface Story {
@@ -11,8 +9,8 @@ export default interface Story {
   emotional_matter: string
   universal_truth: string
   logline: string
-  events: Event[]
-  chapters: Chapter[]
+  events: string[] // UUIDs
+  chapters: string[] // UUIDs
 }
 
 export const generateRandomTitle = () => {
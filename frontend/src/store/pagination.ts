@@ -0,0 +1,21 @@
+import { AxiosRequestConfig } from 'axios'
+import api from '@/lib/api'
+
+interface Page<T> {
+  next: string | null
+  previous: string | null
+  results: T[]
+}
+
+// List endpoints are cursor-paginated: follow `next` until the last page.
+// The next links carry the original query string (include, page_size).
+export async function fetchAllPages<T> (url: string, config: AxiosRequestConfig = {}): Promise<T[]> {
+  const results: T[] = []
+  let response = await api.get<Page<T>>(url, { ...config, params: { page_size: 500, ...config.params } })
+  results.push(...response.data.results)
+  while (response.data.next) {
+    response = await api.get<Page<T>>(response.data.next)
+    results.push(...response.data.results)
+  }
+  return results
+}
@@ -1,7 +1,11 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Character } from '@/models'
 
+// Relations come back as IDs unless included; the list shows the race name
+const params = { include: 'race' }
+
 interface CharacterState {
   characters: Record<string, Character>
   isLoading: boolean
@@ -16,8 +20,7 @@ const initialState: CharacterState = {
 
 export const fetchCharacters = createAsyncThunk('character/fetchCharacters', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/characters/')
-    return response.data
+    return await fetchAllPages<Character>('/api/characters/', { params })
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch characters')
   }
@@ -25,7 +28,7 @@ export const fetchCharacters = createAsyncThunk('character/fetchCharacters', asy
 
 export const createCharacter = createAsyncThunk('character/createCharacter', async (characterData: Partial<Character>, { rejectWithValue }) => {
   try {
-    const response = await api.post('/api/characters/', characterData)
+    const response = await api.post('/api/characters/', characterData, { params })
     return response.data
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to create character')
@@ -34,7 +37,7 @@ export const createCharacter = createAsyncThunk('character/createCharacter', asy
 
 export const updateCharacter = createAsyncThunk('character/updateCharacter', async (characterData: { id: string; characterData: Partial<Character> }, { rejectWithValue }) => {
   try {
-    const response = await api.put(`/api/characters/${characterData.id}/`, characterData.characterData)
+    const response = await api.put(`/api/characters/${characterData.id}/`, characterData.characterData, { params })
     return response.data
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to update character')
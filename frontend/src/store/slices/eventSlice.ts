@@ -1,5 +1,6 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Event } from '@/models'
 
 interface EventState {
@@ -16,8 +17,7 @@ const initialState: EventState = {
 
 export const fetchEvents = createAsyncThunk('event/fetchEvents', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/events/')
-    return response.data
+    return await fetchAllPages<Event>('/api/events/')
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch events')
   }
@@ -1,6 +1,7 @@
 
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Idea } from '@/models'
 
 interface IdeaState {
@@ -17,8 +18,7 @@ const initialState: IdeaState = {
 
 export const fetchIdeas = createAsyncThunk('idea/fetchIdeas', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/ideas/')
-    return response.data
+    return await fetchAllPages<Idea>('/api/ideas/')
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch ideas')
   }
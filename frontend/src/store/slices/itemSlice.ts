@@ -1,7 +1,11 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Item } from '@/models'
 
+// Relations come back as IDs unless included; the list shows the owner names
+const params = { include: 'owners' }
+
 interface ItemState {
   items: Record<string, Item>
   isLoading: boolean
@@ -16,8 +20,7 @@ const initialState: ItemState = {
 
 export const fetchItems = createAsyncThunk('item/fetchItems', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/items/')
-    return response.data
+    return await fetchAllPages<Item>('/api/items/', { params })
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch items')
   }
@@ -25,7 +28,7 @@ export const fetchItems = createAsyncThunk('item/fetchItems', async (_, { reject
 
 export const createItem = createAsyncThunk('item/createItem', async (itemData: Partial<Item>, { rejectWithValue }) => {
   try {
-    const response = await api.post('/api/items/', itemData)
+    const response = await api.post('/api/items/', itemData, { params })
     return response.data
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to create item')
@@ -34,7 +37,7 @@ export const createItem = createAsyncThunk('item/createItem', async (itemData: P
 
 export const updateItem = createAsyncThunk('item/updateItem', async ({ id, data }: { id: string, data: Partial<Item> }, { rejectWithValue }) => {
   try {
-    const response = await api.put(`/api/items/${id}/`, data)
+    const response = await api.put(`/api/items/${id}/`, data, { params })
     return response.data
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to update item')
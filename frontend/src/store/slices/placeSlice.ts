@@ -1,6 +1,7 @@
 
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Place } from '@/models'
 
 interface PlaceState {
@@ -17,8 +18,7 @@ const initialState: PlaceState = {
 
 export const fetchPlaces = createAsyncThunk('place/fetchPlaces', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/places/')
-    return response.data
+    return await fetchAllPages<Place>('/api/places/')
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch places')
   }
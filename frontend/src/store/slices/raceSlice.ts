@@ -1,5 +1,6 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Race } from '@/models'
 
 interface RaceState {
@@ -16,8 +17,7 @@ const initialState: RaceState = {
 
 export const fetchRaces = createAsyncThunk('race/fetchRaces', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/races/')
-    return response.data
+    return await fetchAllPages<Race>('/api/races/')
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch races')
   }
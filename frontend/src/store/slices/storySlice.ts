@@ -1,5 +1,6 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit'
 import api from '@/lib/api'
+import { fetchAllPages } from '@/store/pagination'
 import { Story } from '@/models'
 
 interface DataState {
@@ -17,8 +18,7 @@ const initialState: DataState = {
 
 export const fetchStories = createAsyncThunk('story/fetchStories', async (_, { rejectWithValue }) => {
   try {
-    const response = await api.get('/api/stories/')
-    return response.data
+    return await fetchAllPages<Story>('/api/stories/')
   } catch (error: any) {
     return rejectWithValue(error.response?.data?.detail || 'Failed to fetch stories')
   }